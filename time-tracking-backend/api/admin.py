@@ -1,12 +1,133 @@
+import json
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
 from .models import User, Projet, SaisieTemps, CompteRendu
 
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator using PostgreSQL's planner estimate as the count once it
+    exceeds `exact_count_limit` rows: an exact COUNT(*) reads every matching
+    row, the estimate comes from the table statistics through one EXPLAIN.
+    Smaller results, and other databases, are counted exactly.
+    """
+    exact_count_limit = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and connections[queryset.db].vendor == 'postgresql':
+            estimate = self.estimate(queryset)
+            if estimate > self.exact_count_limit:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def estimate(queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+def other_params(changelist, *names):
+    """Query parameters of the changelist, except `names`, for hidden inputs."""
+    return [(name, value) for name, value in changelist.params.items() if name not in names]
+
+
+class RelatedInputFilter(admin.SimpleListFilter):
+    """
+    Sidebar input matching a related row by id or by `related_lookup`,
+    instead of a link per related row that lists the whole table.
+    """
+    template = 'admin/api/input_filter.html'
+    related_lookup = None
+
+    def lookups(self, request, model_admin):
+        # Not rendered, but a filter without lookups is hidden
+        return (('', ''),)
+
+    def choices(self, changelist):
+        yield {
+            'selected': bool(self.value()),
+            'parameter_name': self.parameter_name,
+            'value': self.value() or '',
+            'hidden': other_params(changelist, self.parameter_name),
+            'reset_url': changelist.get_query_string(remove=[self.parameter_name]),
+        }
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        condition = Q(**{self.related_lookup: value})
+        if value.isdigit():
+            condition |= Q(**{f'{self.parameter_name}_id': int(value)})
+        return queryset.filter(condition)
+
+
+class UserFilter(RelatedInputFilter):
+    title = 'utilisateur'
+    parameter_name = 'user'
+    related_lookup = 'user__username'
+
+
+class ManagerFilter(RelatedInputFilter):
+    title = 'manager'
+    parameter_name = 'manager'
+    related_lookup = 'manager__username'
+
+
+class ProjetFilter(RelatedInputFilter):
+    title = 'projet'
+    parameter_name = 'projet'
+    related_lookup = 'projet__nom'
+
+
+class DateRangeFilter(admin.FieldListFilter):
+    """From/to date inputs, in place of date_hierarchy and its scans of the whole table."""
+    template = 'admin/api/date_range_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_since = f'{field_path}__gte'
+        self.lookup_until = f'{field_path}__lte'
+        super().__init__(field, request, params, model, model_admin, field_path)
+        # An empty input means no bound
+        self.used_parameters = {
+            name: value for name, value in self.used_parameters.items() if any(value)}
+
+    def expected_parameters(self):
+        return [self.lookup_since, self.lookup_until]
+
+    def choices(self, changelist):
+        yield {
+            'selected': bool(self.used_parameters),
+            'since_parameter': self.lookup_since,
+            'since': changelist.params.get(self.lookup_since, ''),
+            'until_parameter': self.lookup_until,
+            'until': changelist.params.get(self.lookup_until, ''),
+            'hidden': other_params(changelist, *self.expected_parameters()),
+            'reset_url': changelist.get_query_string(remove=self.expected_parameters()),
+        }
+
+
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'role', 'manager')
-    list_filter = ('role', 'is_active')
+    list_filter = ('role', 'is_active', ManagerFilter)
+    list_select_related = ('manager',)
     search_fields = ('username', 'email', 'first_name', 'last_name')
     ordering = ('username',)
+    autocomplete_fields = ('manager',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
@@ -24,21 +145,31 @@ class CustomUserAdmin(UserAdmin):
 
 class ProjetAdmin(admin.ModelAdmin):
     list_display = ('nom', 'description', 'manager')
-    list_filter = ('manager',)
+    list_filter = (ManagerFilter,)
+    list_select_related = ('manager',)
     search_fields = ('nom', 'description', 'manager__username')
+    autocomplete_fields = ('manager', 'users')
 
 class SaisieTempsAdmin(admin.ModelAdmin):
     list_display = ('user', 'projet', 'date', 'temps', 'description')
-    list_filter = ('user', 'projet', 'date')
+    list_filter = (UserFilter, ProjetFilter, ('date', DateRangeFilter))
+    list_select_related = ('user', 'projet')
     search_fields = ('user__username', 'projet__nom', 'description')
-    date_hierarchy = 'date'
+    ordering = ('-date', '-id')
+    autocomplete_fields = ('user', 'projet')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 class CompteRenduAdmin(admin.ModelAdmin):
     list_display = ('user', 'mois', 'total_temps', 'statut')
-    list_filter = ('user', 'mois', 'statut')
+    list_filter = (UserFilter, ('mois', DateRangeFilter), 'statut')
+    list_select_related = ('user',)
     search_fields = ('user__username',)
-    date_hierarchy = 'mois'
+    ordering = ('-mois', '-id')
     readonly_fields = ('total_temps',)
+    autocomplete_fields = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Projet, ProjetAdmin)
@@ -0,0 +1,107 @@
+"""
+Utilization matrices of a team, computed with NumPy from one grouped query.
+
+The query returns one (user, project, day, total) row per non-empty cell;
+every matrix and rollup is then a bincount over those columns, so the cost
+grows with the number of cells, never with a Python loop per entry.
+"""
+from operator import itemgetter
+
+import numpy as np
+from django.db import connections
+from django.db.models import CharField, FloatField, Sum
+from django.db.models.functions import Cast
+
+from .models import SaisieTemps
+
+
+def _periods(days, unit):
+    """Distinct starts of the weeks (Mondays) or months of `days`, and the index of each day."""
+    if unit == 'week':
+        # Day 0 of datetime64, 1970-01-01, was a Thursday
+        starts = days - (days.astype(np.int64) + 3) % 7
+    else:
+        starts = days.astype('datetime64[M]').astype('datetime64[D]')
+    return np.unique(starts, return_inverse=True)
+
+
+def _matrix(rows, columns, weights, shape):
+    """Sums `weights` into a dense rows x columns matrix."""
+    flat = np.bincount(rows * shape[1] + columns, weights, minlength=shape[0] * shape[1])
+    return flat.reshape(shape)
+
+
+def _rounded(array, decimals=2):
+    return np.round(array, decimals).tolist()
+
+
+def utilization(team, first_day, last_day, cells=False):
+    """
+    Days worked by the users of the `team` queryset from `first_day` up to
+    `last_day`, excluded: totals per user and project, weekly and monthly
+    rollups per user and per project, the utilization of each user against
+    the working days of each period and, with `cells`, the sparse
+    user x project x day cube as [user, project, day, temps] index rows.
+    """
+    user_ids = np.array(list(team.order_by('id').values_list('id', flat=True)), dtype=np.int64)
+    grouped = SaisieTemps.objects.filter(
+        user_id__in=team.values('id'), date__gte=first_day, date__lt=last_day
+    ).values_list(
+        # Dates as ISO text, parsed by NumPy far faster than date objects
+        'user_id', 'projet_id', Cast('date', CharField(max_length=10)),
+    ).annotate(
+        total=Cast(Sum('temps'), FloatField())
+    ).order_by()
+    # Raw rows: Django's per-row converters would cost more than the rest.
+    sql, params = grouped.query.sql_with_params()
+    with connections[grouped.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    def column(index, dtype):
+        return np.fromiter(map(itemgetter(index), rows), dtype, len(rows))
+
+    days = np.arange(first_day, last_day, dtype='datetime64[D]')
+    user_col = np.searchsorted(user_ids, column(0, np.int64))
+    projet_ids, projet_col = np.unique(column(1, np.int64), return_inverse=True)
+    dates = np.array(list(map(itemgetter(2), rows)), dtype='datetime64[D]')
+    day_col = (dates - days[0]).astype(np.int64)
+    temps = column(3, np.float64)
+
+    users_projets = _matrix(user_col, projet_col, temps, (len(user_ids), len(projet_ids)))
+    working_days = np.is_busday(days)
+
+    def rollup(unit):
+        periods, period_of_day = _periods(days, unit)
+        period_col = period_of_day[day_col]
+        capacity = np.bincount(period_of_day, working_days, minlength=len(periods))
+        by_user = _matrix(user_col, period_col, temps, (len(user_ids), len(periods)))
+        by_projet = _matrix(projet_col, period_col, temps, (len(projet_ids), len(periods)))
+        rate = np.divide(by_user, capacity, out=np.zeros_like(by_user), where=capacity > 0)
+        return {
+            'periods': np.datetime_as_string(periods).tolist(),
+            'capacity': capacity.astype(np.int64).tolist(),
+            'users': _rounded(by_user),
+            'projets': _rounded(by_projet),
+            'utilization': _rounded(rate, 3),
+        }
+
+    data = {
+        'start': first_day.isoformat(),
+        'end': np.datetime_as_string(days[-1]).item(),
+        'users': user_ids.tolist(),
+        'projets': projet_ids.tolist(),
+        'totals': {
+            'users': _rounded(users_projets.sum(axis=1)),
+            'projets': _rounded(users_projets.sum(axis=0)),
+            'users_projets': _rounded(users_projets),
+        },
+        'weekly': rollup('week'),
+        'monthly': rollup('month'),
+    }
+    if cells:
+        data['days'] = np.datetime_as_string(days).tolist()
+        data['cells'] = [
+            list(cell) for cell in zip(
+                user_col.tolist(), projet_col.tolist(), day_col.tolist(), _rounded(temps))]
+    return data
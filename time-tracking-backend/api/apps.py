@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .profiling import install_query_recorder
+        from .revisions import create_revision_sequence
+        from .search import create_search_indexes
+        from .totals import backfill_totals
+
+        post_migrate.connect(create_revision_sequence, sender=self)
+        post_migrate.connect(create_search_indexes, sender=self)
+        post_migrate.connect(backfill_totals, sender=self)
+        connection_created.connect(install_query_recorder)
@@ -0,0 +1,123 @@
+import secrets
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+User = get_user_model()
+
+# Everything but the password, which authenticated requests never need: it
+# stays deferred, so saving such a user cannot overwrite it.
+USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields if field.attname != 'password')
+CLAIM_FIELDS = ('username', 'role', 'is_staff', 'is_superuser', 'manager_id')
+STREAM_TICKET_SALT = 'api.authentication.stream-ticket'
+
+
+def _build(values):
+    """A User loaded with `values`, a mapping of attname -> value, other fields deferred."""
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(router.db_for_read(User), fields, [values[field] for field in fields])
+
+
+def _version_key(user_id):
+    return f'jwt-user:version:{user_id}'
+
+
+def _load(user_id):
+    """Field values of a user, from the cache or the database."""
+    timeout = settings.JWT_USER_CACHE_TIMEOUT
+    if not timeout:
+        return User.objects.filter(pk=user_id).values_list(*USER_FIELDS).first()
+
+    version = cache.get_or_set(_version_key(user_id), secrets.token_hex(8), None)
+    key = f'jwt-user:{user_id}:{version}'
+    values = cache.get(key)
+    if values is None:
+        values = User.objects.filter(pk=user_id).values_list(*USER_FIELDS).first()
+        if values is not None:
+            cache.set(key, values, timeout)
+    return values
+
+
+def forget_user(user_id):
+    """
+    Drops a user from the cache, e.g. after it changed. Its values are kept
+    under a version replaced here, so a request that read the old row just
+    before cannot store it again under the current one.
+    """
+    cache.set(_version_key(user_id), secrets.token_hex(8), None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the User query of every request.
+
+    The user's fields are kept JWT_USER_CACHE_TIMEOUT seconds in the Django
+    cache and dropped when the user is saved or deleted. That reaches every
+    worker with a shared cache backend; with the local one, only the process
+    that saved, the others seeing the change once the (shorter) timeout
+    expires. With JWT_CLAIMS_ONLY it is built from the token claims alone, so
+    role changes and deactivations only apply once the access token expires;
+    any other field is loaded on first access.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if settings.JWT_CLAIMS_ONLY and all(claim in validated_token for claim in CLAIM_FIELDS):
+            return _build(dict(
+                {claim: validated_token[claim] for claim in CLAIM_FIELDS},
+                id=user_id, is_active=True))
+
+        values = _load(user_id)
+        if values is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        user = _build(dict(zip(USER_FIELDS, values)))
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+
+def issue_stream_ticket(user, expires):
+    """
+    A signed ticket opening the live updates stream for `user`, once and
+    within LIVE_UPDATES_TICKET_AGE seconds; the stream ends at the `expires`
+    timestamp, that of the access token it was issued for.
+    """
+    return signing.dumps(
+        {'user': user.pk, 'exp': expires, 'nonce': secrets.token_urlsafe(12)},
+        salt=STREAM_TICKET_SALT)
+
+
+def redeem_stream_ticket(ticket):
+    """
+    The user of a stream ticket and the timestamp its stream ends at. The
+    ticket is then spent: single use holds across workers with a shared
+    cache backend, within a process with the local one.
+    """
+    try:
+        claims = signing.loads(
+            ticket, salt=STREAM_TICKET_SALT, max_age=settings.LIVE_UPDATES_TICKET_AGE)
+    except signing.BadSignature:
+        raise AuthenticationFailed("Ticket invalide ou expiré", code='invalid_ticket')
+    if not cache.add(f"stream-ticket:{claims['nonce']}", True, settings.LIVE_UPDATES_TICKET_AGE):
+        raise AuthenticationFailed("Ticket déjà utilisé", code='invalid_ticket')
+
+    user = User.objects.filter(pk=claims['user'], is_active=True).first()
+    if user is None:
+        raise AuthenticationFailed(_("User not found"), code='user_not_found')
+    return user, claims['exp']
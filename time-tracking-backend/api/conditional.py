@@ -0,0 +1,60 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import SaisieTemps
+from .revisions import current_revision
+
+
+def queryset_etag(queryset, *parts):
+    """
+    Weak ETag of a queryset from its latest change and its row count, so
+    edits, additions and deletions all change it. `parts` (requesting user,
+    URL...) tell apart representations of the same rows.
+
+    For entries, the latest change is their highest revision: once every
+    revision up to it is committed, any later change gets a higher one,
+    whereas updated_at is taken before commit and may be older than one
+    already served. Hence None, no ETag, while a smaller revision is pending.
+    Other models use updated_at.
+    """
+    queryset = queryset.order_by()
+    if queryset.model is SaisieTemps:
+        # The horizon first, so the rows below it are all visible to the query.
+        horizon = current_revision()
+        stamp = queryset.aggregate(last=Max('revision'), count=Count('pk'))
+        if (stamp['last'] or 0) > horizon:
+            return None
+    else:
+        stamp = queryset.aggregate(last=Max('updated_at'), count=Count('pk'))
+    digest = hashlib.sha1(repr((parts, stamp['last'], stamp['count'])).encode('utf-8'))
+    return f'W/"{digest.hexdigest()}"'
+
+
+def _opaque(etag):
+    # If-None-Match uses the weak comparison (RFC 9110 section 13.1.2).
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def conditional_response(request, queryset, respond):
+    """
+    Answers 304 Not Modified when If-None-Match matches the queryset ETag,
+    otherwise returns respond() with the ETag attached, if any.
+    """
+    etag = queryset_etag(queryset, request.user.pk, request.get_full_path())
+    if etag is None:
+        return respond()
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if '*' in if_none_match or _opaque(etag) in map(_opaque, if_none_match):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response = respond()
+    if response.status_code == status.HTTP_200_OK:
+        for name, value in headers.items():
+            response[name] = value
+    return response
@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.db import models
+
+
+def month_bounds(year, month):
+    """Returns the first day of the month and the first day of the next one."""
+    first_day = date(year, month, 1)
+    if month == 12:
+        next_month = date(year + 1, 1, 1)
+    else:
+        next_month = date(year, month + 1, 1)
+    return first_day, next_month
+
+
+def month_span(start, end=None):
+    """
+    First day of the `start` month and first day after the `end` month (the
+    start month by default), both given as 'YYYY-MM'. Raises ValueError.
+    """
+    start_year, start_month = map(int, start.split('-'))
+    end_year, end_month = map(int, (end or start).split('-'))
+    first_day, _ = month_bounds(start_year, start_month)
+    _, last_day = month_bounds(end_year, end_month)
+    if last_day <= first_day:
+        raise ValueError("empty month span")
+    return first_day, last_day
+
+
+def month_range(year, month, field='date'):
+    """
+    Filters `field` on a whole month as `field >= first_day AND field <
+    next_month`. Unlike `__year`/`__month`, which become EXTRACT() on
+    PostgreSQL, this can use a plain or composite index on the column.
+    """
+    first_day, next_month = month_bounds(year, month)
+    return models.Q(**{f'{field}__gte': first_day, f'{field}__lt': next_month})
@@ -0,0 +1,262 @@
+"""
+Live SaisieTemps change events, pushed to the clients of the stream endpoint.
+
+Writes publish their events once their transaction commits. The broker named
+by LIVE_UPDATES_BROKER delivers them to the subscribers whose visibility
+covers the user of the entry. LocalBroker only reaches the subscribers of
+its own process, so it needs a single worker; PostgresBroker, the default on
+PostgreSQL, relays the events to every process through LISTEN/NOTIFY.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from functools import lru_cache, partial
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Events of one stream client, queued on its event loop. A client too slow
+    to drain LIVE_UPDATES_QUEUE_SIZE events loses its subscription and must
+    catch up through the changes feed.
+    """
+
+    def __init__(self, broker, accepts):
+        self.broker = broker
+        self.accepts = accepts
+        self.lost = False
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(settings.LIVE_UPDATES_QUEUE_SIZE)
+
+    def _put(self, event):
+        if self.lost:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # get() is not waiting on a full queue, it will see the loss next.
+            self.lost = True
+            self.close()
+
+    def deliver(self, event):
+        """Queues `event`, from any thread."""
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:  # loop closed, the client is gone
+            self.close()
+
+    def drop(self):
+        """Ends the subscription from any thread: the client must catch up."""
+        def lose():
+            self.lost = True
+            try:
+                self._queue.put_nowait(None)  # wakes get() up
+            except asyncio.QueueFull:
+                pass
+        try:
+            self._loop.call_soon_threadsafe(lose)
+        except RuntimeError:
+            pass
+        self.close()
+
+    async def get(self, timeout):
+        """Next event, or None after `timeout` seconds or once lost."""
+        if self.lost:
+            return None
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """Delivers events to the subscribers of the current process."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, accepts):
+        """
+        Subscribes the running event loop to the events of the entries of
+        the users for which `accepts(user_id)` holds.
+        """
+        subscription = Subscription(self, accepts)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    async def listening(self, timeout):
+        """
+        Whether the events published from now on reach the subscribers,
+        waiting up to `timeout` seconds for it.
+        """
+        return True
+
+    def publish(self, event):
+        self.deliver(event)
+
+    def deliver(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.accepts(event['user']):
+                subscription.deliver(event)
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Relays the events through PostgreSQL NOTIFY to the LocalBroker of every
+    process, each listening on its own connection from a daemon thread
+    started with its first subscription.
+
+    NOTIFY payloads are limited to 8000 bytes: larger events go without their
+    entry, which the listeners read back. Events sent while a listener is
+    not listening are lost: new subscribers wait for listening() before
+    taking their starting revision, and the subscribers of a listener that
+    loses its connection are dropped, to catch up through the changes feed.
+    """
+    channel = 'api_live_updates'
+    max_payload = 7999
+    poll_interval = 1
+    retry_delay = 1
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+        self._listening = threading.Event()
+        self._stopping = threading.Event()
+
+    def subscribe(self, accepts):
+        subscription = super().subscribe(accepts)
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name='live-updates', daemon=True)
+                self._listener.start()
+        return subscription
+
+    def publish(self, event):
+        payload = json.dumps(event, cls=DjangoJSONEncoder)
+        if len(payload.encode()) > self.max_payload:
+            payload = json.dumps(dict(event, entry=None, reload=True))
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+    def _listen(self):
+        import psycopg
+
+        params = connections['default'].get_connection_params()
+        # A plain connection: Django's cursor factory and adapters are not used.
+        params.pop('cursor_factory', None)
+        params.pop('context', None)
+        while not self._stopping.is_set():
+            try:
+                with psycopg.connect(**params, autocommit=True) as listener:
+                    listener.execute(f'LISTEN {self.channel}')
+                    self._listening.set()
+                    while not self._stopping.is_set():
+                        for notify in listener.notifies(timeout=self.poll_interval):
+                            event = self._read(notify.payload)
+                            if event is not None:
+                                self.deliver(event)
+            except Exception:
+                logger.exception("Live updates listener disconnected")
+            if self._listening.is_set():
+                # Cleared first: later subscribers wait for the next LISTEN.
+                self._listening.clear()
+                self._drop_subscribers()
+            self._stopping.wait(self.retry_delay)
+        connections.close_all()
+
+    async def listening(self, timeout):
+        if self._listening.is_set():
+            return True
+        return await asyncio.to_thread(self._listening.wait, timeout)
+
+    def stop(self):
+        """Stops listening, e.g. before the database goes away."""
+        self._stopping.set()
+        if self._listener is not None:
+            self._listener.join()
+
+    def _drop_subscribers(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.drop()
+
+    def _read(self, payload):
+        """The event of a notification, its entry read back when too large to send."""
+        event = json.loads(payload)
+        if not event.pop('reload', False):
+            return event
+
+        from .models import SaisieTemps
+        from .serializers import SaisieTempsSerializer
+
+        # A later revision comes with its own event.
+        entry = SaisieTemps.objects.filter(pk=event['id'], revision=event['revision']).first()
+        if entry is None:
+            return None
+        event['entry'] = SaisieTempsSerializer(entry).data
+        return event
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    """The LIVE_UPDATES_BROKER instance, PostgresBroker by default on PostgreSQL."""
+    path = settings.LIVE_UPDATES_BROKER or (
+        'api.events.PostgresBroker' if connection.vendor == 'postgresql'
+        else 'api.events.LocalBroker')
+    return import_string(path)()
+
+
+def _publish(event):
+    get_broker().publish(event)
+
+
+def entries_saved(entries, data=None):
+    """
+    Publishes the creation or update of `entries` once committed. `data` is
+    their SaisieTempsSerializer representation, when already at hand.
+    """
+    if data is None:
+        from .serializers import SaisieTempsSerializer
+
+        # Serialized now: the instances may change before the commit.
+        data = SaisieTempsSerializer(entries, many=True).data
+    for entry, data in zip(entries, data):
+        transaction.on_commit(partial(_publish, {
+            'type': 'saved',
+            'id': entry.pk,
+            'user': entry.user_id,
+            'revision': entry.revision,
+            'entry': data,
+        }))
+
+
+def entry_deleted(entry_id, user_id, revision):
+    """Publishes the deletion of an entry once committed."""
+    transaction.on_commit(partial(_publish, {
+        'type': 'deleted',
+        'id': entry_id,
+        'user': user_id,
+        'revision': revision,
+        'entry': None,
+    }))
@@ -0,0 +1,53 @@
+import csv
+import tempfile
+
+EXPORT_FIELDS = ('id', 'user__username', 'projet__nom', 'date', 'temps', 'description')
+EXPORT_HEADERS = ('id', 'utilisateur', 'projet', 'date', 'temps', 'description')
+
+
+def export_rows(queryset, chunk_size=2000):
+    """
+    Streams plain tuples from the database with a server-side cursor, without
+    building model instances or holding the whole result in memory.
+    """
+    return queryset.order_by('date', 'id').values_list(
+        *EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, lines_per_chunk=500):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADERS)
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= lines_per_chunk:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def write_xlsx(rows):
+    """
+    Writes the rows to a temporary XLSX file using openpyxl's write-only
+    mode, which flushes rows to disk as they are appended.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('saisies')
+    sheet.append(EXPORT_HEADERS)
+    for row in rows:
+        sheet.append(row)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
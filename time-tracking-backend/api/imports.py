@@ -0,0 +1,221 @@
+"""
+Bulk user import from CSV or JSON rows.
+
+Every row is validated first, with one query for the usernames already taken
+and one for the managers referenced. The passwords of the valid rows are then
+hashed across a process pool, PBKDF2 being the bulk of the cost, and the
+users inserted with one bulk_create in a single transaction.
+
+The import_users command hashes on a pool of its own; HTTP imports share the
+small pool of their server process and are capped so they fit in a request.
+"""
+import csv
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import User
+from .visibility import invalidate_visibility
+
+REQUIRED_FIELDS = ('username', 'password')
+ROLE_FLAGS = {
+    'admin': {'is_superuser': True, 'is_staff': True},
+    'manager': {'is_superuser': False, 'is_staff': True},
+    'user': {'is_superuser': False, 'is_staff': False},
+}
+
+
+class UserImportError(ValueError):
+    """The input as a whole cannot be imported."""
+
+
+def read_csv(content):
+    """Rows of a CSV document with a header line, as dicts."""
+    if isinstance(content, bytes):
+        try:
+            content = content.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise UserImportError("Le fichier doit être encodé en UTF-8")
+    reader = csv.DictReader(io.StringIO(content))
+    missing = [field for field in REQUIRED_FIELDS if field not in (reader.fieldnames or ())]
+    if missing:
+        raise UserImportError(f"Colonnes manquantes : {', '.join(missing)}")
+    return list(reader)
+
+
+def read_rows(data):
+    """Rows of a JSON document: a list of objects, or {"users": [...]}."""
+    if isinstance(data, dict):
+        data = data.get('users')
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        raise UserImportError("Une liste d'utilisateurs est attendue")
+    return data
+
+
+def _text(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def _clean(row, by):
+    """Validated model fields of one row, without the uniqueness and manager checks."""
+    errors = {}
+    username = _text(row, 'username')
+    if not username:
+        errors['username'] = ["Ce champ est obligatoire."]
+    elif len(username) > 150:
+        errors['username'] = ["150 caractères au maximum."]
+    else:
+        try:
+            UnicodeUsernameValidator()(username)
+        except DjangoValidationError as e:
+            errors['username'] = list(e.messages)
+
+    for field in ('first_name', 'last_name'):
+        if len(_text(row, field)) > 150:
+            errors[field] = ["150 caractères au maximum."]
+
+    email = _text(row, 'email')
+    if email:
+        try:
+            validate_email(email)
+        except DjangoValidationError as e:
+            errors['email'] = list(e.messages)
+
+    # Passwords are kept as given, spaces included
+    password = row.get('password')
+    if password is None or password == '':
+        errors['password'] = ["Ce champ est obligatoire."]
+
+    role = _text(row, 'role') or 'user'
+    if role not in ROLE_FLAGS:
+        errors['role'] = ["Rôle invalide"]
+    elif by is not None and not by.is_superuser and role != 'user':
+        errors['role'] = ["Seul un administrateur peut créer des managers ou des administrateurs"]
+
+    return {
+        'username': username,
+        'email': email,
+        'password': str(password or ''),
+        'role': role,
+        'manager': _text(row, 'manager'),
+        'first_name': _text(row, 'first_name'),
+        'last_name': _text(row, 'last_name'),
+    }, errors
+
+
+def _managers(references):
+    """Staff flag and id of the referenced managers, by id and username, in one query."""
+    ids = {int(reference) for reference in references if reference.isdigit()}
+    found = {}
+    for id, username, is_staff in User.objects.filter(
+            Q(id__in=ids) | Q(username__in=references)).values_list('id', 'username', 'is_staff'):
+        found[username] = (id, is_staff)
+        if id in ids:
+            found[str(id)] = (id, is_staff)
+    return found
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def shared_pool():
+    """
+    The pool of USER_IMPORT_HTTP_WORKERS processes hashing the passwords of
+    the HTTP imports of this server process, None for no pool. Its processes
+    are spawned: forking a threaded server is unsafe.
+    """
+    global _pool
+    if settings.USER_IMPORT_HTTP_WORKERS <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.USER_IMPORT_HTTP_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup)
+        return _pool
+
+
+def hash_passwords(passwords, pool=None):
+    """make_password over `passwords`, across the processes of `pool` if any."""
+    if pool is None or len(passwords) <= 1:
+        return [make_password(password) for password in passwords]
+    return list(pool.map(make_password, passwords))
+
+
+def import_users(rows, by=None, dry_run=False, pool=None, max_rows=None):
+    """
+    Creates the users of `rows` that are valid, on behalf of `by` (None for
+    no restriction), hashing their passwords on `pool`. A manager only
+    imports users, and only their own. Returns the created users and the
+    errors of the other rows, numbered from 1; with `dry_run`, only the
+    errors. At most `max_rows` rows, USER_IMPORT_MAX_ROWS by default.
+    """
+    max_rows = max_rows or settings.USER_IMPORT_MAX_ROWS
+    if not rows:
+        raise UserImportError("Aucun utilisateur à importer")
+    if len(rows) > max_rows:
+        raise UserImportError(f"{max_rows} utilisateurs au maximum par import")
+
+    cleaned = [_clean(row, by) for row in rows]
+    usernames = [data['username'] for data, _ in cleaned]
+    taken = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    managers = _managers({data['manager'] for data, _ in cleaned if data['manager']})
+    restricted = by is not None and not by.is_superuser
+
+    seen = set()
+    valid, errors = [], []
+    for number, (data, row_errors) in enumerate(cleaned, start=1):
+        username = data['username']
+        if not username:
+            pass
+        elif username in taken:
+            row_errors.setdefault('username', []).append("Ce nom d'utilisateur existe déjà")
+        elif username in seen:
+            row_errors.setdefault('username', []).append("Nom d'utilisateur en double dans l'import")
+        seen.add(username)
+
+        reference = data.pop('manager')
+        manager_id = None
+        if reference:
+            if reference not in managers:
+                row_errors['manager'] = ["Manager spécifié n'existe pas"]
+            else:
+                manager_id, is_staff = managers[reference]
+                if not is_staff:
+                    row_errors['manager'] = [
+                        "Le manager assigné doit être un staff member (manager ou admin)"]
+        if restricted:
+            if manager_id not in (None, by.id):
+                row_errors['manager'] = ["Un manager ne peut importer que ses propres utilisateurs"]
+            manager_id = by.id
+
+        if row_errors:
+            errors.append({'row': number, 'username': username, 'errors': row_errors})
+        else:
+            valid.append(User(manager_id=manager_id, **ROLE_FLAGS[data['role']], **data))
+
+    if dry_run or not valid:
+        return {'created': [], 'errors': errors}
+
+    for user, password in zip(valid, hash_passwords([user.password for user in valid], pool)):
+        user.password = password
+    try:
+        with transaction.atomic():
+            created = User.objects.bulk_create(valid, batch_size=settings.USER_IMPORT_BATCH_SIZE)
+            transaction.on_commit(invalidate_visibility)
+    except IntegrityError:
+        raise UserImportError("Un nom d'utilisateur a été pris pendant l'import, relancez-le")
+    return {'created': created, 'errors': errors}
@@ -0,0 +1,199 @@
+import json
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.models import User, Projet
+from api.reports import report_cache_key, report_rows
+from api.seeding import seed_org
+
+# One baseline per database vendor, e.g. baseline.postgresql.json
+BASELINE_DIR = Path(settings.BASE_DIR) / 'benchmarks'
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds a synthetic organisation in a transaction that is rolled back, "
+        "then measures query count, p50/p95 latency and peak memory of the "
+        "main API endpoints and compares them with a stored baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--managers', type=int, default=3)
+        parser.add_argument('--users', type=int, default=10,
+                            help="Utilisateurs par manager")
+        parser.add_argument('--projects', type=int, default=3,
+                            help="Projets par manager")
+        parser.add_argument('--years', type=int, default=1)
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--baseline',
+                            help="Fichier de référence (par défaut benchmarks/baseline.<base>.json)")
+        parser.add_argument('--save-baseline', '--update-baseline', action='store_true',
+                            dest='save_baseline',
+                            help="Enregistre les résultats comme nouvelle référence")
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help="Dégradation de latence p95 tolérée (0.5 = +50%%)")
+        parser.add_argument('--output', help="Écrit les résultats en JSON dans ce fichier")
+
+    def handle(self, *args, **options):
+        config = {
+            'vendor': connection.vendor,
+            'managers': options['managers'],
+            'users': options['users'],
+            'projects': options['projects'],
+            'years': options['years'],
+        }
+
+        results = {}
+        try:
+            with transaction.atomic():
+                org = seed_org(
+                    managers=options['managers'],
+                    users_per_manager=options['users'],
+                    projects_per_manager=options['projects'],
+                    years=options['years'],
+                )
+                self.stdout.write(
+                    f"{len(org['users'])} utilisateurs, {len(org['projets'])} projets, "
+                    f"{org['entries']} saisies générés")
+                for name, run in self.scenarios(org):
+                    results[name] = self.measure(run, options['iterations'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.report(results)
+
+        if options['output']:
+            Path(options['output']).write_text(
+                json.dumps({'config': config, 'results': results}, indent=2))
+
+        baseline_path = Path(
+            options['baseline'] or BASELINE_DIR / f"baseline.{connection.vendor}.json")
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(
+                json.dumps({'config': config, 'results': results}, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Référence enregistrée dans {baseline_path}"))
+        elif not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(
+                f"Aucune référence dans {baseline_path}, comparaison impossible : "
+                f"enregistrez-la avec --update-baseline"))
+        else:
+            self.compare(config, results, json.loads(baseline_path.read_text()),
+                         options['tolerance'])
+
+    def scenarios(self, org):
+        admin = User.objects.create(username=f"{org['prefix']}-admin", role='admin',
+                                    is_staff=True, is_superuser=True)
+        manager = User.objects.get(id=org['managers'][0])
+        user_id = org['users'][0]
+        projet = Projet.objects.get(id=org['projets'][0])
+        members = list(projet.users.values_list('id', flat=True))
+        last_month = org['end'] - timedelta(days=1)
+        month = f"{last_month:%Y-%m}"
+        week_start = last_month - timedelta(days=last_month.weekday())
+
+        manager_client = APIClient()
+        manager_client.force_authenticate(user=manager)
+        admin_client = APIClient()
+        admin_client.force_authenticate(user=admin)
+
+        def expect(response, code=200):
+            if response.status_code != code:
+                raise CommandError(
+                    f"{response.request['PATH_INFO']} a répondu {response.status_code}")
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+            return response
+
+        def cold_report():
+            rows = report_rows(user_id, last_month.year, last_month.month)
+            username = User.objects.values_list('username', flat=True).get(id=user_id)
+            cache.delete(report_cache_key(
+                user_id, username, last_month.year, last_month.month, rows))
+            expect(manager_client.get(f'/api/saisie-temps/{user_id}/report/{month}/'))
+
+        yield 'saisie-temps.list (semaine)', lambda: expect(manager_client.get(
+            '/api/saisie-temps/', {
+                'user': user_id,
+                'date_after': week_start.isoformat(),
+                'date_before': (week_start + timedelta(days=6)).isoformat(),
+            }))
+        yield 'saisie-temps.list (page)', lambda: expect(admin_client.get(
+            '/api/saisie-temps/', {'page_size': 100}))
+        yield 'saisie-temps.monthly', lambda: expect(manager_client.get(
+            f'/api/saisie-temps/{user_id}/monthly/{month}/'))
+        yield 'saisie-temps.report', cold_report
+        yield 'projets.list', lambda: expect(admin_client.get('/api/projets/'))
+        yield 'projets.assign_users', lambda: expect(manager_client.post(
+            f'/api/projets/{projet.id}/assign-users/', {'user_ids': members}, format='json'))
+        yield 'compte-rendus.list', lambda: expect(manager_client.get('/api/compte-rendus/'))
+
+    def measure(self, run, iterations):
+        # Warm-up run, traced for peak memory only: tracing slows the code
+        # down too much to be part of the timed runs.
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        durations, queries = [], []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                run()
+                durations.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured.captured_queries))
+        return {
+            'queries': max(queries),
+            'p50_ms': round(percentile(durations, 0.5), 2),
+            'p95_ms': round(percentile(durations, 0.95), 2),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def report(self, results):
+        self.stdout.write(f"{'endpoint':32} {'requêtes':>9} {'p50 ms':>9} {'p95 ms':>9} {'pic KB':>10}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:32} {result['queries']:>9} {result['p50_ms']:>9} "
+                f"{result['p95_ms']:>9} {result['peak_kb']:>10}")
+
+    def compare(self, config, results, baseline, tolerance):
+        if baseline.get('config') != config:
+            raise CommandError(
+                f"La référence a été mesurée avec une autre configuration ({baseline.get('config')}, "
+                f"ici {config}), enregistrez-en une avec --update-baseline")
+
+        regressions = []
+        for name, result in results.items():
+            reference = baseline['results'].get(name)
+            if reference is None:
+                continue
+            if result['queries'] > reference['queries']:
+                regressions.append(
+                    f"{name}: {result['queries']} requêtes (référence {reference['queries']})")
+            if result['p95_ms'] > reference['p95_ms'] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: p95 {result['p95_ms']} ms (référence {reference['p95_ms']} ms)")
+
+        if regressions:
+            raise CommandError("Régressions détectées:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("Aucune régression par rapport à la référence"))
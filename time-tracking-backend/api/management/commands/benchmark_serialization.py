@@ -0,0 +1,107 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.models import User, Projet, SaisieTemps
+from api.renderers import ORJSONRenderer
+from api.seeding import batched
+from api.serializers import SaisieTempsSerializer, saisie_temps_rows
+
+
+class Rollback(Exception):
+    pass
+
+
+def model_path(queryset):
+    return SaisieTempsSerializer(queryset, many=True).data, JSONRenderer()
+
+
+def fast_path(queryset):
+    return (saisie_temps_rows(list(queryset.values(*SaisieTempsSerializer.Meta.fields))),
+            ORJSONRenderer())
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates SaisieTemps rows in a transaction that is rolled back, then "
+        "compares the per-row cost of listing them through SaisieTempsSerializer "
+        "and JSONRenderer with the read-only fast path and ORJSONRenderer"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--iterations', type=int, default=3,
+                            help="Mesures par chemin, la meilleure est retenue")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['users'] < 1 or options['iterations'] < 1:
+            raise CommandError("--rows, --users et --iterations doivent être positifs")
+
+        try:
+            with transaction.atomic():
+                queryset = self.seed(options)
+                results = {
+                    name: self.measure(path, queryset, options['iterations'])
+                    for name, path in (('serializer', model_path), ('fast-path', fast_path))
+                }
+                raise Rollback
+        except Rollback:
+            pass
+
+        if results['serializer']['content'] != results['fast-path']['content']:
+            raise CommandError("Les deux chemins ne produisent pas le même JSON")
+
+        rows = options['rows']
+        self.stdout.write(
+            f"{'chemin':12} {'lecture µs/ligne':>17} {'rendu µs/ligne':>15} "
+            f"{'total ms':>10} {'Ko':>8}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:12} {result['read'] / rows * 1e6:>17.2f} "
+                f"{result['render'] / rows * 1e6:>15.2f} "
+                f"{(result['read'] + result['render']) * 1000:>10.1f} "
+                f"{len(result['content']) // 1024:>8}")
+
+        before, after = (results[name]['read'] + results[name]['render']
+                         for name in ('serializer', 'fast-path'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Coût par ligne : {before / rows * 1e6:.2f} µs -> {after / rows * 1e6:.2f} µs "
+            f"(x{before / after:.1f})"))
+
+    def seed(self, options):
+        manager = User.objects.create_user(
+            username='bench-serialization-manager', password=None, is_staff=True)
+        users = User.objects.bulk_create(
+            User(username=f'bench-serialization-{index}', manager=manager, role='user')
+            for index in range(options['users']))
+        projet = Projet.objects.create(nom='bench-serialization', manager=manager)
+
+        # One entry per user and day, as many days as needed
+        start = date(2000, 1, 1)
+        entries = (
+            SaisieTemps(
+                user=users[index % len(users)], projet=projet,
+                date=start + timedelta(days=index // len(users)),
+                temps=1, description='Développement')
+            for index in range(options['rows']))
+        for batch in batched(entries, options['batch_size']):
+            SaisieTemps.objects.bulk_create(batch)
+        return SaisieTemps.objects.filter(projet=projet).order_by('id')
+
+    def measure(self, path, queryset, iterations):
+        best = None
+        for _ in range(iterations):
+            start = time.perf_counter()
+            data, renderer = path(queryset)
+            read = time.perf_counter() - start
+            start = time.perf_counter()
+            content = renderer.render(data)
+            render = time.perf_counter() - start
+            if best is None or read + render < best['read'] + best['render']:
+                best = {'read': read, 'render': render, 'content': content}
+        return best
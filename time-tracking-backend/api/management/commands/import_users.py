@@ -0,0 +1,60 @@
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import UserImportError, import_users, read_csv, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe des utilisateurs depuis un fichier CSV (ligne d'en-tête) ou JSON : "
+        "username, password, email, role, manager (identifiant ou nom), first_name, last_name"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Valide le fichier sans créer d'utilisateur")
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        try:
+            content = path.read_bytes()
+        except OSError as e:
+            raise CommandError(f"Lecture de {path} impossible : {e}")
+
+        start = time.perf_counter()
+        try:
+            if path.suffix.lower() == '.json':
+                try:
+                    rows = read_rows(json.loads(content))
+                except ValueError:
+                    raise UserImportError("JSON invalide")
+            else:
+                rows = read_csv(content)
+            if settings.USER_IMPORT_WORKERS > 1 and not options['dry_run']:
+                with ProcessPoolExecutor(max_workers=settings.USER_IMPORT_WORKERS) as pool:
+                    result = import_users(rows, pool=pool)
+            else:
+                result = import_users(rows, dry_run=options['dry_run'])
+        except UserImportError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+
+        for error in result['errors']:
+            details = '; '.join(
+                f"{field} : {' '.join(messages)}" for field, messages in error['errors'].items())
+            self.stderr.write(f"Ligne {error['row']} ({error['username'] or '?'}) : {details}")
+
+        if options['dry_run']:
+            self.stdout.write(
+                f"{len(rows) - len(result['errors'])} utilisateurs valides, "
+                f"{len(result['errors'])} en erreur")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(result['created'])} utilisateurs créés, {len(result['errors'])} en erreur, "
+                f"en {elapsed:.1f}s ({settings.USER_IMPORT_WORKERS} processus de hachage)"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.models import DailyTotal, MonthlyTotal
+from api.totals import rebuild_totals
+
+
+class Command(BaseCommand):
+    help = "Recalcule les totaux journaliers et mensuels à partir des saisies de temps"
+
+    def handle(self, *args, **options):
+        rebuild_totals()
+        self.stdout.write(self.style.SUCCESS(
+            f"{DailyTotal.objects.count()} totaux journaliers et "
+            f"{MonthlyTotal.objects.count()} totaux mensuels recalculés"))
@@ -0,0 +1,100 @@
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from api.seeding import seed_org
+
+
+def summary(org):
+    return {
+        'managers': len(org['managers']),
+        'users': len(org['users']),
+        'projets': len(org['projets']),
+        'entries': org['entries'],
+        'comptes_rendus': org['comptes_rendus'],
+    }
+
+
+def seed_slice(options):
+    """Runs in a worker process, which opens its own database connection."""
+    try:
+        return summary(seed_org(**options))
+    finally:
+        connections.close_all()
+
+
+def split(total, parts):
+    """Splits `total` into `parts` near-equal non-zero shares."""
+    parts = max(1, min(parts, total))
+    return [total // parts + (index < total % parts) for index in range(parts)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère une organisation synthétique (managers, utilisateurs, projets, "
+        "saisies de temps et comptes rendus) pour les tests de charge"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--managers', type=int, default=50)
+        parser.add_argument('--users', type=int, default=20,
+                            help="Utilisateurs par manager")
+        parser.add_argument('--projects', type=int, default=5,
+                            help="Projets par manager")
+        parser.add_argument('--years', type=int, default=3,
+                            help="Années de saisies jusqu'au mois en cours")
+        parser.add_argument('--span', type=int, default=0,
+                            help="Managers par manager parent (0 = pas de hiérarchie)")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Processus de génération en parallèle")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--no-comptes-rendus', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['managers'] < 1:
+            raise CommandError("Il faut au moins un manager")
+
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                "SQLite n'accepte qu'un écrivain à la fois, génération dans un seul processus"))
+            workers = 1
+
+        prefix = f'load-{uuid.uuid4().hex[:8]}'
+        slices = [
+            {
+                'managers': managers,
+                'users_per_manager': options['users'],
+                'projects_per_manager': options['projects'],
+                'years': options['years'],
+                'span': options['span'],
+                'batch_size': options['batch_size'],
+                'comptes_rendus': not options['no_comptes_rendus'],
+                'prefix': f'{prefix}-w{index}',
+                'seed': options['seed'] + index,
+            }
+            for index, managers in enumerate(split(options['managers'], workers))
+        ]
+
+        start = time.perf_counter()
+        if len(slices) == 1:
+            results = [summary(seed_org(**slices[0]))]
+        else:
+            # Forked workers must not share the parent's connection.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=len(slices), initializer=django.setup) as pool:
+                results = list(pool.map(seed_slice, slices))
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(r['managers'] for r in results)} managers, "
+            f"{sum(r['users'] for r in results)} utilisateurs, "
+            f"{sum(r['projets'] for r in results)} projets, "
+            f"{sum(r['entries'] for r in results)} saisies et "
+            f"{sum(r['comptes_rendus'] for r in results)} comptes rendus "
+            f"générés en {elapsed:.1f}s (préfixe {prefix})"))
@@ -0,0 +1,229 @@
+"""
+Metrics exposed at /metrics in the Prometheus text format.
+
+Each worker process keeps its own values. Behind a single bind a scrape
+reaches any one worker, so with METRICS_DIR set each process also writes its
+values there every METRICS_FLUSH_INTERVAL seconds, and /metrics answers
+with the sum of every file: the other workers' values are at most that old.
+Files of exited workers are kept so counters never go down; the directory
+is emptied when the server starts (see gunicorn.conf.py).
+"""
+import atexit
+import copy
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_registry = []
+_file = None
+_file_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return copy.deepcopy(self._values)
+
+    def render(self, values):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        for key, value in sorted(values.items()):
+            lines.extend(self._samples(key, value))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def merge(self, value, other):
+        return value + other
+
+    def _samples(self, key, value):
+        yield f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.setdefault(key, [[0] * len(self.buckets), 0, 0])
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def merge(self, value, other):
+        return [[a + b for a, b in zip(value[0], other[0])], value[1] + other[1], value[2] + other[2]]
+
+    def _samples(self, key, value):
+        counts, total, observed = value
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield (f'{self.name}_bucket'
+                   f'{_labels(self.labelnames, key, [("le", _number(bound))])} {cumulative}')
+        yield f'{self.name}_bucket{_labels(self.labelnames, key, [("le", "+Inf")])} {observed}'
+        yield f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}'
+        yield f'{self.name}_count{_labels(self.labelnames, key)} {observed}'
+
+
+def action_name(request):
+    """
+    Names the endpoint that served `request` after its router prefix and
+    viewset action, e.g. 'saisie-temps.report', or after its URL name.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    view = match.func
+    actions = getattr(view, 'actions', None)
+    if actions is not None:
+        from .urls import router
+
+        prefixes = {basename: prefix for prefix, _, basename in router.registry}
+        basename = view.initkwargs.get('basename')
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f'{prefixes.get(basename, basename)}.{action}'
+    return match.url_name or match.view_name
+
+
+def _path():
+    """This process's file in METRICS_DIR, named once: a later process may reuse its pid."""
+    global _file
+    if _file is None:
+        _file = Path(settings.METRICS_DIR) / f'{os.getpid()}-{uuid.uuid4().hex}.json'
+    return _file
+
+
+def flush():
+    """Writes the values of this process to its file in METRICS_DIR."""
+    path = _path()
+    data = {metric.name: [[list(key), value] for key, value in metric.snapshot().items()]
+            for metric in _registry}
+    with _file_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(data))
+        os.replace(temporary, path)
+
+
+def _flush_every(interval):
+    while True:
+        flush()
+        time.sleep(interval)
+
+
+def share():
+    """
+    Starts writing this process's values to METRICS_DIR every
+    METRICS_FLUSH_INTERVAL seconds and at exit. No-op without METRICS_DIR.
+    """
+    if not settings.METRICS_DIR or _file is not None:
+        return
+    _path()
+    atexit.register(flush)
+    threading.Thread(target=_flush_every, args=(settings.METRICS_FLUSH_INTERVAL,),
+                     name='metrics', daemon=True).start()
+
+
+def render():
+    """The metrics of this process, summed with those of the others in METRICS_DIR."""
+    values = {metric.name: metric.snapshot() for metric in _registry}
+    if _file is not None:
+        for path in Path(settings.METRICS_DIR).glob('*.json'):
+            if path == _file:
+                continue
+            try:
+                others = json.loads(path.read_text())
+            except (OSError, ValueError):  # exited meanwhile, or being replaced
+                continue
+            for metric in _registry:
+                own = values[metric.name]
+                for key, value in others.get(metric.name, ()):
+                    key = tuple(key)
+                    own[key] = metric.merge(own[key], value) if key in own else value
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render(values[metric.name]))
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_LATENCY = Histogram(
+    'api_request_duration_seconds', 'Request latency per viewset action.',
+    ('action', 'method'))
+REQUESTS = Counter(
+    'api_requests_total', 'Requests per viewset action and status code.',
+    ('action', 'method', 'status'))
+REQUEST_QUERIES = Histogram(
+    'api_request_db_queries', 'SQL queries per request and viewset action.',
+    ('action',), buckets=QUERY_BUCKETS)
+DB_QUERIES = Counter(
+    'api_db_queries_total', 'SQL queries run per viewset action.', ('action',))
+VALIDATION_REJECTIONS = Counter(
+    'api_validation_rejections_total', 'Writes rejected by a business rule.', ('reason',))
+PDF_BYTES = Counter(
+    'api_pdf_bytes_total', 'Bytes of PDF reports rendered.', ('report',))
+PDF_REPORTS = Counter(
+    'api_pdf_reports_total', 'PDF reports rendered.', ('report',))
@@ -0,0 +1,157 @@
+import cProfile
+import json
+import logging
+import random
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+from .profiling import end_profile, end_query_count, start_profile, start_query_count
+
+logger = logging.getLogger('api.profiling')
+
+
+class ProfilingMiddleware:
+    """
+    Records the SQL query count, database time, serializer time and response
+    size of every request, returns them in a Server-Timing header and logs
+    them as one JSON line (at INFO level for slow requests). A PROFILING_SAMPLE_RATE share of requests also runs
+    under cProfile, and the profile is kept in PROFILING_DIR when the request
+    took longer than PROFILING_SLOW_MS. cProfile follows a single thread, so
+    under ASGI these requests are served from the thread that runs the view.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profile, token = start_profile()
+        request.profile = profile
+        profiler = self.sample()
+        try:
+            response = self.run(self.get_response, request, profiler)
+        finally:
+            end_profile(token)
+        return self.report(request, response, profile, profiler)
+
+    async def __acall__(self, request):
+        profile, token = start_profile()
+        request.profile = profile
+        profiler = self.sample()
+        try:
+            if profiler is None:
+                response = await self.get_response(request)
+            else:
+                response = await sync_to_async(self.run)(
+                    async_to_sync(self.get_response), request, profiler)
+        finally:
+            end_profile(token)
+        return self.report(request, response, profile, profiler)
+
+    @staticmethod
+    def sample():
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return cProfile.Profile()
+        return None
+
+    @staticmethod
+    def run(get_response, request, profiler):
+        if profiler is None:
+            return get_response(request)
+        profiler.enable()
+        try:
+            return get_response(request)
+        finally:
+            profiler.disable()
+
+    def report(self, request, response, profile, profiler):
+        elapsed = profile.elapsed
+        size = None if response.streaming else len(response.content)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries"',
+            f'serializer;dur={profile.serializer_time * 1000:.1f}',
+            f'total;dur={elapsed * 1000:.1f}',
+        ])
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 1),
+            'queries': profile.queries,
+            'db_ms': round(profile.db_time * 1000, 1),
+            'serializer_ms': round(profile.serializer_time * 1000, 1),
+            'size': size,
+        }
+        slow = elapsed * 1000 >= settings.PROFILING_SLOW_MS
+        if profiler is not None and slow:
+            record['profile'] = self.dump(profiler, request)
+        logger.log(logging.INFO if slow else logging.DEBUG, json.dumps(record))
+        return response
+
+    def dump(self, profiler, request):
+        directory = Path(settings.PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = request.path.strip('/').replace('/', '-') or 'root'
+        path = directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{slug}-{uuid.uuid4().hex[:6]}.prof"
+        profiler.dump_stats(path)
+        return str(path)
+
+
+class MetricsMiddleware:
+    """Feeds the /metrics latency, request and query count series."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        metrics.share()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        counter, token = start_query_count()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_query_count(token)
+        self.record(request, response, time.perf_counter() - start, counter.queries)
+        return response
+
+    async def __acall__(self, request):
+        counter, token = start_query_count()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_query_count(token)
+        self.record(request, response, time.perf_counter() - start, counter.queries)
+        return response
+
+    @staticmethod
+    def record(request, response, elapsed, queries):
+        action = metrics.action_name(request)
+        if action == 'metrics':
+            return
+        metrics.REQUEST_LATENCY.observe(elapsed, action=action, method=request.method)
+        metrics.REQUESTS.inc(action=action, method=request.method, status=response.status_code)
+        metrics.REQUEST_QUERIES.observe(queries, action=action)
+        metrics.DB_QUERIES.inc(queries, action=action)
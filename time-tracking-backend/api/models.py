@@ -1,5 +1,5 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.hashers import make_password
 
 
@@ -32,6 +32,7 @@ class Projet(models.Model):
         User, on_delete=models.CASCADE, related_name='projets')
     users = models.ManyToManyField(
         User, related_name='assigned_projects', blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def clean(self):
         from django.core.exceptions import ValidationError
@@ -63,6 +64,48 @@ class SaisieTemps(models.Model):
     date = models.DateField()
     temps = models.DecimalField(max_digits=5, decimal_places=2)
     description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Revision of the last change, see api.revisions
+    revision = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='saisie_date_id_idx'),
+            models.Index(fields=['user', 'date'], name='saisie_user_date_idx'),
+            models.Index(fields=['projet', 'date'], name='saisie_projet_date_idx'),
+            models.Index(fields=['revision'], name='saisie_revision_idx'),
+            models.Index(fields=['user', 'revision'], name='saisie_user_revision_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        from .revisions import allocate_revisions
+        from .totals import lock_entry_days
+
+        # Every write locks its days before taking its revision, pending
+        # until commit, and the monthly totals, see totals.lock_daily_totals.
+        with transaction.atomic():
+            if not self.__dict__.pop('_days_locked', False):
+                if lock_entry_days(self, [(self.user_id, self.date)]) is None:
+                    self._persisted = None  # deleted meanwhile, inserted again
+                self.__dict__.pop('_days_locked')
+            self.revision = allocate_revisions()[0]
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'revision'}
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_totals_key()
+        return instance
+
+    def _remember_totals_key(self):
+        # Values last persisted, used to move the totals when the entry changes.
+        loaded = self.__dict__
+        if all(name in loaded for name in ('user_id', 'date', 'temps')):
+            self._persisted = (self.user_id, self.date, self.temps)
+        else:
+            self._persisted = None
 
     def __str__(self):
         return f"{self.user.username} - {self.projet.nom} - {self.date}"
@@ -77,3 +120,61 @@ class CompteRendu(models.Model):
 
     def __str__(self):
         return f"Compte Rendu - {self.user.username} - {self.mois.strftime('%B %Y')}"
+
+
+class DailyTotal(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='daily_totals')
+    date = models.DateField()
+    total = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'date'], name='unique_daily_total'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.date} - {self.total}"
+
+
+class MonthlyTotal(models.Model):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='monthly_totals')
+    mois = models.DateField()
+    total = models.DecimalField(max_digits=7, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'mois'], name='unique_monthly_total'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.mois.strftime('%B %Y')} - {self.total}"
+
+
+class SaisieTempsTombstone(models.Model):
+    """Trace of a deleted SaisieTemps, for the changes feed."""
+    entry_id = models.BigIntegerField()
+    # No constraint: tombstones outlive the entries of a deleted user.
+    user = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    revision = models.BigIntegerField(unique=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'revision'], name='tombstone_user_revision_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.entry_id} - {self.revision}"
+
+
+class RevisionCounter(models.Model):
+    """Single row holding the last revision handed out, without PostgreSQL."""
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.value)
@@ -0,0 +1,125 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor (keyset) pagination over a composite ordering such as (date, id).
+
+    The cursor holds the ordering values of the last row returned, so the next
+    page is a plain `WHERE (date, id) > (d, i)` served by the composite index,
+    however deep the client has paged.
+
+    Pagination only kicks in when `cursor` or `page_size` is passed, so clients
+    that expect a plain list keep working.
+    """
+    ordering = ('id',)
+    page_size = 100
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Curseur invalide'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (self.cursor_query_param not in request.query_params and
+                self.page_size_query_param not in request.query_params):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.position_filter(position))
+            except (DjangoValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = (
+            self.position_of(rows[-1]) if self.has_next else None)
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def position_filter(self, position):
+        # (a, b, c) > (x, y, z)  <=>  a > x OR (a = x AND b > y) OR ...
+        condition = models.Q()
+        for index, field in enumerate(self.ordering):
+            equal = {f: position[i] for i, f in enumerate(self.ordering[:index])}
+            condition |= models.Q(**equal, **{f'{field}__gt': position[index]})
+        return condition
+
+    def position_of(self, row):
+        # Rows are model instances or values() dicts
+        values = []
+        for field in self.ordering:
+            value = row[field] if isinstance(row, dict) else getattr(row, field)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        encoded = base64.urlsafe_b64encode(json.dumps(position).encode('ascii'))
+        return encoded.decode('ascii')
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(
+            url, self.page_size_query_param, self.page_size)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class SaisieTempsPagination(KeysetPagination):
+    ordering = ('date', 'id')
+
+
+class UserPagination(KeysetPagination):
+    ordering = ('username', 'id')
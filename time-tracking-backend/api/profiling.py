@@ -0,0 +1,106 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('request_profile', default=None)
+_counter = ContextVar('request_query_counter', default=None)
+
+
+class RequestProfile:
+    """What a request spent: SQL queries, database time and serializer time."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self._serializer_depth = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper counting and timing every query."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+class QueryCounter:
+    """SQL queries run by a request."""
+
+    def __init__(self):
+        self.queries = 0
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper feeding the query counter and the profile of the
+    request being served. Installed on every connection, it follows the
+    request into whichever thread runs its queries, including under ASGI.
+    """
+    counter = _counter.get()
+    if counter is not None:
+        counter.queries += 1
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver, a reconnected connection keeps its wrapper."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def start_query_count():
+    counter = QueryCounter()
+    return counter, _counter.set(counter)
+
+
+def end_query_count(token):
+    _counter.reset(token)
+
+
+def current_profile():
+    """The RequestProfile of the request being served, if profiling is on."""
+    return _current.get()
+
+
+def start_profile():
+    profile = RequestProfile()
+    return profile, _current.set(profile)
+
+
+def end_profile(token):
+    _current.reset(token)
+
+
+@contextmanager
+def serializer_timer():
+    """Times the outermost serializer call, nested serializers are included."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    profile._serializer_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile._serializer_depth -= 1
+        if not profile._serializer_depth:
+            profile.serializer_time += time.perf_counter() - start
+
+
+class TimedSerializerMixin:
+    """Adds the time spent in to_representation() to the request profile."""
+
+    def to_representation(self, instance):
+        with serializer_timer():
+            return super().to_representation(instance)
@@ -0,0 +1,286 @@
+import hashlib
+import multiprocessing
+import threading
+import zipfile
+from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+from .dates import month_range
+from .metrics import PDF_BYTES, PDF_REPORTS
+from .models import SaisieTemps
+
+MONTH_NAMES = {
+    1: 'Janvier', 2: 'Février', 3: 'Mars', 4: 'Avril',
+    5: 'Mai', 6: 'Juin', 7: 'Juillet', 8: 'Août',
+    9: 'Septembre', 10: 'Octobre', 11: 'Novembre', 12: 'Décembre'
+}
+
+_styles = None
+_executor = None
+_executor_lock = threading.Lock()
+_pending = {}
+_lock = threading.RLock()
+
+
+def get_styles():
+    """ReportLab styles are built once per process and reused for every PDF."""
+    global _styles
+    if _styles is None:
+        styles = getSampleStyleSheet()
+        _styles = {
+            'heading': styles['Heading2'],
+            'title': ParagraphStyle(
+                'CustomTitle',
+                parent=styles['Heading1'],
+                fontSize=18,
+                spaceAfter=20,
+                textColor=colors.darkblue
+            ),
+            'table_header': TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#4CAF50")),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 12),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ]),
+            'table_body': TableStyle([
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTSIZE', (0, 0), (-1, -1), 10),
+                ('PADDING', (0, 0), (-1, -1), 6),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#f9f9f9")),
+            ]),
+        }
+    return _styles
+
+
+def format_journee(value):
+    """ Convertit les heures en journées formatées """
+    if value == 1:
+        return "1 journée"
+    elif value == 0.5:
+        return "½ journée"
+    else:
+        return f"{value:.1f} journées"
+
+
+def report_rows(user_id, year, month):
+    """(id, projet name, date, temps) tuples of a user's month, in entry order."""
+    return list(SaisieTemps.objects.filter(
+        month_range(year, month),
+        user_id=user_id
+    ).order_by('id').values_list('id', 'projet__nom', 'date', 'temps'))
+
+
+def report_cache_key(user_id, username, year, month, rows):
+    digest = hashlib.sha256(username.encode('utf-8'))
+    for row in rows:
+        digest.update(repr(row).encode('utf-8'))
+    return f'report:{user_id}:{year}-{month:02d}:{digest.hexdigest()}'
+
+
+def render_monthly_report(username, year, month, rows):
+    """
+    Builds the monthly PDF from plain rows. It does not touch the database so
+    it can run in a worker process.
+    """
+    styles = get_styles()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    elements = []
+
+    title = Paragraph(
+        f"Rapport Mensuel - {username}<br/>"
+        f"{MONTH_NAMES[month]} {year}",
+        styles['title']
+    )
+    elements.append(title)
+
+    project_entries = defaultdict(list)
+    for _, projet_nom, day, temps in rows:
+        project_entries[projet_nom].append((day, temps))
+
+    total_journees = sum(temps for _, _, _, temps in rows)
+    summary_data = [['Total des journées:', f"{total_journees:.1f}"], [
+        'Nombre de projets:', str(len(project_entries))]]
+    summary_table = Table(summary_data, colWidths=[200, 150])
+    summary_table.setStyle(styles['table_body'])
+    elements.append(summary_table)
+    elements.append(Spacer(1, 20))
+
+    for project_name, entries in project_entries.items():
+        project_total = sum(temps for _, temps in entries)
+        elements.append(Paragraph(
+            f"{project_name} ({project_total:.1f})", styles['heading']))
+
+        data = [['Date', 'Journées']]
+        for day, temps in sorted(entries, key=lambda x: x[0]):
+            data.append([day.strftime('%d/%m/%Y'), format_journee(temps)])
+
+        table = Table(data, colWidths=[150, 100])
+        table.setStyle(styles['table_header'])
+        table.setStyle(styles['table_body'])
+        elements.append(table)
+        elements.append(Spacer(1, 20))
+
+    doc.build(elements)
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
+
+
+def get_executor():
+    """
+    The pool of REPORT_WORKERS processes rendering the PDFs of this server
+    process. Its processes are spawned: forking a threaded server is unsafe.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.REPORT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup)
+        return _executor
+
+
+def submit(fn, *args):
+    global _executor
+    executor = get_executor()
+    try:
+        return executor.submit(fn, *args)
+    except BrokenProcessPool:
+        # A worker died (OOM, kill...), start over with a fresh pool.
+        with _executor_lock:
+            if _executor is executor:
+                _executor = None
+        return get_executor().submit(fn, *args)
+
+
+def render(username, year, month, rows, retries=1):
+    """
+    A future for the PDF of a monthly report, rendered on the worker pool,
+    and on a fresh one if that pool broke while it was pending.
+    """
+    result = Future()
+
+    def done(future):
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool) and retries:
+            _chain(render(username, year, month, rows, retries - 1), result)
+        else:
+            _chain(future, result)
+
+    try:
+        submit(render_monthly_report, username, year, month, rows).add_done_callback(done)
+    except Exception as e:
+        result.set_exception(e)
+    return result
+
+
+def _chain(future, result):
+    def copy(future):
+        if future.exception() is not None:
+            result.set_exception(future.exception())
+        else:
+            result.set_result(future.result())
+    future.add_done_callback(copy)
+
+
+def _rendered(key, pdf):
+    PDF_REPORTS.inc(report='monthly')
+    PDF_BYTES.inc(len(pdf), report='monthly')
+    cache.set(key, pdf, settings.REPORT_CACHE_TIMEOUT)
+
+
+def _store(key, future):
+    with _lock:
+        _pending.pop(key, None)
+    if future.exception() is None:
+        _rendered(key, future.result())
+
+
+def request_report(key, username, year, month, rows):
+    """
+    Returns a future for the PDF stored under `key`, submitting it to the
+    worker pool unless the same report is already being rendered.
+    """
+    if not settings.REPORT_WORKERS:
+        future = Future()
+        future.set_result(render_monthly_report(username, year, month, rows))
+        _store(key, future)
+        return future
+
+    with _lock:
+        future = _pending.get(key)
+        if future is None:
+            future = render(username, year, month, rows)
+            _pending[key] = future
+            future.add_done_callback(partial(_store, key))
+    return future
+
+
+def render_reports(jobs):
+    """
+    Yields (key, pdf) for `jobs`, a mapping of cache key -> (username, year,
+    month, rows). Cached PDFs come first, misses are rendered in parallel
+    across the worker pool and yielded as they complete.
+    """
+    cached = cache.get_many(list(jobs))
+    yield from cached.items()
+
+    missing = [key for key in jobs if key not in cached]
+    if not settings.REPORT_WORKERS:
+        for key in missing:
+            pdf = render_monthly_report(*jobs[key])
+            _rendered(key, pdf)
+            yield key, pdf
+        return
+
+    futures = {render(*jobs[key]): key for key in missing}
+    for future in as_completed(futures):
+        key = futures[future]
+        pdf = future.result()
+        _rendered(key, pdf)
+        yield key, pdf
+
+
+class ZipStream:
+    """Write-only buffer that lets zipfile produce an archive chunk by chunk."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(files):
+    """Yields a ZIP archive of `files`, an iterable of (name, content)."""
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+            yield stream.pop()
+    yield stream.pop()
@@ -0,0 +1,93 @@
+"""
+Monotonic revisions of SaisieTemps changes, for the changes feed.
+
+A client that synced up to revision N must not miss a later commit of a
+smaller revision, so current_revision() only reports revisions below every
+transaction still in progress.
+
+On PostgreSQL, revisions come from the api_revision_seq sequence, which
+never blocks. Before taking its values, a transaction holds a shared
+advisory lock keyed on the next value it may get, until it ends;
+current_revision() is bounded by the smallest such key in pg_locks. A key is
+read from the sequence before the values are drawn, so a transaction not
+yet in pg_locks when the horizon is computed can only get revisions above
+it. Writers never wait on each other. Lock keys are 32-bit integers, hence
+an integer sequence.
+
+Elsewhere (SQLite, which serializes writers anyway), a counter row locked
+until commit plays both roles.
+"""
+from django.db import connections, transaction
+from django.db.models import Max
+
+from .models import RevisionCounter, SaisieTemps, SaisieTempsTombstone
+
+SEQUENCE = 'api_revision_seq'
+# First key of the advisory locks of the transactions holding revisions.
+LOCK_CLASS = 0x7265
+
+
+def allocate_revisions(count=1):
+    """Returns `count` new increasing revisions. Must run in a transaction."""
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        raise transaction.TransactionManagementError(
+            "Revisions must be allocated inside the transaction of the change")
+    if connection.vendor != 'postgresql':
+        counter, _ = RevisionCounter.objects.select_for_update().get_or_create(pk=1)
+        first = counter.value + 1
+        counter.value += count
+        counter.save(update_fields=['value'])
+        return range(first, first + count)
+
+    if not count:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock_shared(%s, (last_value + is_called::integer)::integer) '
+            f'FROM {SEQUENCE}',
+            [LOCK_CLASS])
+        cursor.execute(
+            'SELECT nextval(%s) FROM generate_series(1, %s)', [SEQUENCE, count])
+        return [revision for revision, in cursor.fetchall()]
+
+
+def current_revision():
+    """Revision up to which every change is committed (or rolled back)."""
+    connection = connections['default']
+    if connection.vendor != 'postgresql':
+        return RevisionCounter.objects.filter(pk=1).values_list('value', flat=True).first() or 0
+
+    with connection.cursor() as cursor:
+        # The sequence first, see the module docstring.
+        cursor.execute(f'SELECT last_value, is_called FROM {SEQUENCE}')
+        last_value, is_called = cursor.fetchone()
+        cursor.execute(
+            "SELECT min(objid::bigint) FROM pg_locks "
+            "WHERE locktype = 'advisory' AND classid = %s AND objsubid = 2",
+            [LOCK_CLASS])
+        pending, = cursor.fetchone()
+    last = last_value if is_called else last_value - 1
+    return last if pending is None else min(last, pending - 1)
+
+
+def create_revision_sequence(sender, using='default', **kwargs):
+    """
+    post_migrate hook creating the revision sequence on PostgreSQL, started
+    after the revisions already handed out.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [SEQUENCE])
+        if cursor.fetchone()[0] is not None:
+            return
+        cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {SEQUENCE} AS integer')
+        last = max(
+            RevisionCounter.objects.using(using).filter(pk=1)
+            .values_list('value', flat=True).first() or 0,
+            *(model.objects.using(using).aggregate(last=Max('revision'))['last'] or 0
+              for model in (SaisieTemps, SaisieTempsTombstone)))
+        if last:
+            cursor.execute('SELECT setval(%s, %s)', [SEQUENCE, last])
@@ -0,0 +1,51 @@
+"""
+User directory search: prefix matching for short terms, substring matching
+for longer ones.
+
+On PostgreSQL, Django compiles `istartswith`/`icontains` to
+`UPPER(col::text) LIKE UPPER(...)`; the indexes created after migrate cover
+exactly that expression, so both stay indexed on large directories. The
+pg_trgm GIN indexes serve the substring match. Terms shorter than a trigram
+cannot use them, hence the prefix match, served by btree indexes in
+text_pattern_ops order, which only scan the names starting with the term.
+"""
+from django.db import connections
+from django.db.models import Q
+
+SEARCH_FIELDS = ('username', 'first_name', 'last_name', 'email')
+TRIGRAM_LENGTH = 3
+
+
+def search_users(queryset, term):
+    """Users of `queryset` whose username, name or email matches `term`."""
+    lookup = 'icontains' if len(term) >= TRIGRAM_LENGTH else 'istartswith'
+    condition = Q()
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f'{field}__{lookup}': term})
+    return queryset.filter(condition)
+
+
+def create_search_indexes(sender, using='default', **kwargs):
+    """
+    post_migrate hook creating the pg_trgm and prefix indexes of the searched
+    columns.
+    Kept out of the migrations so SQLite databases, which have no pg_trgm,
+    migrate unchanged.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+
+    from .models import User
+
+    table = User._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for field in SEARCH_FIELDS:
+            column = User._meta.get_field(field).column
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm '
+                f'ON {table} USING gin (UPPER({column}) gin_trgm_ops)')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_{column}_prefix '
+                f'ON {table} (UPPER({column}) text_pattern_ops)')
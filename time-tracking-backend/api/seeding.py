@@ -0,0 +1,164 @@
+import random
+import uuid
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import User, Projet, SaisieTemps, CompteRendu, DailyTotal, MonthlyTotal
+from .totals import month_start
+
+FULL_DAY = Decimal('1.00')
+HALF_DAY = Decimal('0.50')
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def working_days(start, end):
+    day = start
+    while day < end:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+
+def day_entries(rng, user_id, projet_ids, day):
+    """One full day on a project, or two half days, so the 1-day cap always holds."""
+    if len(projet_ids) > 1 and rng.random() < 0.3:
+        first, second = rng.sample(projet_ids, 2)
+        return [(user_id, first, day, HALF_DAY), (user_id, second, day, HALF_DAY)]
+    return [(user_id, rng.choice(projet_ids), day, FULL_DAY)]
+
+
+def seed_org(managers=5, users_per_manager=20, projects_per_manager=3, years=1,
+             end=None, prefix=None, batch_size=5000, seed=0, span=0,
+             comptes_rendus=False):
+    """
+    Creates a synthetic organisation with bulk_create: `managers` managers,
+    each with `users_per_manager` users and `projects_per_manager` projects,
+    and one working day of entries per user for `years` years up to `end`.
+
+    With `span` > 0 the managers form a tree where each one reports to a
+    manager of the level above, `span` managers per parent. With
+    `comptes_rendus` each user also gets one compte rendu per month.
+
+    The daily and monthly totals are written directly, as bulk_create does
+    not send the signals that normally maintain them. Entries keep revision
+    0, like entries that predate the changes feed, which leaves them out.
+    """
+    rng = random.Random(seed)
+    prefix = prefix or f'load-{uuid.uuid4().hex[:8]}'
+    end = end or date.today().replace(day=1)
+    start = end.replace(year=end.year - years)
+    password = make_password(None)
+
+    with transaction.atomic():
+        manager_objs = User.objects.bulk_create([
+            User(username=f'{prefix}-m{index}', password=password,
+                 role='manager', is_staff=True)
+            for index in range(managers)
+        ], batch_size=batch_size)
+
+        if span:
+            for index, manager in enumerate(manager_objs[1:], start=1):
+                manager.manager_id = manager_objs[(index - 1) // span].id
+            User.objects.bulk_update(manager_objs[1:], ['manager'], batch_size=batch_size)
+
+        user_objs = User.objects.bulk_create([
+            User(username=f'{prefix}-m{m_index}-u{index}', password=password,
+                 role='user', manager_id=manager.id)
+            for m_index, manager in enumerate(manager_objs)
+            for index in range(users_per_manager)
+        ], batch_size=batch_size)
+
+        projet_objs = Projet.objects.bulk_create([
+            Projet(nom=f'{prefix}-m{m_index}-p{index}', manager_id=manager.id)
+            for m_index, manager in enumerate(manager_objs)
+            for index in range(projects_per_manager)
+        ], batch_size=batch_size)
+
+        projets_by_manager = defaultdict(list)
+        for projet in projet_objs:
+            projets_by_manager[projet.manager_id].append(projet.id)
+
+        Membership = Projet.users.through
+        Membership.objects.bulk_create((
+            Membership(projet_id=projet_id, user_id=user.id)
+            for user in user_objs
+            for projet_id in projets_by_manager[user.manager_id]
+        ), batch_size=batch_size)
+
+        days = list(working_days(start, end))
+        entries, monthly = seed_entries(
+            rng, [(user.id, projets_by_manager[user.manager_id]) for user in user_objs],
+            days, batch_size)
+
+        if comptes_rendus:
+            current = max((mois for _, mois in monthly), default=None)
+            CompteRendu.objects.bulk_create((
+                CompteRendu(user_id=user_id, mois=mois, total_temps=total,
+                            statut='draft' if mois == current else 'final')
+                for (user_id, mois), total in monthly.items()
+            ), batch_size=batch_size)
+
+    return {
+        'prefix': prefix,
+        'managers': [manager.id for manager in manager_objs],
+        'users': [user.id for user in user_objs],
+        'projets': [projet.id for projet in projet_objs],
+        'entries': entries,
+        'comptes_rendus': len(monthly) if comptes_rendus else 0,
+        'start': start,
+        'end': end,
+    }
+
+
+def seed_entries(rng, users, days, batch_size=5000):
+    """
+    Bulk inserts entries for `users`, a list of (user_id, projet_ids), over
+    `days`, `batch_size` user-days at a time, along with their daily and
+    monthly totals. Returns the number of entries created and the monthly
+    totals, keyed by (user_id, month).
+    """
+    created = 0
+    monthly = defaultdict(Decimal)
+
+    def user_days():
+        for user_id, projet_ids in users:
+            if not projet_ids:
+                continue
+            for day in days:
+                yield day_entries(rng, user_id, projet_ids, day)
+
+    # Batches hold whole user-days, so each daily total is written exactly once.
+    for batch in batched(user_days(), batch_size):
+        entries = [entry for group in batch for entry in group]
+        SaisieTemps.objects.bulk_create([
+            SaisieTemps(user_id=user_id, projet_id=projet_id, date=day, temps=temps)
+            for user_id, projet_id, day, temps in entries
+        ])
+        daily = defaultdict(Decimal)
+        for user_id, _, day, temps in entries:
+            daily[(user_id, day)] += temps
+            monthly[(user_id, month_start(day))] += temps
+        DailyTotal.objects.bulk_create([
+            DailyTotal(user_id=user_id, date=day, total=total)
+            for (user_id, day), total in daily.items()
+        ])
+        created += len(entries)
+
+    MonthlyTotal.objects.bulk_create((
+        MonthlyTotal(user_id=user_id, mois=mois, total=total)
+        for (user_id, mois), total in monthly.items()
+    ), batch_size=batch_size)
+    return created, monthly
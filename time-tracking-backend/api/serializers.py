@@ -1,13 +1,23 @@
+from collections import defaultdict
+from decimal import Decimal
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from .models import Projet, SaisieTemps, CompteRendu
-from django.db.models import Sum
+from .models import Projet, SaisieTemps, CompteRendu, DailyTotal
+from . import events
+from .metrics import VALIDATION_REJECTIONS
+from .profiling import TimedSerializerMixin, serializer_timer
+from .revisions import allocate_revisions
+from .totals import apply_deltas, get_daily_total, lock_daily_totals, lock_entry_days
+from .visibility import get_visibility
+from django.db import transaction
+from django.utils import timezone
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=False)
 
     class Meta:
@@ -89,6 +99,7 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         token['username'] = user.username
         token['is_superuser'] = user.is_superuser
         token['is_staff'] = user.is_staff
+        token['manager_id'] = user.manager_id
         return token
 
     def validate(self, attrs):
@@ -101,8 +112,9 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         return data
 
 
-class ProjetSerializer(serializers.ModelSerializer):
+class ProjetSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     users = UserSerializer(many=True, read_only=True)
+    user_count = serializers.SerializerMethodField()
     user_ids = serializers.PrimaryKeyRelatedField(
         many=True,
         queryset=User.objects.all(),
@@ -113,9 +125,19 @@ class ProjetSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Projet
-        fields = ('id', 'nom', 'description', 'manager', 'users', 'user_ids')
+        fields = ('id', 'nom', 'description', 'manager', 'users', 'user_count', 'user_ids')
         read_only_fields = ('id',)
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get('expand_users', True):
+            # Lean representation: member IDs instead of full profiles.
+            self.fields['users'] = serializers.PrimaryKeyRelatedField(
+                many=True, read_only=True)
+
+    def get_user_count(self, obj):
+        return len(obj.users.all())
+
     def validate_manager(self, value):
         if not value.is_staff and not value.is_superuser:
             raise serializers.ValidationError(
@@ -127,21 +149,20 @@ class ProjetSerializer(serializers.ModelSerializer):
         if not request or not request.user:
             raise serializers.ValidationError("Utilisateur non authentifié")
 
-        manager = self.initial_data.get(
-            'manager') if self.instance is None else self.instance.manager
-        if isinstance(manager, str):
-            manager = User.objects.get(id=manager)
+        manager_id = self.initial_data.get(
+            'manager') if self.instance is None else self.instance.manager_id
 
         if request.user.role == 'admin':
             return value
 
         if request.user.role == 'manager':
-            if request.user.id != manager.id:
+            if str(request.user.id) != str(manager_id):
                 raise serializers.ValidationError(
                     "Vous ne pouvez pas assigner des utilisateurs à un projet que vous ne gérez pas")
 
+            managed = get_visibility(request).managed_user_ids
             invalid_users = [
-                user for user in value if user.manager_id != request.user.id]
+                user for user in value if user.id not in managed]
             if invalid_users:
                 usernames = ', '.join(
                     [user.username for user in invalid_users])
@@ -151,17 +172,19 @@ class ProjetSerializer(serializers.ModelSerializer):
         return value
 
 
-class SaisieTempsSerializer(serializers.ModelSerializer):
+class SaisieTempsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = SaisieTemps
-        fields = ('id', 'user', 'projet', 'date', 'temps', 'description')
-        read_only_fields = ('id',)
+        fields = ('id', 'user', 'projet', 'date', 'temps', 'description', 'revision')
+        read_only_fields = ('id', 'revision')
         extra_kwargs = {
             'description': {'required': False}
         }
 
     def validate(self, data):
-        request_user = self.context['request'].user
+        request = self.context['request']
+        request_user = request.user
+        visibility = get_visibility(request)
 
         target_user = data.get('user') if not self.instance else data.get(
             'user', self.instance.user)
@@ -170,10 +193,9 @@ class SaisieTempsSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "Vous ne pouvez pas créer/modifier les entrées d'un autre utilisateur")
 
-        if request_user.is_staff and not request_user.is_superuser:
-            if target_user.id != request_user.id and target_user.manager_id != request_user.id:
-                raise serializers.ValidationError(
-                    "Vous ne pouvez gérer que vos propres entrées ou celles de vos utilisateurs")
+        if request_user.is_staff and not visibility.can_manage_user(target_user.id):
+            raise serializers.ValidationError(
+                "Vous ne pouvez gérer que vos propres entrées ou celles de vos utilisateurs")
 
         if self.instance:
             date = data.get('date', self.instance.date)
@@ -184,26 +206,60 @@ class SaisieTempsSerializer(serializers.ModelSerializer):
             new_temps = data['temps']
             projet = data['projet']
 
-        if not request_user.is_staff and not projet.users.filter(id=target_user.id).exists():
+        if not request_user.is_staff and not visibility.can_use_project(projet.id):
+            VALIDATION_REJECTIONS.inc(reason='project_access')
             raise serializers.ValidationError(
                 "Vous n'avez pas accès à ce projet. Contactez votre manager pour obtenir l'accès.")
 
-        if self.instance and self.instance.temps == new_temps:
+        # Checked again with the day locked in save()
+        self._day = ((target_user.id, date), new_temps)
+        if self.instance and (
+                self.instance.user_id, self.instance.date, self.instance.temps
+        ) == (target_user.id, date, new_temps):
             return data
 
-        queryset = SaisieTemps.objects.filter(user=target_user, date=date)
-        if self.instance:
-            queryset = queryset.exclude(id=self.instance.id)
+        total_temps = get_daily_total(target_user.id, date)
+        if self.instance and (self.instance.user_id, self.instance.date) == (target_user.id, date):
+            total_temps -= self.instance.temps
+        self.check_daily_cap(total_temps, new_temps)
 
-        total_temps = queryset.aggregate(total=Sum('temps'))['total'] or 0
+        return data
 
+    def check_daily_cap(self, total_temps, new_temps):
         if total_temps + new_temps > 1.0:
+            VALIDATION_REJECTIONS.inc(reason='daily_cap')
             raise serializers.ValidationError(
                 f"Le temps total ({total_temps + new_temps}) ne peut pas dépasser 1 journée. "
                 f"Vous avez déjà saisi {total_temps} jour(s) pour cette date."
             )
 
-        return data
+    def save(self, **kwargs):
+        """
+        Saves once the day is locked, see totals.lock_daily_totals: the cap
+        is checked again against the committed total, and the entry against
+        what was persisted meanwhile.
+        """
+        key, new_temps = self._day
+        with transaction.atomic():
+            if self.instance is None:
+                total_temps = lock_daily_totals([key])[key]
+            else:
+                totals = lock_entry_days(self.instance, [key])
+                if totals is None:
+                    raise NotFound("Saisie introuvable")
+                previous = self.instance._persisted
+                if previous == (*key, new_temps):
+                    return super().save(**kwargs)
+                total_temps = totals[key] - (previous[2] if previous[:2] == key else 0)
+            self.check_daily_cap(total_temps, new_temps)
+            return super().save(**kwargs)
+
+    def create(self, validated_data):
+        # The day is locked by save() already
+        entry = SaisieTemps(**validated_data)
+        entry._days_locked = True
+        entry.save()
+        return entry
 
     def validate_temps(self, value):
         if value not in [0, 0.5, 1]:
@@ -212,15 +268,198 @@ class SaisieTempsSerializer(serializers.ModelSerializer):
         return value
 
 
-class CompteRenduSerializer(serializers.ModelSerializer):
+def saisie_temps_rows(rows):
+    """
+    Turns rows of values(*SaisieTempsSerializer.Meta.fields) into their
+    SaisieTempsSerializer representation, in place: read-only listings skip
+    the model instances and field machinery of every row.
+    """
+    with serializer_timer():
+        for row in rows:
+            row['date'] = row['date'].isoformat()
+            row['temps'] = f"{row['temps']:.2f}"
+    return rows
+
+
+class SaisieTempsBulkItemSerializer(serializers.Serializer):
+    user = serializers.IntegerField(required=False)
+    projet = serializers.IntegerField()
+    date = serializers.DateField()
+    temps = serializers.DecimalField(max_digits=5, decimal_places=2)
+    description = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_temps(self, value):
+        if value not in [0, 0.5, 1]:
+            raise serializers.ValidationError(
+                "Le temps doit être 0, 0.5 (demi-journée) ou 1 (journée entière)")
+        return value
+
+
+class SaisieTempsBulkSerializer(serializers.Serializer):
+    """
+    Applies a whole grid of (user, projet, date, temps) cells at once.
+
+    A cell with temps 0 deletes the matching entry. Every check runs as one
+    query over all cells instead of once per entry, and the writes go through
+    bulk_create/bulk_update inside a single transaction, together with the
+    matching DailyTotal/MonthlyTotal updates.
+    """
+    entries = SaisieTempsBulkItemSerializer(many=True, allow_empty=False)
+
+    def validate_entries(self, entries):
+        request_user = self.context['request'].user
+
+        cells = {}
+        for entry in entries:
+            entry.setdefault('user', request_user.id)
+            key = (entry['user'], entry['projet'], entry['date'])
+            if key in cells:
+                raise serializers.ValidationError(
+                    f"Cellule en double pour l'utilisateur {key[0]}, "
+                    f"le projet {key[1]} et la date {key[2]}")
+            cells[key] = entry
+
+        user_ids = {key[0] for key in cells}
+        projet_ids = {key[1] for key in cells}
+        dates = {key[2] for key in cells}
+
+        users = {
+            user.id: user for user in
+            User.objects.filter(id__in=user_ids).only('id', 'manager_id')
+        }
+        if len(users) != len(user_ids):
+            raise serializers.ValidationError("Certains utilisateurs n'existent pas")
+
+        visibility = get_visibility(self.context['request'])
+        for user in users.values():
+            if not request_user.is_staff and user.id != request_user.id:
+                raise serializers.ValidationError(
+                    "Vous ne pouvez pas créer/modifier les entrées d'un autre utilisateur")
+            if request_user.is_staff and not visibility.can_manage_user(user.id):
+                raise serializers.ValidationError(
+                    "Vous ne pouvez gérer que vos propres entrées ou celles de vos utilisateurs")
+
+        if Projet.objects.filter(id__in=projet_ids).count() != len(projet_ids):
+            raise serializers.ValidationError("Certains projets n'existent pas")
+
+        if not request_user.is_staff:
+            if projet_ids - visibility.project_ids:
+                VALIDATION_REJECTIONS.inc(reason='project_access')
+                raise serializers.ValidationError(
+                    "Vous n'avez pas accès à ce projet. Contactez votre manager pour obtenir l'accès.")
+
+        day_totals = {
+            (row['user_id'], row['date']): row['total'] for row in
+            DailyTotal.objects.filter(
+                user_id__in=user_ids, date__in=dates
+            ).values('user_id', 'date', 'total')
+        }
+        self.check_daily_caps(cells, day_totals, self.existing_rows(cells))
+        return list(cells.values())
+
+    @staticmethod
+    def existing_rows(cells):
+        """Entries of the `cells`, a mapping of (user, projet, date) keys, by key."""
+        return {
+            (row.user_id, row.projet_id, row.date): row for row in
+            SaisieTemps.objects.filter(
+                user_id__in={key[0] for key in cells},
+                projet_id__in={key[1] for key in cells},
+                date__in={key[2] for key in cells},
+            ).only('id', 'user_id', 'projet_id', 'date', 'temps', 'description')
+            if (row.user_id, row.projet_id, row.date) in cells
+        }
+
+    @staticmethod
+    def check_daily_caps(cells, day_totals, existing):
+        day_totals = defaultdict(int, day_totals)
+        for row in existing.values():
+            day_totals[(row.user_id, row.date)] -= row.temps
+
+        new_totals = defaultdict(int)
+        for (user_id, projet_id, day), entry in cells.items():
+            new_totals[(user_id, day)] += entry['temps']
+
+        for (user_id, day), new_temps in sorted(new_totals.items()):
+            total_temps = day_totals[(user_id, day)]
+            if total_temps + new_temps > 1.0:
+                VALIDATION_REJECTIONS.inc(reason='daily_cap')
+                raise serializers.ValidationError(
+                    f"Le temps total ({total_temps + new_temps}) ne peut pas dépasser 1 journée "
+                    f"pour l'utilisateur {user_id} le {day}. "
+                    f"Vous avez déjà saisi {total_temps} jour(s) pour cette date."
+                )
+
+    def create(self, validated_data):
+        cells = {
+            (entry['user'], entry['projet'], entry['date']): entry
+            for entry in validated_data['entries']
+        }
+        to_create, to_update, to_delete = [], [], []
+        deltas = defaultdict(Decimal)
+        now = timezone.now()  # bulk_update does not apply auto_now
+
+        with transaction.atomic():
+            # Checked again with the days locked, see totals.lock_daily_totals
+            day_totals = lock_daily_totals((user_id, day) for user_id, _, day in cells)
+            existing = self.existing_rows(cells)
+            self.check_daily_caps(cells, day_totals, existing)
+
+            for key, entry in cells.items():
+                row = existing.get(key)
+                if entry['temps'] == 0:
+                    if row is not None:
+                        to_delete.append(row.id)
+                elif row is None:
+                    deltas[(entry['user'], entry['date'])] += entry['temps']
+                    to_create.append(SaisieTemps(
+                        user_id=entry['user'],
+                        projet_id=entry['projet'],
+                        date=entry['date'],
+                        temps=entry['temps'],
+                        description=entry.get('description', ''),
+                    ))
+                else:
+                    deltas[(row.user_id, row.date)] += entry['temps'] - row.temps
+                    row.temps = entry['temps']
+                    row.description = entry.get('description', row.description)
+                    row.updated_at = now
+                    to_update.append(row)
+
+            revisions = iter(allocate_revisions(len(to_create) + len(to_update)))
+            for row in to_create + to_update:
+                row.revision = next(revisions)
+            created = SaisieTemps.objects.bulk_create(to_create)
+            SaisieTemps.objects.bulk_update(
+                to_update, ['temps', 'description', 'updated_at', 'revision'])
+            # bulk_create/bulk_update skip the post_save signal, deletes don't.
+            apply_deltas(deltas)
+            result = {
+                'created': SaisieTempsSerializer(created, many=True).data,
+                'updated': SaisieTempsSerializer(to_update, many=True).data,
+                'deleted': to_delete,
+            }
+            events.entries_saved(created + to_update, result['created'] + result['updated'])
+            if to_delete:
+                SaisieTemps.objects.filter(id__in=to_delete).delete()
+
+        return result
+
+
+class CompteRenduSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = CompteRendu
         fields = ('id', 'user', 'mois', 'total_temps', 'statut')
         read_only_fields = ('id', 'total_temps')
 
     def validate(self, data):
-        user = self.context['request'].user
-        if not user.is_staff and data['user'] != user:
+        request = self.context['request']
+        user = request.user
+        target_user = data.get('user', getattr(self.instance, 'user', None))
+        if not user.is_staff and target_user != user:
             raise serializers.ValidationError(
                 "Vous ne pouvez pas créer/modifier le compte rendu d'un autre utilisateur")
+        if user.is_staff and not get_visibility(request).can_manage_user(target_user.id):
+            raise serializers.ValidationError(
+                "Vous ne pouvez gérer que vos propres comptes rendus ou ceux de vos utilisateurs")
         return data
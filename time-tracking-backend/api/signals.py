@@ -0,0 +1,89 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import User, Projet, SaisieTemps, SaisieTempsTombstone
+from .authentication import forget_user
+from .revisions import allocate_revisions
+from .visibility import invalidate_visibility
+from . import events, totals
+
+
+@receiver(post_save, sender=SaisieTemps)
+def update_totals_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    totals.entry_saved(instance)
+    events.entries_saved([instance])
+
+
+# As on save, deletions lock the days first, then take the revision of the
+# tombstone, then lock the monthly totals (see totals.lock_daily_totals).
+# Admin, queryset and cascade deletions included.
+@receiver(pre_delete, sender=SaisieTemps)
+def lock_days_on_delete(sender, instance, **kwargs):
+    if not instance.__dict__.pop('_days_locked', False):
+        instance._deleted_meanwhile = totals.lock_entry_days(instance) is None
+        instance.__dict__.pop('_days_locked')
+
+
+@receiver(post_delete, sender=SaisieTemps)
+def record_tombstone(sender, instance, **kwargs):
+    if getattr(instance, '_deleted_meanwhile', False):
+        return
+    # Read under lock on pre_delete, even when the instance deferred it
+    user_id = instance._persisted[0]
+    revision = allocate_revisions()[0]
+    SaisieTempsTombstone.objects.create(
+        entry_id=instance.pk, user_id=user_id, revision=revision)
+    events.entry_deleted(instance.pk, user_id, revision)
+
+
+@receiver(post_delete, sender=SaisieTemps)
+def update_totals_on_delete(sender, instance, **kwargs):
+    if getattr(instance, '_deleted_meanwhile', False):
+        return
+    totals.entry_deleted(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Projet)
+@receiver(post_delete, sender=Projet)
+def invalidate_visibility_on_change(sender, **kwargs):
+    invalidate_visibility()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # Again on commit, in case another request cached the old row meanwhile.
+    forget_user(instance.pk)
+    transaction.on_commit(partial(forget_user, instance.pk))
+
+
+@receiver(m2m_changed, sender=Projet.users.through)
+def invalidate_visibility_on_membership_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_visibility()
+
+
+@receiver(m2m_changed, sender=Projet.users.through)
+def touch_projects_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # The member list is part of the project representation and its ETag.
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Projet.objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+    elif action in ('post_add', 'post_remove'):
+        Projet.objects.filter(pk__in=pk_set).update(updated_at=timezone.now())
+    elif action == 'pre_clear':
+        Projet.objects.filter(users=instance).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=User)
+def touch_projects_on_member_delete(sender, instance, **kwargs):
+    # The membership rows go by cascade, without m2m_changed.
+    Projet.objects.filter(users=instance).update(updated_at=timezone.now())
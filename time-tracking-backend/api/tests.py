@@ -1,11 +1,58 @@
 from django.test import TestCase
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from .models import Projet, SaisieTemps, CompteRendu
+from .models import (
+    Projet, SaisieTemps, CompteRendu, DailyTotal, MonthlyTotal,
+    RevisionCounter, SaisieTempsTombstone
+)
+from .dates import month_bounds, month_range
+from .reports import render, report_cache_key, report_rows
+from .totals import backfill_totals, get_daily_total, get_monthly_total, rebuild_totals
+from .management.commands.seed_load import split
+from . import metrics
+from .visibility import Visibility, get_visibility
+from .authentication import USER_FIELDS, CachedJWTAuthentication
+from .revisions import allocate_revisions, current_revision
+from .events import LocalBroker, PostgresBroker, get_broker
+from .renderers import ORJSONRenderer
+from .search import SEARCH_FIELDS, search_users
+from .admin import EstimatedCountPaginator
+from .imports import hash_passwords, shared_pool
+from .serializers import SaisieTempsSerializer, SaisieTempsBulkSerializer
+from .views import SaisieTempsViewSet
+from .middleware import MetricsMiddleware, ProfilingMiddleware
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework.renderers import JSONRenderer
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection, migrations, transaction
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.hashers import check_password
+from django.core.files.uploadedfile import SimpleUploadedFile
 from decimal import Decimal
-from datetime import date
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime, timedelta
+from openpyxl import load_workbook
+from unittest import mock
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from pathlib import Path
 
 User = get_user_model()
 
@@ -315,3 +362,2368 @@ class APITests(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response['Content-Type'], 'application/pdf')
+
+
+class SaisieTempsListTests(APITestCase):
+    """Test cases for time entry list filters and cursor pagination"""
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123',
+            manager=self.manager
+        )
+        self.projet = Projet.objects.create(
+            nom="Test Project",
+            description="Test Description",
+            manager=self.manager
+        )
+        self.projet.users.add(self.user)
+        for day in range(1, 11):
+            SaisieTemps.objects.create(
+                user=self.user,
+                projet=self.projet,
+                date=date(2025, 3, day),
+                temps=Decimal('1.00')
+            )
+        SaisieTemps.objects.create(
+            user=self.manager,
+            projet=self.projet,
+            date=date(2025, 3, 3),
+            temps=Decimal('0.50')
+        )
+        self.url = reverse('saisietemps-list')
+
+    def test_list_without_pagination_params_returns_plain_list(self):
+        """Test that the list stays a plain array when no cursor is requested"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 11)
+
+    def test_list_filters(self):
+        """Test user, projet and date range filters"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get(self.url, {
+            'user': self.user.id,
+            'projet': self.projet.id,
+            'date_after': '2025-03-03',
+            'date_before': '2025-03-09',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 7)
+        self.assertTrue(all(entry['user'] == self.user.id for entry in response.data))
+
+    def test_list_invalid_date_filter(self):
+        """Test that a malformed date filter is rejected"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get(self.url, {'date_after': '03/03/2025'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cursor_pagination_walks_all_rows_in_order(self):
+        """Test that following next links returns every row once, ordered on (date, id)"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get(self.url, {'page_size': 4})
+        seen = []
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend((entry['date'], entry['id']) for entry in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(seen), 11)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_invalid_cursor(self):
+        """Test that a tampered cursor is rejected"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SaisieTempsBulkTests(APITestCase):
+    """Test cases for the weekly bulk upsert endpoint"""
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123',
+            manager=self.manager
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@test.com',
+            password='otherpass123'
+        )
+        self.projet = Projet.objects.create(
+            nom="Test Project",
+            description="Test Description",
+            manager=self.manager
+        )
+        self.projet2 = Projet.objects.create(
+            nom="Second Project",
+            description="Second Description",
+            manager=self.manager
+        )
+        self.projet.users.add(self.user)
+        self.projet2.users.add(self.user)
+        self.url = reverse('saisietemps-bulk')
+
+    def week(self, projet, temps, days=5):
+        return [
+            {'projet': projet.id, 'date': date(2025, 3, day).isoformat(), 'temps': temps}
+            for day in range(3, 3 + days)
+        ]
+
+    def test_bulk_creates_week(self):
+        """Test that a whole week is saved in one request"""
+        self.client.force_authenticate(user=self.user)
+        payload = self.week(self.projet, '0.50') + self.week(self.projet2, '0.50')
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['created']), 10)
+        self.assertEqual(SaisieTemps.objects.filter(user=self.user).count(), 10)
+
+    def test_bulk_updates_and_deletes(self):
+        """Test that existing cells are updated in place and zero cells are deleted"""
+        kept = SaisieTemps.objects.create(
+            user=self.user, projet=self.projet, date=date(2025, 3, 3), temps=Decimal('0.50'))
+        removed = SaisieTemps.objects.create(
+            user=self.user, projet=self.projet2, date=date(2025, 3, 3), temps=Decimal('0.50'))
+        self.client.force_authenticate(user=self.manager)
+        payload = {'entries': [
+            {'user': self.user.id, 'projet': self.projet.id, 'date': '2025-03-03', 'temps': '1.00'},
+            {'user': self.user.id, 'projet': self.projet2.id, 'date': '2025-03-03', 'temps': '0'},
+        ]}
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['deleted'], [removed.id])
+        kept.refresh_from_db()
+        self.assertEqual(kept.temps, Decimal('1.00'))
+        self.assertFalse(SaisieTemps.objects.filter(id=removed.id).exists())
+
+    def test_bulk_rejects_daily_cap_across_cells(self):
+        """Test that cells of the same day are summed against the 1 day cap"""
+        self.client.force_authenticate(user=self.user)
+        payload = self.week(self.projet, '1.00', days=1) + self.week(self.projet2, '0.50', days=1)
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(SaisieTemps.objects.exists())
+
+    def test_bulk_rejects_other_users_entries(self):
+        """Test that a regular user cannot write cells for someone else"""
+        self.client.force_authenticate(user=self.other)
+        payload = [{'user': self.user.id, 'projet': self.projet.id,
+                    'date': '2025-03-03', 'temps': '1.00'}]
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_query_count_does_not_grow_with_cells(self):
+        """Test that the number of queries does not depend on the number of cells"""
+        self.client.force_authenticate(user=self.user)
+        # Created by the first write ever, not part of the comparison.
+        RevisionCounter.objects.get_or_create(pk=1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.url, self.week(self.projet, '0.50', days=1), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(
+                self.url,
+                [
+                    {'projet': projet.id, 'date': date(2025, 4, day).isoformat(), 'temps': '0.50'}
+                    for projet in (self.projet, self.projet2) for day in range(1, 6)
+                ],
+                format='json')
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+
+class TotalsTests(APITestCase):
+    """Test cases for the materialized daily and monthly totals"""
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123',
+            manager=self.manager
+        )
+        self.projet = Projet.objects.create(
+            nom="Test Project",
+            description="Test Description",
+            manager=self.manager
+        )
+        self.projet2 = Projet.objects.create(
+            nom="Second Project",
+            description="Second Description",
+            manager=self.manager
+        )
+        self.projet.users.add(self.user)
+        self.projet2.users.add(self.user)
+
+    def daily(self, day):
+        return get_daily_total(self.user.id, day)
+
+    def monthly(self, day):
+        return get_monthly_total(self.user.id, day)
+
+    def test_totals_follow_create_update_delete(self):
+        """Test that totals are kept current by saves and deletes"""
+        entry = SaisieTemps.objects.create(
+            user=self.user, projet=self.projet, date=date(2025, 3, 3), temps=Decimal('0.50'))
+        SaisieTemps.objects.create(
+            user=self.user, projet=self.projet2, date=date(2025, 3, 4), temps=Decimal('1.00'))
+        self.assertEqual(self.daily(date(2025, 3, 3)), Decimal('0.50'))
+        self.assertEqual(self.monthly(date(2025, 3, 1)), Decimal('1.50'))
+
+        entry.temps = Decimal('1.00')
+        entry.date = date(2025, 4, 1)
+        entry.save()
+        self.assertEqual(self.daily(date(2025, 3, 3)), Decimal('0'))
+        self.assertEqual(self.daily(date(2025, 4, 1)), Decimal('1.00'))
+        self.assertEqual(self.monthly(date(2025, 3, 1)), Decimal('1.00'))
+        self.assertEqual(self.monthly(date(2025, 4, 1)), Decimal('1.00'))
+
+        SaisieTemps.objects.get(id=entry.id).delete()
+        self.assertEqual(self.daily(date(2025, 4, 1)), Decimal('0'))
+        self.assertEqual(self.monthly(date(2025, 4, 1)), Decimal('0'))
+
+    def test_totals_follow_bulk_endpoint_and_cascades(self):
+        """Test that bulk writes and project deletion keep totals current"""
+        self.client.force_authenticate(user=self.user)
+        payload = [
+            {'projet': self.projet.id, 'date': '2025-03-03', 'temps': '0.50'},
+            {'projet': self.projet2.id, 'date': '2025-03-03', 'temps': '0.50'},
+        ]
+        response = self.client.post(reverse('saisietemps-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.daily(date(2025, 3, 3)), Decimal('1.00'))
+
+        payload[0]['temps'] = '0'
+        self.client.post(reverse('saisietemps-bulk'), payload, format='json')
+        self.assertEqual(self.daily(date(2025, 3, 3)), Decimal('0.50'))
+
+        self.projet2.delete()
+        self.assertEqual(self.monthly(date(2025, 3, 1)), Decimal('0'))
+
+    def test_compte_rendu_uses_monthly_total(self):
+        """Test that a monthly report takes its total from the materialized store"""
+        SaisieTemps.objects.create(
+            user=self.user, projet=self.projet, date=date(2025, 3, 3), temps=Decimal('1.00'))
+        SaisieTemps.objects.create(
+            user=self.user, projet=self.projet, date=date(2025, 3, 4), temps=Decimal('0.50'))
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.post(reverse('compterendu-list'), {
+            'user': self.user.id, 'mois': '2025-03-01', 'statut': 'draft'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Decimal(response.data['total_temps']), Decimal('1.50'))
+
+    def test_rebuild_totals(self):
+        """Test that the totals can be rebuilt from scratch"""
+        SaisieTemps.objects.create(
+            user=self.user, projet=self.projet, date=date(2025, 3, 3), temps=Decimal('0.50'))
+        DailyTotal.objects.all().delete()
+        MonthlyTotal.objects.all().delete()
+        rebuild_totals()
+        self.assertEqual(self.daily(date(2025, 3, 3)), Decimal('0.50'))
+        self.assertEqual(self.monthly(date(2025, 3, 1)), Decimal('0.50'))
+
+    def test_totals_are_backfilled_after_their_migration(self):
+        """Test that the entries predating the totals are counted once their table is migrated"""
+        SaisieTemps.objects.create(
+            user=self.user, projet=self.projet, date=date(2025, 3, 3), temps=Decimal('0.50'))
+        DailyTotal.objects.all().delete()
+        MonthlyTotal.objects.all().delete()
+        other = migrations.Migration('0002_other', 'api')
+        backfill_totals(sender=None, plan=[(other, False)])
+        self.assertFalse(DailyTotal.objects.exists())
+
+        created = migrations.Migration('0002_totals', 'api')
+        created.operations = [migrations.CreateModel('DailyTotal', fields=[])]
+        backfill_totals(sender=None, plan=[(other, False), (created, False)])
+        self.assertEqual(self.daily(date(2025, 3, 3)), Decimal('0.50'))
+        self.assertEqual(self.monthly(date(2025, 3, 1)), Decimal('0.50'))
+
+    def test_deferred_fields_are_read_before_saving(self):
+        """Test that saving an entry loaded with deferred fields moves its old value"""
+        entry = SaisieTemps.objects.create(
+            user=self.user, projet=self.projet, date=date(2025, 3, 3), temps=Decimal('0.50'))
+        deferred = SaisieTemps.objects.only('id').get(pk=entry.pk)
+        deferred.temps = Decimal('1')
+        deferred.save()
+        self.assertEqual(self.daily(date(2025, 3, 3)), Decimal('1.00'))
+
+        deferred = SaisieTemps.objects.defer('date', 'temps').get(pk=entry.pk)
+        deferred.date = date(2025, 4, 1)
+        deferred.save()
+        self.assertEqual(self.daily(date(2025, 3, 3)), Decimal('0'))
+        self.assertEqual(self.daily(date(2025, 4, 1)), Decimal('1.00'))
+        self.assertEqual(self.monthly(date(2025, 3, 1)), Decimal('0'))
+        self.assertEqual(self.monthly(date(2025, 4, 1)), Decimal('1.00'))
+
+        SaisieTemps.objects.only('id').get(pk=entry.pk).delete()
+        self.assertEqual(self.daily(date(2025, 4, 1)), Decimal('0'))
+
+
+class MonthRangeQueryTests(TestCase):
+    """Test cases for index-friendly month filtering"""
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123'
+        )
+        self.projet = Projet.objects.create(
+            nom="Test Project",
+            description="Test Description",
+            manager=self.manager
+        )
+        for day in (date(2024, 12, 31), date(2025, 1, 1), date(2025, 1, 31), date(2025, 2, 1)):
+            SaisieTemps.objects.create(
+                user=self.user, projet=self.projet, date=day, temps=Decimal('1.00'))
+
+    def test_month_bounds(self):
+        """Test month boundaries, including the December rollover"""
+        self.assertEqual(month_bounds(2025, 1), (date(2025, 1, 1), date(2025, 2, 1)))
+        self.assertEqual(month_bounds(2024, 12), (date(2024, 12, 1), date(2025, 1, 1)))
+
+    def test_month_range_selects_whole_month_only(self):
+        """Test that the range keeps the first and last day and nothing else"""
+        dates = SaisieTemps.objects.filter(month_range(2025, 1)).values_list('date', flat=True)
+        self.assertEqual(sorted(dates), [date(2025, 1, 1), date(2025, 1, 31)])
+
+    def test_month_range_uses_user_date_index(self):
+        """Test with EXPLAIN that the monthly lookup is served by the (user, date) index"""
+        queryset = SaisieTemps.objects.filter(month_range(2025, 1), user=self.user)
+        self.assertNotIn('EXTRACT', str(queryset.query).upper())
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+        self.assertIn('saisie_user_date_idx', plan)
+
+
+class ReportCacheTests(APITestCase):
+    """Test cases for cached and background PDF report generation"""
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123',
+            manager=self.manager
+        )
+        self.projet = Projet.objects.create(
+            nom="Test Project",
+            description="Test Description",
+            manager=self.manager
+        )
+        self.entry = SaisieTemps.objects.create(
+            user=self.user, projet=self.projet, date=date(2025, 2, 3), temps=Decimal('1.00'))
+        self.url = reverse('saisietemps-report', kwargs={
+            'user_id': self.user.id,
+            'month': '2025-02'
+        })
+        self.client.force_authenticate(user=self.manager)
+
+    def test_report_is_served_from_cache(self):
+        """Test that an unchanged month is not rendered twice"""
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        with mock.patch('api.views.request_report') as request_report:
+            second = self.client.get(self.url)
+        request_report.assert_not_called()
+        self.assertEqual(second.content, first.content)
+
+    def test_report_cache_is_invalidated_by_entry_changes(self):
+        """Test that editing an entry of the month produces a new cache key"""
+        rows = report_rows(self.user.id, 2025, 2)
+        before = report_cache_key(self.user.id, self.user.username, 2025, 2, rows)
+        self.entry.temps = Decimal('0.50')
+        self.entry.save()
+        rows = report_rows(self.user.id, 2025, 2)
+        after = report_cache_key(self.user.id, self.user.username, 2025, 2, rows)
+        self.assertNotEqual(before, after)
+
+    def test_broken_pool_is_retried(self):
+        """Test that a report pending on a pool that broke is rendered on a fresh one"""
+        broken, rendered = Future(), Future()
+        broken.set_exception(BrokenProcessPool())
+        rendered.set_result(b'%PDF')
+        with mock.patch('api.reports.submit', side_effect=[broken, rendered]):
+            self.assertEqual(render('user', 2025, 2, []).result(timeout=1), b'%PDF')
+
+    @override_settings(REPORT_SYNC_MAX_ENTRIES=0, SHARED_CACHE=True)
+    def test_large_month_returns_202_then_pdf(self):
+        """Test that large months are rendered in the background and polled"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response['Location'], response.data['poll'])
+
+        for _ in range(100):
+            response = self.client.get(response.data['poll'])
+            if response.status_code == status.HTTP_200_OK:
+                break
+            time.sleep(0.1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    @override_settings(REPORT_SYNC_MAX_ENTRIES=0, SHARED_CACHE=False)
+    def test_large_month_waits_without_shared_cache(self):
+        """Test that large months are rendered in the request with a local cache"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    @override_settings(SHARED_CACHE=False, REPORT_WAIT=0.1)
+    def test_wait_is_bounded_without_shared_cache(self):
+        """Test that a render outlasting REPORT_WAIT answers 202 with a local cache"""
+        with mock.patch('api.views.request_report', return_value=Future()):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response['Location'], response.data['poll'])
+
+
+class TeamReportTests(APITestCase):
+    """Test cases for the team-wide monthly PDF export"""
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.projet = Projet.objects.create(
+            nom="Test Project",
+            description="Test Description",
+            manager=self.manager
+        )
+        self.team = []
+        for index in range(3):
+            member = User.objects.create_user(
+                username=f'user{index}',
+                email=f'user{index}@test.com',
+                password='userpass123',
+                manager=self.manager
+            )
+            SaisieTemps.objects.create(
+                user=member, projet=self.projet, date=date(2025, 2, 3), temps=Decimal('1.00'))
+            self.team.append(member)
+        self.outsider = User.objects.create_user(
+            username='outsider',
+            email='outsider@test.com',
+            password='userpass123'
+        )
+        self.url = reverse('saisietemps-team-report', kwargs={'month': '2025-02'})
+
+    def test_team_report_zip_contains_one_pdf_per_managed_user(self):
+        """Test that the export bundles a PDF for every managed user"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(
+            sorted(archive.namelist()),
+            [f'report-2025-02-user{index}.pdf' for index in range(3)])
+        for name in archive.namelist():
+            self.assertTrue(archive.read(name).startswith(b'%PDF'))
+
+    def test_team_report_query_count_does_not_grow_with_team(self):
+        """Test that users and entries are fetched once for the whole team"""
+        self.client.force_authenticate(user=self.manager)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+            b''.join(response.streaming_content)
+        # The managed user IDs of the visibility, then users and entries
+        self.assertLessEqual(len(queries.captured_queries), 3)
+
+    async def test_team_report_is_streamed_under_asgi(self):
+        """Test that ASGI requests get the ZIP through an async iterator"""
+        token = await sync_to_async(lambda: str(AccessToken.for_user(self.manager)))()
+        response = await self.async_client.get(
+            self.url, headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(hasattr(response.streaming_content, '__anext__'))
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(zipfile.ZipFile(io.BytesIO(content)).namelist()), 3)
+
+    def test_team_report_forbidden_for_regular_users(self):
+        """Test that a regular user cannot export a team report"""
+        self.client.force_authenticate(user=self.outsider)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ExportTests(APITestCase):
+    """Test cases for the streaming payroll export"""
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@test.com',
+            password='adminpass123'
+        )
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123'
+        )
+        self.projet = Projet.objects.create(
+            nom="Test Project",
+            description="Test Description",
+            manager=self.manager
+        )
+        for day in (date(2024, 12, 31), date(2025, 1, 2), date(2025, 3, 31), date(2025, 4, 1)):
+            SaisieTemps.objects.create(
+                user=self.user, projet=self.projet, date=day, temps=Decimal('1.00'))
+        self.url = reverse('saisietemps-export')
+        self.client.force_authenticate(user=self.admin)
+
+    def test_csv_export_streams_quarter(self):
+        """Test that a quarter is exported as CSV with usernames and project names"""
+        response = self.client.get(self.url, {'start': '2025-01', 'end': '2025-03'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        lines = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(lines[0], ['id', 'utilisateur', 'projet', 'date', 'temps', 'description'])
+        self.assertEqual([line[3] for line in lines[1:]], ['2025-01-02', '2025-03-31'])
+        self.assertEqual(lines[1][1:3], ['user', 'Test Project'])
+
+    def test_xlsx_export(self):
+        """Test that the export can be produced as an XLSX workbook"""
+        response = self.client.get(self.url, {'start': '2025-01', 'type': 'xlsx'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        rows = list(workbook.active.values)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][1], 'user')
+
+    async def test_csv_export_is_streamed_under_asgi(self):
+        """Test that ASGI requests get the CSV through an async iterator"""
+        token = await sync_to_async(lambda: str(AccessToken.for_user(self.admin)))()
+        response = await self.async_client.get(
+            self.url, {'start': '2025-01', 'end': '2025-03'},
+            headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(hasattr(response.streaming_content, '__anext__'))
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.decode('utf-8').strip().splitlines()), 3)
+
+    def test_export_rejects_invalid_parameters(self):
+        """Test that the export validates its month and type parameters"""
+        response = self.client.get(self.url, {'start': '01/2025'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'start': '2025-01', 'type': 'pdf'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_is_scoped_to_visible_entries(self):
+        """Test that a regular user only exports their own entries"""
+        other = User.objects.create_user(
+            username='other',
+            email='other@test.com',
+            password='userpass123'
+        )
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.url, {'start': '2025-01'})
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(len(content.strip().splitlines()), 1)
+
+
+class VisibilityTests(APITestCase):
+    """Test cases for the per-request manager/user visibility service"""
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123',
+            manager=self.manager
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@test.com',
+            password='userpass123'
+        )
+        self.projet = Projet.objects.create(
+            nom="Test Project",
+            description="Test Description",
+            manager=self.manager
+        )
+        self.projet.users.add(self.user)
+
+    def test_sets_are_computed_once(self):
+        """Test that managed users and projects are queried at most once"""
+        visibility = Visibility(self.manager)
+        with self.assertNumQueries(2):
+            self.assertEqual(visibility.managed_user_ids, {self.user.id})
+            self.assertTrue(visibility.can_manage_user(self.user.id))
+            self.assertFalse(visibility.can_manage_user(self.other.id))
+            self.assertEqual(visibility.project_ids, {self.projet.id})
+            self.assertTrue(visibility.can_use_project(self.projet.id))
+
+    def test_visibility_is_shared_for_a_request(self):
+        """Test that the service is built once per request"""
+        request = RequestFactory().get('/')
+        request.user = self.manager
+        self.assertIs(get_visibility(request), get_visibility(request))
+
+    @override_settings(VISIBILITY_CACHE_TIMEOUT=60)
+    def test_cached_sets_are_invalidated_on_user_change(self):
+        """Test the optional TTL cache and its invalidation on User.save"""
+        self.assertEqual(Visibility(self.manager).managed_user_ids, {self.user.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(Visibility(self.manager).managed_user_ids, {self.user.id})
+
+        self.other.manager = self.manager
+        self.other.save()
+        self.assertEqual(
+            Visibility(self.manager).managed_user_ids, {self.user.id, self.other.id})
+
+    def test_manager_cannot_write_compte_rendu_for_unmanaged_user(self):
+        """Test that monthly reports follow the same visibility rules as entries"""
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('compterendu-list')
+        response = self.client.post(url, {
+            'user': self.other.id, 'mois': '2025-03-01', 'statut': 'draft'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {
+            'user': self.user.id, 'mois': '2025-03-01', 'statut': 'draft'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+class ProjetListTests(APITestCase):
+    """Test cases for the lean and expanded project list representations"""
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@test.com',
+            password='adminpass123'
+        )
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.members = [
+            User.objects.create_user(
+                username=f'user{index}',
+                email=f'user{index}@test.com',
+                password='userpass123',
+                manager=self.manager
+            )
+            for index in range(3)
+        ]
+        self.url = reverse('projet-list')
+        self.client.force_authenticate(user=self.admin)
+
+    def create_projects(self, count):
+        for index in range(count):
+            projet = Projet.objects.create(
+                nom=f"Project {index}",
+                description="Description",
+                manager=self.manager
+            )
+            projet.users.add(*self.members)
+
+    def test_list_is_lean_by_default(self):
+        """Test that the list returns member IDs and counts only"""
+        self.create_projects(1)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        projet = response.data[0]
+        self.assertEqual(sorted(projet['users']), sorted(u.id for u in self.members))
+        self.assertEqual(projet['user_count'], 3)
+
+    def test_list_expand_users(self):
+        """Test that ?expand=users embeds the member profiles"""
+        self.create_projects(1)
+        response = self.client.get(self.url, {'expand': 'users'})
+        usernames = sorted(user['username'] for user in response.data[0]['users'])
+        self.assertEqual(usernames, ['user0', 'user1', 'user2'])
+        self.assertNotIn('password', response.data[0]['users'][0])
+
+    def test_list_query_count_is_constant(self):
+        """Test that listing projects costs the same number of queries for 1 or 10 projects"""
+        self.create_projects(1)
+        with CaptureQueriesContext(connection) as one_lean:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as one_expanded:
+            self.client.get(self.url, {'expand': 'users'})
+
+        self.create_projects(9)
+        with self.assertNumQueries(len(one_lean.captured_queries)):
+            self.client.get(self.url)
+        with self.assertNumQueries(len(one_expanded.captured_queries)):
+            response = self.client.get(self.url, {'expand': 'users'})
+        self.assertEqual(len(response.data), 10)
+
+
+@override_settings(REPORT_WORKERS=0)
+class BenchmarkCommandTests(TestCase):
+    """Test the benchmark_api command"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.baseline = Path(self.tmp.name) / 'baseline.json'
+        self.options = {
+            'managers': 1, 'users': 2, 'projects': 2, 'years': 1,
+            'iterations': 2, 'baseline': str(self.baseline), 'stdout': io.StringIO(),
+        }
+
+    def test_save_and_compare_baseline(self):
+        """Test that a run matches the baseline it just saved and leaves no data behind"""
+        call_command('benchmark_api', save_baseline=True, **self.options)
+        results = json.loads(self.baseline.read_text())['results']
+        self.assertIn('saisie-temps.report', results)
+        self.assertEqual(set(results['projets.list']), {'queries', 'p50_ms', 'p95_ms', 'peak_kb'})
+        self.assertFalse(User.objects.exists())
+
+        call_command('benchmark_api', tolerance=100, **self.options)
+        self.assertIn('Aucune régression', self.options['stdout'].getvalue())
+
+    def test_query_regression_fails(self):
+        """Test that more queries than the baseline is reported as a regression"""
+        call_command('benchmark_api', save_baseline=True, **self.options)
+        baseline = json.loads(self.baseline.read_text())
+        baseline['results']['projets.list']['queries'] = 0
+        self.baseline.write_text(json.dumps(baseline))
+
+        with self.assertRaisesMessage(CommandError, 'projets.list'):
+            call_command('benchmark_api', tolerance=100, **self.options)
+
+    def test_other_configuration_fails(self):
+        """Test that a missing baseline is reported and one measured with another configuration fails the run"""
+        call_command('benchmark_api', **self.options)
+        self.assertIn('--update-baseline', self.options['stdout'].getvalue())
+        self.assertFalse(self.baseline.exists())
+
+        call_command('benchmark_api', save_baseline=True, **self.options)
+        baseline = json.loads(self.baseline.read_text())
+        baseline['config']['vendor'] = 'postgresql'
+        self.baseline.write_text(json.dumps(baseline))
+        with self.assertRaisesMessage(CommandError, 'autre configuration'):
+            call_command('benchmark_api', tolerance=100, **self.options)
+
+
+class SeedLoadTests(TestCase):
+    """Test the seed_load command"""
+
+    def test_seed_load(self):
+        """Test the generated hierarchy, daily cap, totals and comptes rendus"""
+        call_command('seed_load', managers=3, users=2, projects=2, years=1,
+                     span=1, batch_size=50, stdout=io.StringIO())
+
+        managers = User.objects.filter(role='manager')
+        self.assertEqual(managers.count(), 3)
+        self.assertEqual(managers.filter(manager__isnull=False).count(), 2)
+        self.assertEqual(User.objects.filter(role='user').count(), 6)
+        self.assertEqual(Projet.objects.count(), 6)
+        for user in User.objects.filter(role='user'):
+            self.assertEqual(
+                set(user.assigned_projects.values_list('manager_id', flat=True)),
+                {user.manager_id})
+
+        self.assertTrue(SaisieTemps.objects.exists())
+        self.assertFalse(DailyTotal.objects.filter(total__gt=1).exists())
+        daily = sorted(DailyTotal.objects.values_list('user_id', 'date', 'total'))
+        monthly = sorted(MonthlyTotal.objects.values_list('user_id', 'mois', 'total'))
+        rebuild_totals()
+        self.assertEqual(daily, sorted(DailyTotal.objects.values_list('user_id', 'date', 'total')))
+        self.assertEqual(monthly, sorted(MonthlyTotal.objects.values_list('user_id', 'mois', 'total')))
+
+        self.assertEqual(CompteRendu.objects.count(), len(monthly))
+        self.assertEqual(CompteRendu.objects.filter(statut='draft').count(), 6)
+
+    def test_split_across_workers(self):
+        """Test that managers are shared between workers without empty slices"""
+        self.assertEqual(split(10, 3), [4, 3, 3])
+        self.assertEqual(split(2, 4), [1, 1])
+
+
+@override_settings(PROFILING_ENABLED=True)
+class ProfilingMiddlewareTests(APITestCase):
+    """Test cases for the request profiling middleware"""
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.projet = Projet.objects.create(nom="Projet", manager=self.manager)
+        self.projet.users.add(self.manager)
+        for day in range(1, 4):
+            SaisieTemps.objects.create(
+                user=self.manager, projet=self.projet, date=date(2024, 4, day), temps=1)
+        self.client.force_authenticate(user=self.manager)
+
+    def timings(self, response):
+        timings = {}
+        for metric in response['Server-Timing'].split(', '):
+            name, *params = metric.split(';')
+            timings[name] = dict(param.split('=', 1) for param in params)
+        return timings
+
+    def test_server_timing_header(self):
+        """Test that the header reports the queries, database and serializer time"""
+        # Entry listings skip the serializers, project ones don't.
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('projet-list'), {'expand': 'users'})
+        timings = self.timings(response)
+        self.assertEqual(timings['db']['desc'], f'"{len(queries.captured_queries)} queries"')
+        self.assertGreater(float(timings['serializer']['dur']), 0)
+        self.assertGreaterEqual(float(timings['total']['dur']), float(timings['db']['dur']))
+
+    @override_settings(PROFILING_SLOW_MS=0)
+    def test_log_line(self):
+        """Test that slow requests are logged as one JSON line"""
+        with self.assertLogs('api.profiling', 'INFO') as logs:
+            response = self.client.get(reverse('saisietemps-list'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], reverse('saisietemps-list'))
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['size'], len(response.content))
+        self.assertGreater(record['queries'], 0)
+        self.assertNotIn('profile', record)
+
+    def test_sampled_profile_is_dumped_for_slow_requests(self):
+        """Test that sampled slow requests leave a cProfile dump"""
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_SLOW_MS=0,
+                                   PROFILING_DIR=directory):
+                with self.assertLogs('api.profiling', 'INFO') as logs:
+                    self.client.get(reverse('projet-list'))
+            record = json.loads(logs.records[0].getMessage())
+            self.assertTrue(record['profile'].startswith(directory))
+            self.assertEqual(len(list(Path(directory).glob('*.prof'))), 1)
+
+    async def test_server_timing_under_asgi(self):
+        """Test that ASGI requests are profiled without a sync middleware"""
+        self.assertTrue(iscoroutinefunction(ProfilingMiddleware(self.async_view)))
+        token = await sync_to_async(lambda: str(AccessToken.for_user(self.manager)))()
+        response = await self.async_client.get(
+            reverse('saisietemps-list'), headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Queries run in the view's thread, not in the middleware's
+        self.assertNotEqual(self.timings(response)['db']['desc'], '"0 queries"')
+
+    @staticmethod
+    async def async_view(request):
+        return HttpResponse()
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled(self):
+        """Test that the middleware is left out when profiling is disabled"""
+        response = self.client.get(reverse('projet-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', response)
+
+
+@override_settings(REPORT_WORKERS=0)
+class MetricsTests(APITestCase):
+    """Test cases for the /metrics endpoint"""
+    def setUp(self):
+        for metric in metrics._registry:
+            metric.clear()
+        cache.clear()
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.projet = Projet.objects.create(nom="Projet", manager=self.manager)
+        self.projet.users.add(self.manager)
+        SaisieTemps.objects.create(
+            user=self.manager, projet=self.projet, date=date(2024, 4, 1), temps=1)
+        self.client.force_authenticate(user=self.manager)
+
+    def test_latency_and_queries_per_action(self):
+        """Test that latency and query counts are recorded per viewset action"""
+        self.client.get(reverse('saisietemps-list'))
+        self.client.post(
+            reverse('projet-assign-users', args=[self.projet.id]),
+            {'user_ids': [self.manager.id]}, format='json')
+
+        self.assertEqual(metrics.REQUEST_LATENCY.count(action='saisie-temps.list', method='GET'), 1)
+        self.assertEqual(metrics.REQUEST_LATENCY.count(
+            action='projets.assign_users', method='POST'), 1)
+        self.assertEqual(metrics.REQUESTS.value(
+            action='saisie-temps.list', method='GET', status=200), 1)
+        self.assertGreater(metrics.DB_QUERIES.value(action='saisie-temps.list'), 0)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE api_request_duration_seconds histogram', body)
+        self.assertIn(
+            'api_request_duration_seconds_bucket'
+            '{action="saisie-temps.list",method="GET",le="+Inf"} 1', body)
+        self.assertNotIn('action="metrics"', body)
+
+    def test_workers_are_summed(self):
+        """Test that /metrics sums the values the other workers wrote to METRICS_DIR"""
+        metrics.REQUESTS.inc(action='a', method='GET', status=200)
+        metrics.REQUEST_QUERIES.observe(3, action='a')
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(METRICS_DIR=directory):
+                # Written as another worker would, then read back as this one
+                with mock.patch('api.metrics._file', Path(directory) / 'other.json'):
+                    metrics.flush()
+                with mock.patch('api.metrics._file', Path(directory) / 'own.json'):
+                    text = metrics.render()
+        self.assertIn('api_requests_total{action="a",method="GET",status="200"} 2', text)
+        self.assertIn('api_request_db_queries_bucket{action="a",le="5"} 2', text)
+        self.assertIn('api_request_db_queries_count{action="a"} 2', text)
+
+    async def test_queries_are_counted_under_asgi(self):
+        """Test that ASGI requests are measured without a sync middleware"""
+        self.assertTrue(iscoroutinefunction(MetricsMiddleware(ProfilingMiddlewareTests.async_view)))
+        token = await sync_to_async(lambda: str(AccessToken.for_user(self.manager)))()
+        response = await self.async_client.get(
+            reverse('saisietemps-list'), headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(metrics.REQUESTS.value(
+            action='saisie-temps.list', method='GET', status=200), 1)
+        self.assertGreater(metrics.DB_QUERIES.value(action='saisie-temps.list'), 0)
+
+    def test_rejections_and_pdf_bytes(self):
+        """Test the daily-cap rejection and rendered PDF bytes counters"""
+        response = self.client.post(reverse('saisietemps-list'), {
+            'user': self.manager.id,
+            'projet': self.projet.id,
+            'date': '2024-04-01',
+            'temps': '0.5'
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(metrics.VALIDATION_REJECTIONS.value(reason='daily_cap'), 1)
+
+        response = self.client.get(
+            reverse('saisietemps-report', args=[self.manager.id, '2024-04']))
+        self.assertEqual(metrics.PDF_REPORTS.value(report='monthly'), 1)
+        self.assertEqual(metrics.PDF_BYTES.value(report='monthly'),
+                         len(response.content))
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        """Test that METRICS_TOKEN protects the endpoint"""
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class JWTUserCacheTests(APITestCase):
+    """Test cases for the cached JWT user lookup"""
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123',
+            manager=self.manager
+        )
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'username': 'user',
+            'password': 'userpass123'
+        }, format='json')
+        self.authorization = f"Bearer {response.data['access']}"
+        self.client.credentials(HTTP_AUTHORIZATION=self.authorization)
+        self.url = reverse('saisietemps-list')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries.captured_queries)
+
+    def test_user_is_cached_between_requests(self):
+        """Test that only the first request loads the user"""
+        cache.clear()
+        first = self.count_queries()
+        self.assertEqual(self.count_queries(), first - 1)
+
+    def test_cache_is_invalidated_on_save(self):
+        """Test that a deactivated user is rejected on the next request"""
+        self.count_queries()
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stale_row_is_not_served_after_save(self):
+        """Test that a row read before a save and cached after it is not served"""
+        self.count_queries()
+        stale = User.objects.filter(pk=self.user.pk).values_list(*USER_FIELDS).first()
+        version = cache.get(f'jwt-user:version:{self.user.pk}')
+        self.user.is_active = False
+        self.user.save()
+        cache.set(f'jwt-user:{self.user.pk}:{version}', stale)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_user_save_keeps_password(self):
+        """Test that saving the authenticated user does not clear its password"""
+        request = RequestFactory().get(self.url, HTTP_AUTHORIZATION=self.authorization)
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        user.first_name = 'Jean'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Jean')
+        self.assertTrue(self.user.check_password('userpass123'))
+
+    @override_settings(JWT_CLAIMS_ONLY=True)
+    def test_claims_only(self):
+        """Test that claims-only mode authenticates without any user query"""
+        with override_settings(JWT_USER_CACHE_TIMEOUT=0):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(self.url)
+        self.assertFalse(any('FROM "api_user"' in query['sql']
+                             for query in queries.captured_queries))
+
+        response = self.client.get(reverse('user-me'))
+        self.assertEqual(response.data['email'], 'user@test.com')
+        self.assertEqual(response.data['manager'], self.manager.id)
+
+
+class ConditionalGetTests(APITestCase):
+    """Test cases for ETag / If-None-Match support"""
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123',
+            manager=self.manager
+        )
+        self.projet = Projet.objects.create(nom="Projet", manager=self.manager)
+        self.projet.users.add(self.user)
+        self.entry = SaisieTemps.objects.create(
+            user=self.user, projet=self.projet, date=date(2024, 4, 1), temps=Decimal('0.5'))
+        self.client.force_authenticate(user=self.user)
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_list_not_modified(self):
+        """Test that an unchanged list answers 304 without serializing"""
+        url = reverse('saisietemps-list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        # The revision horizon and the aggregate
+        self.assertEqual(len(queries.captured_queries), 2)
+
+    def test_list_etag_changes_on_write(self):
+        """Test that updates, additions and deletions change the ETag"""
+        url = reverse('saisietemps-list')
+        etags = [self.client.get(url)['ETag']]
+
+        self.entry.description = "Modifié"
+        self.entry.save()
+        etags.append(self.client.get(url)['ETag'])
+
+        other = SaisieTemps.objects.create(
+            user=self.user, projet=self.projet, date=date(2024, 4, 2), temps=1)
+        etags.append(self.client.get(url)['ETag'])
+
+        self.assertEqual(len(set(etags)), 3)
+
+        other.delete()
+        response = self.revalidate(url, etags[-1])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Back to the same rows as before the addition, hence the same ETag.
+        self.assertEqual(response['ETag'], etags[1])
+
+    def test_etag_changes_with_same_updated_at(self):
+        """Test that a change stamped no later than the served rows changes the ETag"""
+        url = reverse('saisietemps-list')
+        etag = self.client.get(url)['ETag']
+        with mock.patch('django.utils.timezone.now', return_value=self.entry.updated_at):
+            self.entry.temps = Decimal('1')
+            self.entry.save()
+        self.assertEqual(self.revalidate(url, etag).status_code, status.HTTP_200_OK)
+
+    def test_no_etag_while_revisions_are_pending(self):
+        """Test that no ETag is sent while a smaller revision may still commit"""
+        url = reverse('saisietemps-list')
+        with mock.patch('api.conditional.current_revision', return_value=self.entry.revision - 1):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
+
+    def test_monthly_etag_changes_on_bulk_update(self):
+        """Test that bulk updates change the monthly ETag"""
+        url = reverse('saisietemps-monthly', args=[self.user.id, '2024-04'])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.revalidate(url, etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.post(reverse('saisietemps-bulk'), [
+            {'projet': self.projet.id, 'date': '2024-04-01', 'temps': '1'}
+        ], format='json')
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['temps'], '1.00')
+
+    def test_projets_etag_changes_on_membership(self):
+        """Test that membership changes change the project list ETag"""
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('projet-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.revalidate(url, etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.user.assigned_projects.remove(self.projet)
+        self.assertEqual(self.revalidate(url, etag).status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', self.client.get(url, {'expand': 'users'}))
+
+    def test_projets_etag_changes_on_member_delete(self):
+        """Test that deleting a member changes the project list ETag"""
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('projet-list')
+        etag = self.client.get(url)['ETag']
+        self.user.delete()
+        response = self.revalidate(url, etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data[0]['users'], [])
+
+    def test_etag_depends_on_user(self):
+        """Test that two users never share an ETag for the same URL"""
+        url = reverse('saisietemps-monthly', args=[self.user.id, '2024-04'])
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.revalidate(url, etag).status_code, status.HTTP_200_OK)
+
+
+class ChangesFeedTests(APITestCase):
+    """Test cases for the revision-based changes feed"""
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123',
+            manager=self.manager
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@test.com',
+            password='otherpass123'
+        )
+        self.projet = Projet.objects.create(nom="Projet", manager=self.manager)
+        self.projet.users.add(self.user, self.other)
+        self.url = reverse('saisietemps-changes')
+        self.client.force_authenticate(user=self.user)
+
+    def entry(self, user, day, temps='0.5'):
+        return SaisieTemps.objects.create(
+            user=user, projet=self.projet, date=date(2024, 4, day), temps=Decimal(temps))
+
+    def test_changes_since_revision(self):
+        """Test that only rows changed or deleted after `since` are returned"""
+        first = self.entry(self.user, 1)
+        second = self.entry(self.user, 2)
+        response = self.client.get(self.url, {'since': 0})
+        self.assertEqual([e['id'] for e in response.data['entries']], [first.id, second.id])
+        self.assertFalse(response.data['more'])
+        since = response.data['revision']
+
+        first.temps = Decimal('1')
+        first.save()
+        second_id = second.id
+        second.delete()
+        response = self.client.get(self.url, {'since': since})
+        self.assertEqual([e['id'] for e in response.data['entries']], [first.id])
+        self.assertEqual(response.data['entries'][0]['temps'], '1.00')
+        self.assertEqual([d['id'] for d in response.data['deleted']], [second_id])
+        self.assertGreater(response.data['revision'], since)
+
+        response = self.client.get(self.url, {'since': response.data['revision']})
+        self.assertEqual(response.data['entries'], [])
+        self.assertEqual(response.data['deleted'], [])
+
+    def test_changes_are_paged_in_revision_order(self):
+        """Test that `limit` pages through the changes with `more`"""
+        entries = [self.entry(self.user, day) for day in range(1, 4)]
+        deleted_id = entries[0].id
+        entries[0].delete()
+
+        seen, since, more = [], 0, True
+        while more:
+            response = self.client.get(self.url, {'since': since, 'limit': 2})
+            seen += [('entry', e['id']) for e in response.data['entries']]
+            seen += [('deleted', d['id']) for d in response.data['deleted']]
+            since, more = response.data['revision'], response.data['more']
+        self.assertEqual(sorted(seen), sorted(
+            [('entry', entries[1].id), ('entry', entries[2].id), ('deleted', deleted_id)]))
+
+    def test_bulk_writes_take_revisions(self):
+        """Test that bulk upserts appear in the feed"""
+        since = self.client.get(self.url).data['revision']
+        self.client.post(reverse('saisietemps-bulk'), [
+            {'projet': self.projet.id, 'date': '2024-04-01', 'temps': '0.5'},
+            {'projet': self.projet.id, 'date': '2024-04-02', 'temps': '1'},
+        ], format='json')
+        response = self.client.get(self.url, {'since': since})
+        revisions = [e['revision'] for e in response.data['entries']]
+        self.assertEqual(len(set(revisions)), 2)
+
+    def test_changes_follow_visibility(self):
+        """Test that users only see changes and deletions of visible entries"""
+        self.entry(self.other, 1).delete()
+        mine = self.entry(self.user, 1)
+        response = self.client.get(self.url)
+        self.assertEqual([e['id'] for e in response.data['entries']], [mine.id])
+        self.assertEqual(response.data['deleted'], [])
+
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get(self.url)
+        self.assertEqual([e['id'] for e in response.data['entries']], [mine.id])
+
+    def test_invalid_parameters(self):
+        """Test that since and limit must be positive integers"""
+        self.assertEqual(self.client.get(self.url, {'since': 'x'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'limit': '0'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_revisions_need_a_transaction(self):
+        """Test that revisions cannot be taken outside the writing transaction"""
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            with self.assertRaises(transaction.TransactionManagementError):
+                allocate_revisions()
+
+
+class LiveUpdatesTests(APITestCase):
+    """Test cases for the live updates broker and stream"""
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123',
+            manager=self.manager
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@test.com',
+            password='otherpass123'
+        )
+        self.projet = Projet.objects.create(nom="Projet", manager=self.manager)
+        self.projet.users.add(self.user, self.other)
+        self.url = reverse('saisie-temps-stream')
+
+    def event(self, user, revision=1):
+        return {'type': 'saved', 'id': revision, 'user': user.id, 'revision': revision, 'entry': {}}
+
+    def test_changes_are_published_on_commit(self):
+        """Test that saves, bulk writes and deletions publish once committed"""
+        with mock.patch.object(LocalBroker, 'publish') as publish:
+            with self.captureOnCommitCallbacks() as callbacks:
+                entry = SaisieTemps.objects.create(
+                    user=self.user, projet=self.projet, date=date(2024, 4, 1), temps=Decimal('0.5'))
+            publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+            event = publish.call_args.args[0]
+            self.assertEqual((event['type'], event['id'], event['user']),
+                             ('saved', entry.id, self.user.id))
+            self.assertEqual(event['revision'], entry.revision)
+            self.assertEqual(event['entry']['temps'], '0.50')
+
+            publish.reset_mock()
+            entry_id = entry.id
+            with self.captureOnCommitCallbacks(execute=True):
+                entry.delete()
+            event = publish.call_args.args[0]
+            self.assertEqual((event['type'], event['id'], event['entry']),
+                             ('deleted', entry_id, None))
+
+            publish.reset_mock()
+            self.client.force_authenticate(user=self.user)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('saisietemps-bulk'), {'entries': [
+                    {'projet': self.projet.id, 'date': '2024-04-01', 'temps': '0.5'},
+                    {'projet': self.projet.id, 'date': '2024-04-02', 'temps': '0.5'},
+                ]}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                sorted(call.args[0]['id'] for call in publish.call_args_list),
+                sorted(row['id'] for row in response.data['created']))
+
+    async def test_broker_filters_events(self):
+        """Test that subscribers only receive the events they accept"""
+        broker = LocalBroker()
+        subscription = broker.subscribe({self.user.id}.__contains__)
+        broker.publish(self.event(self.other, 1))
+        broker.publish(self.event(self.user, 2))
+        self.assertEqual((await subscription.get(1))['revision'], 2)
+        self.assertIsNone(await subscription.get(0.01))
+
+    @override_settings(LIVE_UPDATES_QUEUE_SIZE=1)
+    async def test_slow_subscriber_is_dropped(self):
+        """Test that a subscriber whose queue overflows loses its subscription"""
+        broker = LocalBroker()
+        subscription = broker.subscribe(lambda user_id: True)
+        broker.publish(self.event(self.user, 1))
+        broker.publish(self.event(self.user, 2))
+        await asyncio.sleep(0)
+        self.assertTrue(subscription.lost)
+        self.assertIsNone(await subscription.get(1))
+        self.assertEqual(broker._subscribers, set())
+
+    async def test_dropped_subscriber_is_woken_up(self):
+        """Test that dropping a subscription wakes its stream up at once"""
+        broker = LocalBroker()
+        subscription = broker.subscribe(lambda user_id: True)
+        await sync_to_async(subscription.drop)()
+        self.assertIsNone(await asyncio.wait_for(subscription.get(60), 1))
+        self.assertTrue(subscription.lost)
+        self.assertEqual(broker._subscribers, set())
+
+    def test_large_events_are_read_back(self):
+        """Test that events too large to notify carry their entry once read back"""
+        entry = SaisieTemps.objects.create(
+            user=self.user, projet=self.projet, date=date(2024, 4, 1), temps=Decimal('0.5'),
+            description='x' * PostgresBroker.max_payload)
+        event = {'type': 'saved', 'id': entry.id, 'user': self.user.id,
+                 'revision': entry.revision, 'entry': None, 'reload': True}
+        read = PostgresBroker()._read(json.dumps(event))
+        self.assertEqual(read['entry'], SaisieTempsSerializer(entry).data)
+        self.assertNotIn('reload', read)
+        # Superseded by a later revision, which has its own event
+        event['revision'] -= 1
+        self.assertIsNone(PostgresBroker()._read(json.dumps(event)))
+
+    async def ticket(self, user):
+        token = await sync_to_async(lambda: str(AccessToken.for_user(user)))()
+        response = await self.async_client.post(
+            reverse('saisietemps-stream-ticket'), headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()['ticket']
+
+    async def test_stream_requires_a_ticket(self):
+        """Test that the stream rejects missing, invalid and spent tickets, and tokens in the URL"""
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await self.async_client.get(self.url, {'ticket': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        token = await sync_to_async(lambda: str(AccessToken.for_user(self.manager)))()
+        response = await self.async_client.get(self.url, {'token': token})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        ticket = await self.ticket(self.manager)
+        with override_settings(LIVE_UPDATES_MAX_AGE=0):
+            response = await self.async_client.get(self.url, {'ticket': ticket})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = await self.async_client.get(self.url, {'ticket': ticket})
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stream_needs_asgi(self):
+        """Test that the stream and its tickets are refused under WSGI, which would buffer it whole"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.post(reverse('saisietemps-stream-ticket'))
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+        token = str(AccessToken.for_user(self.manager))
+        response = self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+    @override_settings(LIVE_UPDATES_MAX_AGE=60)
+    async def test_first_event_arrives_before_the_stream_closes(self):
+        """Test that the events are sent as they come, not when the stream ends"""
+        response = await self.async_client.get(self.url, {'ticket': await self.ticket(self.manager)})
+        content = aiter(response.streaming_content)
+        self.assertIn(b'event: ready', await asyncio.wait_for(anext(content), 1))
+        get_broker().publish(self.event(self.user, 1))
+        self.assertIn(b'event: saved', await asyncio.wait_for(anext(content), 1))
+        await content.aclose()
+
+    @override_settings(LIVE_UPDATES_MAX_AGE=0.5)
+    async def test_stream_sends_visible_changes(self):
+        """Test that the stream sends the changes of the entries the user can see"""
+        response = await self.async_client.get(self.url, {'ticket': await self.ticket(self.manager)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = aiter(response.streaming_content)
+        self.assertIn(b'event: ready', await anext(content))
+
+        get_broker().publish(self.event(self.other, 1))
+        get_broker().publish(self.event(self.user, 2))
+        chunk = (await anext(content)).decode()
+        self.assertTrue(chunk.startswith('id: 2\nevent: saved\n'))
+        self.assertEqual(json.loads(chunk.split('data: ')[1])['user'], self.user.id)
+
+        # The stream ends after LIVE_UPDATES_MAX_AGE and unsubscribes.
+        self.assertEqual([chunk async for chunk in content], [])
+        self.assertEqual(get_broker()._subscribers, set())
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "LISTEN/NOTIFY indisponible")
+class PostgresBrokerTests(TransactionTestCase):
+    """Test the live updates relayed through PostgreSQL LISTEN/NOTIFY"""
+    def setUp(self):
+        self.broker = PostgresBroker()
+        self.addCleanup(self.broker.stop)
+
+    async def test_first_subscriber_receives_events(self):
+        """Test that the first subscriber of a process gets the events published once listening"""
+        subscription = self.broker.subscribe(lambda user_id: True)
+        self.assertTrue(await self.broker.listening(5))
+        await sync_to_async(self.broker.publish)(
+            {'type': 'deleted', 'id': 1, 'user': 1, 'revision': 1, 'entry': None})
+        event = await asyncio.wait_for(subscription.get(60), 5)
+        self.assertEqual(event['id'], 1)
+        self.assertFalse(subscription.lost)
+
+    async def test_events_go_through_notify(self):
+        """Test that published events reach the subscribers through the listener"""
+        subscription = self.broker.subscribe(lambda user_id: user_id == 1)
+        self.assertTrue(await self.broker.listening(5))
+        for user_id in (2, 1):
+            await sync_to_async(self.broker.publish)(
+                {'type': 'deleted', 'id': user_id, 'user': user_id, 'revision': 1, 'entry': None})
+        event = await asyncio.wait_for(subscription.get(60), 5)
+        self.assertEqual((event['id'], event['user']), (1, 1))
+
+    async def test_subscribers_are_dropped_when_the_listener_disconnects(self):
+        """Test that losing the listening connection drops the subscribers"""
+        subscription = self.broker.subscribe(lambda user_id: True)
+        self.assertTrue(await self.broker.listening(5))
+        await sync_to_async(self.broker.stop)()
+        self.assertIsNone(await asyncio.wait_for(subscription.get(60), 5))
+        self.assertTrue(subscription.lost)
+
+
+class FastListingTests(APITestCase):
+    """Test cases for the read-only listing fast path and the orjson renderer"""
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.projet = Projet.objects.create(nom="Projet", manager=self.user)
+        self.projet.users.add(self.user)
+        for day, temps in ((1, '1'), (2, '0.5'), (3, '0.5')):
+            SaisieTemps.objects.create(
+                user=self.user, projet=self.projet, date=date(2024, 4, day),
+                temps=Decimal(temps), description=f"Jour {day} é")
+        self.client.force_authenticate(user=self.user)
+
+    def serialized(self):
+        return json.loads(json.dumps(SaisieTempsSerializer(
+            SaisieTemps.objects.order_by('date', 'id'), many=True).data))
+
+    def test_list_matches_serializer(self):
+        """Test that the fast path lists entries exactly as the serializer"""
+        response = self.client.get(reverse('saisietemps-list'))
+        self.assertEqual(sorted(response.json(), key=lambda e: e['date']), self.serialized())
+
+        response = self.client.get(reverse('saisietemps-list'), {'page_size': 2})
+        rows = response.json()['results']
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(rows + response.json()['results'], self.serialized())
+
+    def test_monthly_matches_serializer(self):
+        """Test that the monthly listing matches the serializer"""
+        response = self.client.get(reverse(
+            'saisietemps-monthly', kwargs={'user_id': self.user.id, 'month': '2024-04'}))
+        self.assertEqual(sorted(response.json(), key=lambda e: e['date']), self.serialized())
+
+    def test_renderer_matches_json_renderer(self):
+        """Test that ORJSONRenderer renders the same bytes as JSONRenderer"""
+        data = {
+            'temps': Decimal('0.50'),
+            'updated_at': timezone.make_aware(datetime(2024, 4, 1, 8, 30, 15, 123456)),
+            'date': date(2024, 4, 1),
+            'message': gettext_lazy("Journée"),
+            'rows': [{'id': 1, 'description': "é"}],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            ORJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_benchmark_command(self):
+        """Test that the serialization benchmark compares both paths"""
+        out = io.StringIO()
+        call_command('benchmark_serialization', rows=50, users=2, iterations=1, stdout=out)
+        self.assertIn('fast-path', out.getvalue())
+        self.assertIn('Coût par ligne', out.getvalue())
+        self.assertEqual(SaisieTemps.objects.count(), 3)
+
+
+class AnalyticsTests(APITestCase):
+    """Test cases for the team utilization analytics"""
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123',
+            manager=self.manager
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@test.com',
+            password='otherpass123'
+        )
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@test.com',
+            password='adminpass123'
+        )
+        self.projet = Projet.objects.create(nom="Projet", manager=self.manager)
+        self.autre = Projet.objects.create(nom="Autre", manager=self.manager)
+        # Friday 29 March, then Monday 1 and Tuesday 2 April 2024
+        for user, projet, day, temps in (
+            (self.user, self.projet, date(2024, 3, 29), '1'),
+            (self.user, self.projet, date(2024, 4, 1), '0.5'),
+            (self.user, self.autre, date(2024, 4, 1), '0.5'),
+            (self.manager, self.autre, date(2024, 4, 2), '1'),
+            (self.other, self.projet, date(2024, 4, 2), '1'),
+        ):
+            SaisieTemps.objects.create(user=user, projet=projet, date=day, temps=Decimal(temps))
+        self.url = reverse('saisietemps-analytics')
+        self.client.force_authenticate(user=self.manager)
+
+    def test_team_matrices_and_rollups(self):
+        """Test the totals, weekly and monthly rollups of a manager's team"""
+        response = self.client.get(self.url, {'start': '2024-03', 'end': '2024-04'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual((data['start'], data['end']), ('2024-03-01', '2024-04-30'))
+        # The users they manage, as in team reports: not the manager
+        self.assertEqual(data['users'], [self.user.id])
+        self.assertEqual(data['projets'], [self.projet.id, self.autre.id])
+        self.assertEqual(data['totals']['users_projets'], [[1.5, 0.5]])
+        self.assertEqual(data['totals']['users'], [2])
+        self.assertEqual(data['totals']['projets'], [1.5, 0.5])
+
+        monthly = data['monthly']
+        self.assertEqual(monthly['periods'], ['2024-03-01', '2024-04-01'])
+        self.assertEqual(monthly['capacity'], [21, 22])
+        self.assertEqual(monthly['users'], [[1, 1]])
+        self.assertEqual(monthly['projets'], [[1, 0.5], [0, 0.5]])
+        self.assertEqual(monthly['utilization'][0], [round(1 / 21, 3), round(1 / 22, 3)])
+
+        weekly = data['weekly']
+        week = weekly['periods'].index('2024-03-25')
+        self.assertEqual(weekly['periods'][week + 1], '2024-04-01')
+        self.assertEqual(weekly['periods'][0], '2024-02-26')
+        self.assertEqual(weekly['capacity'][week], 5)
+        self.assertEqual(weekly['users'][0][week:week + 2], [1, 1])
+        self.assertEqual(weekly['utilization'][0][week], 0.2)
+        self.assertNotIn('cells', data)
+
+    def test_cells(self):
+        """Test the sparse user x project x day cube"""
+        response = self.client.get(self.url, {'start': '2024-04', 'cells': 'true'})
+        data = response.data
+        self.assertEqual(len(data['days']), 30)
+        self.assertEqual(sorted(data['cells']), [[0, 0, 0, 0.5], [0, 1, 0, 0.5]])
+
+    def test_scope(self):
+        """Test that admins see everyone or one manager's team, users nothing"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(self.url, {'start': '2024-04'})
+        self.assertEqual(response.data['users'],
+                         [self.manager.id, self.user.id, self.other.id, self.admin.id])
+        response = self.client.get(self.url, {'start': '2024-04', 'manager': self.manager.id})
+        self.assertEqual(response.data['users'], [self.user.id])
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url, {'start': '2024-04'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_single_grouped_query(self):
+        """Test that the matrices come from the team query and one grouped query"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {'start': '2024-01', 'end': '2024-12'})
+        self.assertEqual(sum('api_saisietemps' in query['sql']
+                             for query in queries.captured_queries), 1)
+        self.assertLessEqual(len(queries.captured_queries), 4)
+
+    def test_invalid_parameters(self):
+        """Test that a missing, malformed or empty period is rejected"""
+        for params in ({}, {'start': '2024'}, {'start': '2024-05', 'end': '2024-04'}):
+            self.assertEqual(self.client.get(self.url, params).status_code,
+                             status.HTTP_400_BAD_REQUEST)
+
+
+class AssignUsersTests(APITestCase):
+    """Test cases for diff-based project membership updates"""
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.other_manager = User.objects.create_user(
+            username='other_manager',
+            email='other_manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.users = [
+            User.objects.create_user(
+                username=f'user{index}',
+                email=f'user{index}@test.com',
+                password='userpass123',
+                manager=self.manager
+            )
+            for index in range(4)
+        ]
+        self.outsider = User.objects.create_user(
+            username='outsider',
+            email='outsider@test.com',
+            password='userpass123'
+        )
+        self.projet = Projet.objects.create(nom="Projet", manager=self.manager)
+        self.projet.users.add(*self.users[:2])
+        self.url = reverse('projet-assign-users', kwargs={'pk': self.projet.id})
+        self.client.force_authenticate(user=self.manager)
+
+    def members(self):
+        return set(self.projet.users.values_list('id', flat=True))
+
+    def ids(self, *indexes):
+        return [self.users[index].id for index in indexes]
+
+    def test_only_the_difference_is_written(self):
+        """Test that a replacement only inserts and deletes the changed rows"""
+        response = self.client.post(self.url, {'user_ids': self.ids(1, 2)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['added'], self.ids(2))
+        self.assertEqual(response.data['removed'], self.ids(0))
+        self.assertEqual(self.members(), set(self.ids(1, 2)))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'user_ids': self.ids(1, 2)}, format='json')
+        self.assertEqual((response.data['added'], response.data['removed']), ([], []))
+        self.assertFalse(any(
+            query['sql'].startswith(('INSERT', 'DELETE', 'UPDATE'))
+            for query in queries.captured_queries))
+
+    def test_add_and_remove(self):
+        """Test incremental additions and removals"""
+        response = self.client.post(
+            self.url, {'add': self.ids(2, 3), 'remove': self.ids(0)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.members(), set(self.ids(1, 2, 3)))
+
+        response = self.client.post(self.url, {'remove': self.ids(1, 2)}, format='json')
+        self.assertEqual(self.members(), set(self.ids(3)))
+
+    def test_manager_rules(self):
+        """Test that managers only add existing regular users they manage"""
+        for data in ({'add': [self.outsider.id]}, {'add': [self.other_manager.id]},
+                     {'add': [0]}, {'user_ids': 'x'}, {'add': ['x']}):
+            response = self.client.post(self.url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.members(), set(self.ids(0, 1)))
+
+        # Other managers do not even see the project
+        self.client.force_authenticate(user=self.other_manager)
+        response = self.client.post(self.url, {'add': self.ids(2)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.members(), set(self.ids(0, 1)))
+
+    def test_changes_update_visibility_and_etag(self):
+        """Test that a change refreshes cached visibility and the project ETag"""
+        before = self.projet.updated_at
+        with override_settings(VISIBILITY_CACHE_TIMEOUT=60):
+            self.assertNotIn(self.projet.id, Visibility(self.users[2]).project_ids)
+            self.client.post(self.url, {'add': self.ids(2)}, format='json')
+            self.assertIn(self.projet.id, Visibility(self.users[2]).project_ids)
+        self.projet.refresh_from_db()
+        self.assertGreater(self.projet.updated_at, before)
+
+    def test_concurrent_additions(self):
+        """Test that members added by a concurrent request do not fail the assignment"""
+        filter_users = User.objects.filter
+
+        def add_meanwhile(*args, **kwargs):
+            self.projet.users.add(self.users[2])
+            return filter_users(*args, **kwargs)
+
+        with mock.patch.object(User.objects, 'filter', side_effect=add_meanwhile):
+            response = self.client.post(self.url, {'add': self.ids(2, 3)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.members(), set(self.ids(0, 1, 2, 3)))
+
+    def test_unexpected_error_is_logged(self):
+        """Test that unexpected errors are logged rather than sent to the client"""
+        with mock.patch('api.views.invalidate_visibility', side_effect=RuntimeError('secret')):
+            with self.assertLogs('api.views', level='ERROR') as logs:
+                response = self.client.post(self.url, {'add': self.ids(2)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertNotIn('secret', response.data['error'])
+        self.assertIn('RuntimeError: secret', logs.output[0])
+
+
+class UserDirectoryTests(APITestCase):
+    """Test cases for user directory search, filters and picker view"""
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@test.com',
+            password='adminpass123'
+        )
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.alice = User.objects.create_user(
+            username='alice',
+            email='alice@example.org',
+            password='userpass123',
+            first_name='Alice',
+            last_name='Martin',
+            manager=self.manager
+        )
+        self.bob = User.objects.create_user(
+            username='bob',
+            email='bob@test.com',
+            password='userpass123',
+            last_name='Dumartin',
+            manager=self.manager
+        )
+        self.carol = User.objects.create_user(
+            username='carol',
+            email='carol@test.com',
+            password='userpass123'
+        )
+        self.url = reverse('user-list')
+
+    def usernames(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row['username'] for row in response.data]
+
+    def test_search(self):
+        """Test prefix search for short terms and substring search otherwise"""
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.usernames({'search': 'ma'}), ['alice', 'manager'])
+        self.assertEqual(self.usernames({'search': 'MARTIN'}), ['alice', 'bob'])
+        self.assertEqual(self.usernames({'search': 'example'}), ['alice'])
+
+    def test_filters(self):
+        """Test role and manager filters, and their validation"""
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.usernames({'role': 'manager,admin'}), ['admin', 'manager'])
+        self.assertEqual(self.usernames({'manager': self.manager.id}), ['alice', 'bob'])
+        self.assertEqual(
+            self.usernames({'manager': self.manager.id, 'role': 'user', 'search': 'bo'}), ['bob'])
+
+        self.assertEqual(self.client.get(self.url, {'role': 'boss'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'manager': 'x'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_filters_stay_within_visibility(self):
+        """Test that a manager only finds the users they can see"""
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.usernames({'search': 'c'}), [])
+        self.assertEqual(self.usernames({'role': 'user'}), ['alice', 'bob'])
+
+    def test_picker_view(self):
+        """Test the compact picker rows and their cursor pagination"""
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(self.url, {'view': 'picker', 'manager': self.manager.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0], {
+            'id': self.alice.id, 'username': 'alice', 'first_name': 'Alice',
+            'last_name': 'Martin', 'role': 'user', 'manager': self.manager.id,
+        })
+
+        usernames = []
+        response = self.client.get(self.url, {'view': 'picker', 'page_size': 2})
+        while True:
+            self.assertLessEqual(len(response.data['results']), 2)
+            usernames += [row['username'] for row in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(usernames, ['admin', 'alice', 'bob', 'carol', 'manager'])
+
+        self.assertEqual(self.client.get(self.url, {'view': 'full'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "Index pg_trgm indisponibles")
+class UserSearchIndexTests(TestCase):
+    """Test that the directory search is served by the indexes created after migrate"""
+    def plan(self, term):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return search_users(User.objects.all(), term).explain()
+
+    def test_short_terms_use_the_prefix_indexes(self):
+        """Test that prefix searches go through the text_pattern_ops indexes"""
+        plan = self.plan('ma')
+        for field in SEARCH_FIELDS:
+            column = User._meta.get_field(field).column
+            self.assertIn(f'{User._meta.db_table}_{column}_prefix', plan)
+
+    def test_long_terms_use_the_trigram_indexes(self):
+        """Test that substring searches go through the pg_trgm indexes"""
+        plan = self.plan('mar')
+        for field in SEARCH_FIELDS:
+            column = User._meta.get_field(field).column
+            self.assertIn(f'{User._meta.db_table}_{column}_trgm', plan)
+
+
+class AdminChangelistTests(TestCase):
+    """Test cases for the admin changelists of large tables"""
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@test.com',
+            password='adminpass123'
+        )
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.users = [
+            User.objects.create_user(
+                username=f'user{index}',
+                email=f'user{index}@test.com',
+                password='userpass123',
+                manager=self.manager
+            )
+            for index in range(3)
+        ]
+        self.projets = [
+            Projet.objects.create(nom=f"Projet {index}", manager=self.manager)
+            for index in range(2)
+        ]
+        self.url = reverse('admin:api_saisietemps_changelist')
+        self.client.force_login(self.admin)
+
+    def add_entries(self, days):
+        for day in range(1, days + 1):
+            for index, user in enumerate(self.users):
+                SaisieTemps.objects.create(
+                    user=user, projet=self.projets[index % 2],
+                    date=date(2024, 1, day), temps=Decimal('0.5'))
+
+    def listed(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl'].result_count
+
+    def test_changelists_render(self):
+        """Test that each changelist renders its input and date range filters"""
+        self.add_entries(1)
+        CompteRendu.objects.create(
+            user=self.users[0], mois=date(2024, 1, 1), total_temps=Decimal('1.5'))
+        for model, parameters in (
+                ('saisietemps', ('name="user"', 'name="projet"', 'name="date__gte"')),
+                ('compterendu', ('name="user"', 'name="mois__lte"')),
+                ('user', ('name="manager"',)),
+                ('projet', ('name="manager"',))):
+            response = self.client.get(reverse(f'admin:api_{model}_changelist'))
+            self.assertEqual(response.status_code, 200)
+            for parameter in parameters:
+                self.assertContains(response, parameter)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Test that the changelist query count does not depend on the rows listed"""
+        self.add_entries(1)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+        self.add_entries(10)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url)
+        self.assertEqual(len(few), len(many))
+        # No second, unfiltered count
+        counts = [query for query in many.captured_queries if 'COUNT(' in query['sql']]
+        self.assertEqual(len(counts), 1)
+
+    def test_filters(self):
+        """Test the user, project and date range filters"""
+        self.add_entries(5)
+        self.assertEqual(self.listed({'user': 'user1'}), 5)
+        self.assertEqual(self.listed({'user': str(self.users[2].id)}), 5)
+        self.assertEqual(self.listed({'projet': 'Projet 1'}), 5)
+        self.assertEqual(self.listed({'date__gte': '2024-01-02', 'date__lte': '2024-01-03'}), 6)
+        self.assertEqual(self.listed({'date__gte': '2024-01-05', 'date__lte': ''}), 3)
+        self.assertEqual(
+            self.listed({'user': 'user0', 'date__gte': '2024-01-04', 'projet': 'Projet 0'}), 2)
+
+        response = self.client.get(self.url, {'date__gte': '2024-13-01'})
+        self.assertRedirects(response, f'{self.url}?e=1', fetch_redirect_response=False)
+
+    def test_paginator_counts_exactly_without_statistics(self):
+        """Test that the paginator counts exactly outside PostgreSQL"""
+        self.add_entries(2)
+        paginator = EstimatedCountPaginator(SaisieTemps.objects.order_by('id'), 4)
+        self.assertEqual((paginator.count, paginator.num_pages), (6, 2))
+
+
+class UserImportTests(APITestCase):
+    """Test cases for the bulk user import"""
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@test.com',
+            password='adminpass123'
+        )
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123',
+            manager=self.manager
+        )
+        self.url = reverse('user-import')
+        self.client.force_authenticate(user=self.admin)
+
+    def rows(self, count, **fields):
+        return [dict({'username': f'new{index}', 'password': f'secret{index}'}, **fields)
+                for index in range(count)]
+
+    def test_json_import(self):
+        """Test that roles, managers and hashed passwords are stored"""
+        response = self.client.post(self.url, [
+            {'username': 'lead', 'password': 'leadpass', 'role': 'manager', 'email': 'lead@test.com'},
+            {'username': 'dev', 'password': 'devpass', 'manager': 'manager', 'first_name': 'Dev'},
+            {'username': 'ops', 'password': 'opspass', 'manager': str(self.manager.id)},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([user['username'] for user in response.data['created']], ['lead', 'dev', 'ops'])
+        self.assertEqual(response.data['errors'], [])
+
+        lead, dev, ops = (User.objects.get(username=name) for name in ('lead', 'dev', 'ops'))
+        self.assertEqual((lead.role, lead.is_staff, lead.is_superuser), ('manager', True, False))
+        self.assertEqual((dev.role, dev.is_staff, dev.manager, dev.first_name),
+                         ('user', False, self.manager, 'Dev'))
+        self.assertEqual(ops.manager, self.manager)
+        self.assertTrue(dev.check_password('devpass'))
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Test that validation and insertion take the same queries for 2 or 20 rows"""
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(self.url, self.rows(2, manager='manager'), format='json')
+        User.objects.filter(username__startswith='new').delete()
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(self.url, self.rows(20, manager='manager'), format='json')
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(User.objects.filter(username__startswith='new').count(), 20)
+
+    def test_per_row_errors(self):
+        """Test that invalid rows are reported by number while the others are created"""
+        response = self.client.post(self.url, [
+            {'username': 'ok', 'password': 'okpass'},
+            {'username': 'user', 'password': 'x'},
+            {'username': 'ok', 'password': 'x'},
+            {'username': 'a', 'password': 'x', 'manager': 'nobody'},
+            {'username': 'b', 'password': 'x', 'manager': 'user'},
+            {'username': 'c', 'password': 'x', 'role': 'boss'},
+            {'username': 'd', 'email': 'not-an-email'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'][0]['username'], 'ok')
+        errors = {error['row']: set(error['errors']) for error in response.data['errors']}
+        self.assertEqual(errors, {
+            2: {'username'}, 3: {'username'}, 4: {'manager'}, 5: {'manager'}, 6: {'role'},
+            7: {'email', 'password'},
+        })
+        self.assertFalse(User.objects.filter(username__in=['a', 'b', 'c', 'd']).exists())
+
+        response = self.client.post(self.url, [{'username': 'user', 'password': 'x'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        for data in ([], {'users': 'x'}):
+            response = self.client.post(self.url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('error', response.data)
+
+    def test_manager_restrictions(self):
+        """Test that a manager only imports users, attached to themselves"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.post(self.url, [
+            {'username': 'mine', 'password': 'x'},
+            {'username': 'lead', 'password': 'x', 'role': 'manager'},
+            {'username': 'theirs', 'password': 'x', 'manager': 'admin'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(User.objects.get(username='mine').manager, self.manager)
+        self.assertEqual({error['row']: set(error['errors']) for error in response.data['errors']},
+                         {2: {'role'}, 3: {'manager'}})
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.url, self.rows(1), format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_csv(self):
+        """Test CSV bodies and uploads, and the dry run"""
+        content = 'username,password,role,manager\nnew0,secret0,user,manager\nnew1,secret1,,\n'
+        response = self.client.post(f'{self.url}?dry_run=true', content, content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['errors']), ([], []))
+        self.assertFalse(User.objects.filter(username__startswith='new').exists())
+
+        upload = SimpleUploadedFile('users.csv', content.encode('utf-8-sig'), content_type='text/csv')
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(User.objects.get(username='new0').manager, self.manager)
+        self.assertIsNone(User.objects.get(username='new1').manager)
+
+        response = self.client.post(self.url, 'name,password\nx,y\n', content_type='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(USER_IMPORT_HTTP_WORKERS=2)
+    def test_passwords_hashed_in_process_pool(self):
+        """Test that passwords hashed by the shared spawned processes are valid"""
+        passwords = [f'secret{index}' for index in range(5)]
+        pool = shared_pool()
+        self.assertIs(shared_pool(), pool)
+        hashed = hash_passwords(passwords, pool)
+        self.assertTrue(all(map(check_password, passwords, hashed)))
+
+    @override_settings(USER_IMPORT_HTTP_MAX_ROWS=2)
+    def test_http_row_limit(self):
+        """Test that HTTP imports are capped below the command's limit"""
+        response = self.client.post(self.url, self.rows(3), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('2 utilisateurs au maximum', response.data['error'])
+        self.assertFalse(User.objects.filter(username__startswith='new').exists())
+
+    def test_command(self):
+        """Test the import_users command and its error report"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.json')
+            with open(path, 'w') as file:
+                json.dump(self.rows(2) + [{'username': 'user', 'password': 'x'}], file)
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command('import_users', path, stdout=stdout, stderr=stderr)
+        self.assertEqual(User.objects.filter(username__startswith='new').count(), 2)
+        self.assertIn('2 utilisateurs créés, 1 en erreur', stdout.getvalue())
+        self.assertIn('Ligne 3 (user)', stderr.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('import_users', '/nonexistent.csv', stdout=io.StringIO())
+
+
+class DailyCapLockingTests(APITestCase):
+    """Test cases for the daily cap and totals under concurrent writes"""
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='manager',
+            email='manager@test.com',
+            password='managerpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='user',
+            email='user@test.com',
+            password='userpass123',
+            manager=self.manager
+        )
+        self.projets = [
+            Projet.objects.create(nom=f"Projet {index}", manager=self.manager)
+            for index in range(3)
+        ]
+        self.projets[0].users.add(self.user)
+        self.projets[1].users.add(self.user)
+        self.day = date(2025, 3, 3)
+        self.client.force_authenticate(user=self.user)
+
+    def concurrently(self, cls, method, write):
+        """Runs `write` right after `method` of `cls` read or validated the request."""
+        original = getattr(cls, method)
+
+        def validated_then_written(self, *args):
+            result = original(self, *args)
+            write()
+            return result
+        return mock.patch.object(cls, method, validated_then_written)
+
+    def other_write(self, temps='0.50'):
+        return lambda: SaisieTemps.objects.create(
+            user=self.user, projet=self.projets[1], date=self.day, temps=Decimal(temps))
+
+    def assert_totals_consistent(self):
+        daily = dict(DailyTotal.objects.filter(total__gt=0).values_list('date', 'total'))
+        rebuild_totals()
+        self.assertEqual(daily, dict(DailyTotal.objects.values_list('date', 'total')))
+
+    def test_create_rechecks_cap_under_lock(self):
+        """Test that a write committed after validation still counts against the cap"""
+        with self.concurrently(SaisieTempsSerializer, 'validate', self.other_write('1.00')):
+            response = self.client.post(reverse('saisietemps-list'), {
+                'user': self.user.id, 'projet': self.projets[0].id,
+                'date': self.day.isoformat(), 'temps': '0.50',
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(get_daily_total(self.user.id, self.day), Decimal('1.00'))
+        self.assertEqual(SaisieTemps.objects.count(), 1)
+
+    def test_bulk_rechecks_cap_under_lock(self):
+        """Test that the bulk grid is checked again once its days are locked"""
+        with self.concurrently(SaisieTempsBulkSerializer, 'validate_entries', self.other_write()):
+            response = self.client.post(reverse('saisietemps-bulk'), [
+                {'projet': self.projets[0].id, 'date': self.day.isoformat(), 'temps': '1.00'},
+            ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(SaisieTemps.objects.count(), 1)
+        self.assert_totals_consistent()
+
+    def test_stale_entries_keep_totals_consistent(self):
+        """Test that updates and deletes apply to what was persisted meanwhile"""
+        entry = SaisieTemps.objects.create(
+            user=self.user, projet=self.projets[0], date=self.day, temps=Decimal('0.50'))
+        url = reverse('saisietemps-detail', kwargs={'pk': entry.id})
+
+        def concurrent_update():
+            current = SaisieTemps.objects.get(pk=entry.id)
+            current.temps = Decimal('1.00')
+            current.save()
+
+        with self.concurrently(SaisieTempsSerializer, 'validate', concurrent_update):
+            response = self.client.patch(url, {'temps': '0.50'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_daily_total(self.user.id, self.day), Decimal('0.50'))
+        self.assert_totals_consistent()
+
+        with self.concurrently(SaisieTempsViewSet, 'get_object', concurrent_update):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(get_daily_total(self.user.id, self.day), Decimal('0'))
+
+    def test_stale_delete_of_a_deleted_entry(self):
+        """Test that deleting an entry already deleted meanwhile changes nothing"""
+        entry = SaisieTemps.objects.create(
+            user=self.user, projet=self.projets[0], date=self.day, temps=Decimal('0.5'))
+        entry_id = entry.pk
+        stale = SaisieTemps.objects.get(pk=entry_id)
+        entry.delete()
+        stale.delete()
+        self.assertEqual(get_daily_total(self.user.id, self.day), Decimal('0'))
+        self.assertEqual(SaisieTempsTombstone.objects.filter(entry_id=entry_id).count(), 1)
+        self.assert_totals_consistent()
+
+    def test_lock_order(self):
+        """Test that every write path locks the day, then the revision counter, then the month"""
+        def first(queries, table):
+            return next(index for index, query in enumerate(queries.captured_queries)
+                        if f'"{table}"' in query['sql'])
+
+        with CaptureQueriesContext(connection) as created:
+            response = self.client.post(reverse('saisietemps-list'), {
+                'user': self.user.id, 'projet': self.projets[0].id,
+                'date': self.day.isoformat(), 'temps': '0.50',
+            }, format='json')
+        with CaptureQueriesContext(connection) as deleted:
+            self.client.delete(reverse('saisietemps-detail', kwargs={'pk': response.data['id']}))
+        with CaptureQueriesContext(connection) as bulk:
+            self.client.post(reverse('saisietemps-bulk'), [
+                {'projet': self.projets[0].id, 'date': self.day.isoformat(), 'temps': '0.50'},
+            ], format='json')
+
+        # Admin and ORM writes, and cascades
+        with CaptureQueriesContext(connection) as orm_created:
+            entry = SaisieTemps.objects.create(
+                user=self.user, projet=self.projets[1], date=self.day, temps=Decimal('0.5'))
+        with CaptureQueriesContext(connection) as orm_updated:
+            entry.date = date(2025, 4, 1)
+            entry.save()
+        with CaptureQueriesContext(connection) as orm_deleted:
+            SaisieTemps.objects.filter(pk=entry.pk).delete()
+        with CaptureQueriesContext(connection) as cascaded:
+            self.projets[0].delete()
+        for queries in (created, deleted, bulk, orm_created, orm_updated, orm_deleted, cascaded):
+            self.assertLess(first(queries, 'api_dailytotal'), first(queries, 'api_revisioncounter'))
+            self.assertLess(first(queries, 'api_revisioncounter'), first(queries, 'api_monthlytotal'))
+
+
+@unittest.skipUnless(connection.features.has_select_for_update, "Verrous de lignes indisponibles")
+class DailyCapConcurrencyTests(TransactionTestCase):
+    """Test the daily cap from many threads writing at once"""
+    threads = 16
+
+    def setUp(self):
+        self.manager = User.objects.create_user(
+            username='manager', password='managerpass123', is_staff=True)
+        self.user = User.objects.create_user(
+            username='user', password='userpass123', manager=self.manager)
+        self.projets = [
+            Projet.objects.create(nom=f"Projet {index}", manager=self.manager)
+            for index in range(self.threads)
+        ]
+        for projet in self.projets:
+            projet.users.add(self.user)
+
+    def hammer(self, cells):
+        """POSTs every (projet, date) cell from its own thread, all at once."""
+        barrier = threading.Barrier(len(cells))
+        statuses = []
+
+        def post(projet, day):
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            try:
+                barrier.wait()
+                statuses.append(client.post(reverse('saisietemps-list'), {
+                    'user': self.user.id, 'projet': projet.id,
+                    'date': day.isoformat(), 'temps': '0.50',
+                }, format='json').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post, args=cell) for cell in cells]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(statuses)
+
+    def test_cap_holds_on_one_day(self):
+        """Test that only two half days out of many concurrent ones are accepted"""
+        day = date(2025, 3, 3)
+        statuses = self.hammer([(projet, day) for projet in self.projets])
+        self.assertEqual(statuses.count(status.HTTP_201_CREATED), 2)
+        self.assertEqual(statuses.count(status.HTTP_400_BAD_REQUEST), self.threads - 2)
+        self.assertEqual(get_daily_total(self.user.id, day), Decimal('1.00'))
+        self.assertEqual(SaisieTemps.objects.filter(date=day).count(), 2)
+
+    def test_other_days_are_not_held(self):
+        """Test that concurrent writes to distinct days all succeed"""
+        days = [date(2025, 3, 1) + timedelta(days=index) for index in range(self.threads)]
+        statuses = self.hammer(list(zip(self.projets, days)))
+        self.assertEqual(statuses, [status.HTTP_201_CREATED] * self.threads)
+        self.assertEqual(
+            sorted(DailyTotal.objects.filter(user=self.user).values_list('total', flat=True)),
+            [Decimal('0.50')] * self.threads)
+
+    def test_writers_do_not_wait_on_each_other(self):
+        """Test that a pending write holds neither other users' days nor the changes feed"""
+        other = User.objects.create_user(
+            username='other', password='otherpass123', manager=self.manager)
+        self.projets[0].users.add(other)
+        pending, release = threading.Event(), threading.Event()
+
+        def write():
+            try:
+                with transaction.atomic():
+                    SaisieTemps.objects.create(user=self.user, projet=self.projets[0],
+                                               date=date(2025, 3, 3), temps=Decimal('0.50'))
+                    pending.set()
+                    release.wait(30)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            self.assertTrue(pending.wait(30))
+            client = APIClient()
+            client.force_authenticate(user=other)
+            with connection.cursor() as cursor:
+                # Waiting on the pending transaction fails instead of hanging.
+                cursor.execute("SET lock_timeout = '2s'")
+            response = client.post(reverse('saisietemps-list'), {
+                'user': other.id, 'projet': self.projets[0].id,
+                'date': '2025-03-04', 'temps': '0.50',
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            # The pending write took a smaller revision, still hidden from the feed.
+            self.assertLess(current_revision(), response.data['revision'])
+        finally:
+            release.set()
+            thread.join()
+            with connection.cursor() as cursor:
+                cursor.execute('RESET lock_timeout')
+        self.assertEqual(current_revision(), response.data['revision'])
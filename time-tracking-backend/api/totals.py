@@ -0,0 +1,192 @@
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.migrations.operations import CreateModel
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import SaisieTemps, DailyTotal, MonthlyTotal
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def get_daily_total(user_id, day):
+    return DailyTotal.objects.filter(
+        user_id=user_id, date=day
+    ).values_list('total', flat=True).first() or Decimal('0')
+
+
+def get_monthly_total(user_id, mois):
+    return MonthlyTotal.objects.filter(
+        user_id=user_id, mois=month_start(mois)
+    ).values_list('total', flat=True).first() or Decimal('0')
+
+
+def lock_daily_totals(keys):
+    """
+    Locks the DailyTotal rows of `keys`, (user_id, date) pairs, until the
+    current transaction ends, creating the missing ones at 0, and returns
+    their totals. Writes to an entry lock its days first, in (user_id, date)
+    order, then take their revisions, then lock the monthly totals, so
+    concurrent writes to the same user-day queue up and see each other's
+    totals without deadlocking, while other user-days are not held.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        raise transaction.TransactionManagementError(
+            "Daily totals must be locked inside the transaction of the change")
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    DailyTotal.objects.bulk_create(
+        [DailyTotal(user_id=user_id, date=day) for user_id, day in keys],
+        ignore_conflicts=True)
+    rows = DailyTotal.objects.select_for_update().filter(
+        reduce(or_, (Q(user_id=user_id, date=day) for user_id, day in keys))
+    ).order_by('user_id', 'date').values_list('user_id', 'date', 'total')
+    return {(user_id, day): total for user_id, day, total in rows}
+
+
+def _persisted_values(entry):
+    return SaisieTemps.objects.filter(pk=entry.pk).values_list(
+        'user_id', 'date', 'temps').first()
+
+
+def lock_entry_days(entry, keys=()):
+    """
+    Locks the days of `keys` and the persisted day of `entry`, then reloads
+    what `entry` last persisted, which a concurrent write may have changed
+    since it was read, or which was deferred when it was loaded. Returns the
+    locked totals, or None if the entry was deleted meanwhile. The next
+    save() or delete() of `entry` then skips locking its days again.
+    """
+    keys = set(keys)
+    previous = getattr(entry, '_persisted', None)
+    if previous is None and not entry._state.adding:
+        previous = _persisted_values(entry)
+    totals = {}
+    while True:
+        day = {previous[:2]} if previous else set()
+        totals.update(lock_daily_totals((keys | day) - totals.keys()))
+        entry._days_locked = True
+        if entry._state.adding:
+            return totals
+        current = _persisted_values(entry)
+        if current is None:
+            return None
+        entry._persisted = current
+        if current[:2] in totals:
+            return totals
+        # Moved to another day meanwhile, which must be locked too
+        previous = current
+
+
+def apply_deltas(deltas):
+    """
+    Adds `deltas`, a mapping of (user_id, date) -> temps, to the daily and
+    monthly totals. Must run in the same transaction as the entry writes.
+    """
+    daily = defaultdict(Decimal)
+    monthly = defaultdict(Decimal)
+    for (user_id, day), delta in deltas.items():
+        if delta:
+            daily[(user_id, day)] += delta
+            monthly[(user_id, month_start(day))] += delta
+
+    with transaction.atomic():
+        _apply(DailyTotal, 'date', daily)
+        _apply(MonthlyTotal, 'mois', monthly)
+
+
+def _apply(model, field, deltas):
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    rows = {
+        (row.user_id, getattr(row, field)): row for row in
+        model.objects.select_for_update().filter(**{
+            'user_id__in': {user_id for user_id, _ in deltas},
+            f'{field}__in': {value for _, value in deltas},
+        })
+    }
+
+    to_update, to_create = [], []
+    for (user_id, value), delta in sorted(deltas.items()):
+        row = rows.get((user_id, value))
+        if row is not None:
+            row.total += delta
+            to_update.append(row)
+        elif delta > 0:
+            # A negative delta without a row means the row already went away
+            # with its user (cascade), there is nothing left to subtract from.
+            to_create.append(model(user_id=user_id, total=delta, **{field: value}))
+
+    model.objects.bulk_update(to_update, ['total'])
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create(to_create)
+    except IntegrityError:
+        # Another transaction created some of these rows in the meantime.
+        for row in to_create:
+            lookup = {'user_id': row.user_id, field: getattr(row, field)}
+            if not model.objects.filter(**lookup).update(total=F('total') + row.total):
+                model.objects.create(total=row.total, **lookup)
+
+
+def entry_saved(entry):
+    deltas = defaultdict(Decimal)
+    previous = getattr(entry, '_persisted', None)
+    if previous is not None:
+        user_id, day, temps = previous
+        deltas[(user_id, day)] -= temps
+    deltas[(entry.user_id, entry.date)] += Decimal(entry.temps)
+    apply_deltas(deltas)
+    entry._remember_totals_key()
+
+
+def entry_deleted(entry):
+    previous = getattr(entry, '_persisted', None)
+    if previous is None:
+        previous = (entry.user_id, entry.date, entry.temps)
+    user_id, day, temps = previous
+    apply_deltas({(user_id, day): -Decimal(temps)})
+
+
+def backfill_totals(sender, plan=None, **kwargs):
+    """
+    post_migrate hook building the totals of the entries that predate them,
+    right after the migration creating DailyTotal is applied.
+    """
+    created = any(
+        not backwards and migration.app_label == 'api' and any(
+            isinstance(operation, CreateModel) and operation.name == 'DailyTotal'
+            for operation in migration.operations)
+        for migration, backwards in plan or ())
+    if created and SaisieTemps.objects.exists():
+        rebuild_totals()
+
+
+def rebuild_totals():
+    """Recomputes every daily and monthly total from SaisieTemps."""
+    with transaction.atomic():
+        DailyTotal.objects.all().delete()
+        MonthlyTotal.objects.all().delete()
+
+        daily = SaisieTemps.objects.values('user_id', 'date').annotate(
+            total=Sum('temps')).order_by()
+        DailyTotal.objects.bulk_create((
+            DailyTotal(user_id=row['user_id'], date=row['date'], total=row['total'])
+            for row in daily.iterator()
+        ), batch_size=1000)
+
+        monthly = SaisieTemps.objects.annotate(mois=TruncMonth('date')).values(
+            'user_id', 'mois').annotate(total=Sum('temps')).order_by()
+        MonthlyTotal.objects.bulk_create((
+            MonthlyTotal(user_id=row['user_id'], mois=row['mois'], total=row['total'])
+            for row in monthly.iterator()
+        ), batch_size=1000)
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     CustomTokenObtainPairView, UserViewSet, ProjetViewSet,
-    SaisieTempsViewSet, CompteRenduViewSet
+    SaisieTempsViewSet, CompteRenduViewSet, saisie_temps_stream
 )
 
 router = DefaultRouter()
@@ -13,6 +13,8 @@ router.register(r'saisie-temps', SaisieTempsViewSet)
 router.register(r'compte-rendus', CompteRenduViewSet)
 
 urlpatterns = [
+    # Before the router, whose saisie-temps/<pk>/ route would match it.
+    path('saisie-temps/stream/', saisie_temps_stream, name='saisie-temps-stream'),
     path('', include(router.urls)),
     path('auth/login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
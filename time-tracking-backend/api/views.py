@@ -1,17 +1,90 @@
+import asyncio
+import json
+import logging
+import time
+
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError, PermissionDenied
+from rest_framework.exceptions import (
+    APIException, NotAuthenticated, NotFound, ValidationError, PermissionDenied
+)
 from rest_framework_simplejwt.views import TokenObtainPairView
+from asgiref.sync import sync_to_async
+from collections import defaultdict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
-from .models import Projet, SaisieTemps, CompteRendu
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET
+from . import metrics
+from .authentication import CachedJWTAuthentication, issue_stream_ticket, redeem_stream_ticket
+from .events import get_broker
+from .models import Projet, SaisieTemps, SaisieTempsTombstone, CompteRendu
+from .conditional import conditional_response
+from .analytics import utilization
+from .dates import month_bounds, month_range, month_span
+from .exports import export_rows, stream_csv, write_xlsx
+from .imports import UserImportError, import_users, read_csv, read_rows, shared_pool
+from .pagination import SaisieTempsPagination, UserPagination
+from .reports import (
+    render_reports, report_cache_key, report_rows, request_report, stream_zip
+)
+from .revisions import current_revision
+from .search import search_users
+from .totals import get_monthly_total, lock_entry_days
+from .visibility import Visibility, get_visibility, invalidate_visibility
 from .serializers import (
     UserSerializer, CustomTokenObtainPairSerializer, ProjetSerializer,
-    SaisieTempsSerializer, CompteRenduSerializer
+    SaisieTempsSerializer, SaisieTempsBulkSerializer, CompteRenduSerializer,
+    saisie_temps_rows
 )
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+def _team_members(request):
+    """
+    The team a staff member reports on: the users they manage. Admins get
+    every user, or the team of the `manager` query parameter.
+    """
+    if not request.user.is_superuser:
+        return User.objects.filter(id__in=get_visibility(request).managed_user_ids)
+    manager_id = request.query_params.get('manager')
+    if not manager_id:
+        return User.objects.all()
+    if not manager_id.isdigit():
+        raise ValidationError({'manager': "Identifiant invalide"})
+    return User.objects.filter(manager_id=int(manager_id))
+
+
+def _streaming_response(request, chunks, **kwargs):
+    """
+    StreamingHttpResponse of the `chunks` iterator. Under ASGI, Django reads
+    a sync iterator whole before sending it, so it gets an async one pulling
+    each chunk in turn from the request's thread.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = _pull(chunks)
+    return StreamingHttpResponse(chunks, **kwargs)
+
+
+async def _pull(chunks):
+    fetch = sync_to_async(next)
+    try:
+        while (chunk := await fetch(chunks, None)) is not None:
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            await sync_to_async(chunks.close)()
 
 
 class IsAdminOrManagerForUserCreation(permissions.BasePermission):
@@ -45,7 +118,7 @@ class UserViewSet(viewsets.ModelViewSet):
             return [IsAdminOrManagerForUserCreation()]
         elif self.action == 'destroy':
             return [permissions.IsAuthenticated(), IsAdminOrManagerForUserCreation()]
-        elif self.action in ['update', 'partial_update']:
+        elif self.action in ['update', 'partial_update', 'bulk_import']:
             return [permissions.IsAuthenticated(), IsManagerOrAdmin()]
         return [permissions.IsAuthenticated()]
 
@@ -57,21 +130,97 @@ class UserViewSet(viewsets.ModelViewSet):
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    pagination_class = UserPagination
+    picker_fields = ('id', 'username', 'first_name', 'last_name', 'role', 'manager')
+
     def get_queryset(self):
         user = self.request.user
 
         if user.is_superuser:
-            return User.objects.all()
-
-        elif user.is_staff:
-
-            return User.objects.filter(models.Q(id=user.id) | models.Q(manager=user))
+            queryset = User.objects.all()
+        else:
+            queryset = User.objects.filter(id__in=get_visibility(self.request).visible_user_ids)
+
+        if self.action == 'list':
+            queryset = self.filter_list_queryset(queryset)
+        return queryset
+
+    def filter_list_queryset(self, queryset):
+        params = self.request.query_params
+
+        manager_id = params.get('manager')
+        if manager_id:
+            if not manager_id.isdigit():
+                raise ValidationError({'manager': "Identifiant invalide"})
+            queryset = queryset.filter(manager_id=int(manager_id))
+
+        if params.get('role'):
+            roles = params['role'].split(',')
+            if not set(roles) <= {role for role, _ in User.ROLES}:
+                raise ValidationError({'role': "Rôle invalide"})
+            queryset = queryset.filter(role__in=roles)
+
+        term = params.get('search', '').strip()
+        if term:
+            queryset = search_users(queryset, term)
+        return queryset.order_by(*UserPagination.ordering)
+
+    def list(self, request, *args, **kwargs):
+        view = request.query_params.get('view')
+        if not view:
+            return super().list(request, *args, **kwargs)
+        if view != 'picker':
+            raise ValidationError({'view': "Vue invalide. Utilisez picker"})
+
+        # Picker rows: only what a select needs, read without serializer
+        rows = self.get_queryset().values(*self.picker_fields)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(list(rows))
+
+    @action(detail=False, methods=['post'], url_path='import', url_name='import')
+    def bulk_import(self, request):
+        """
+        Creates users from a JSON list, a CSV body (text/csv) or an uploaded
+        CSV or JSON `file`. Valid rows are created, the others reported. At
+        most USER_IMPORT_HTTP_MAX_ROWS rows, more with the import_users command.
+        """
+        try:
+            upload = request.FILES.get('file') if request.content_type.startswith('multipart/') else None
+            if request.content_type.startswith('text/csv'):
+                rows = read_csv(request.body)
+            elif upload is not None and upload.name.lower().endswith('.json'):
+                try:
+                    rows = read_rows(json.loads(upload.read()))
+                except ValueError:
+                    raise UserImportError("JSON invalide")
+            elif upload is not None:
+                rows = read_csv(upload.read())
+            else:
+                rows = read_rows(request.data)
+            dry_run = request.query_params.get('dry_run') == 'true'
+            result = import_users(
+                rows, by=request.user, dry_run=dry_run, pool=shared_pool(),
+                max_rows=settings.USER_IMPORT_HTTP_MAX_ROWS)
+        except UserImportError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return User.objects.filter(id=user.id)
+        if dry_run:
+            response_status = status.HTTP_200_OK
+        elif result['created']:
+            response_status = status.HTTP_201_CREATED
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({
+            'created': [{'id': user.id, 'username': user.username} for user in result['created']],
+            'errors': result['errors'],
+        }, status=response_status)
 
     @action(detail=False, methods=['get'])
     def me(self, request):
-        serializer = self.get_serializer(request.user)
+        # request.user may be built from the token claims, read the full profile
+        serializer = self.get_serializer(User.objects.get(pk=request.user.pk))
         return Response(serializer.data)
 
 
@@ -89,28 +238,40 @@ class ProjetViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated(), IsManagerOrAdmin()]
         return [permissions.IsAuthenticated()]
 
+    def expand_users(self):
+        return self.action != 'list' or 'users' in self.request.query_params.get('expand', '').split(',')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand_users'] = self.expand_users()
+        return context
+
+    def list(self, request, *args, **kwargs):
+        if self.expand_users():
+            # Member profiles carry no modification time of their own.
+            return super().list(request, *args, **kwargs)
+        return conditional_response(
+            request, self.filter_queryset(self.get_queryset()),
+            lambda: super(ProjetViewSet, self).list(request, *args, **kwargs))
+
     def get_queryset(self):
         user = self.request.user
-        base_queryset = Projet.objects.prefetch_related('users')
+        member_fields = ('id',)
+        if self.expand_users():
+            member_fields = [
+                name for name in UserSerializer.Meta.fields if name != 'password']
+        base_queryset = Projet.objects.prefetch_related(
+            Prefetch('users', queryset=User.objects.only(*member_fields)))
 
         requested_user_id = self.request.query_params.get('user')
 
         if requested_user_id:
             requested_user = User.objects.get(id=requested_user_id)
-            if requested_user.is_staff:
-                return base_queryset.filter(
-                    models.Q(manager=requested_user) | models.Q(
-                        users=requested_user)
-                ).distinct()
-            return base_queryset.filter(users=requested_user).distinct()
+            return base_queryset.filter(id__in=Visibility(requested_user).project_ids)
 
         if user.is_superuser:
             return base_queryset.all()
-        elif user.is_staff:
-            return base_queryset.filter(
-                models.Q(manager=user) | models.Q(users=user)
-            ).distinct()
-        return base_queryset.filter(users=user).distinct()
+        return base_queryset.filter(id__in=get_visibility(self.request).project_ids)
 
     def perform_create(self, serializer):
         if not self.request.user.is_staff:
@@ -126,7 +287,7 @@ class ProjetViewSet(viewsets.ModelViewSet):
         instance = serializer.instance
         user = self.request.user
 
-        if not user.is_superuser and instance.manager != user:
+        if not user.is_superuser and instance.manager_id != user.id:
             raise PermissionDenied(
                 "Only the project manager or admin can update this project")
 
@@ -134,50 +295,84 @@ class ProjetViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'], url_path='assign-users')
     def assign_users(self, request, pk=None):
+        """
+        Sets the members of the project to `user_ids`, or adds the `add` and
+        removes the `remove` user IDs. Only the difference with the current
+        members is written.
+        """
         project = self.get_object()
         user = request.user
 
         try:
-            user_ids = request.data.get('user_ids', [])
-            if not isinstance(user_ids, list):
-                raise ValidationError("user_ids must be a list")
+            if user.is_staff and not user.is_superuser and project.manager_id != user.id:
+                raise PermissionDenied(
+                    "You can only assign users to your own projects")
+            if not user.is_staff:
+                raise PermissionDenied(
+                    "Only managers and admins can assign users to projects")
 
-            users = User.objects.filter(id__in=user_ids)
-            if len(users) != len(user_ids):
+            def id_set(name):
+                values = request.data.get(name, [])
+                if not isinstance(values, list):
+                    raise ValidationError(f"{name} must be a list")
+                try:
+                    return {int(value) for value in values}
+                except (TypeError, ValueError):
+                    raise ValidationError("Some user IDs are invalid")
+
+            Membership = Projet.users.through
+            members = set(Membership.objects.filter(
+                projet_id=project.id).values_list('user_id', flat=True))
+            if 'user_ids' in request.data:
+                target = id_set('user_ids')
+            else:
+                target = (members | id_set('add')) - id_set('remove')
+            added, removed = target - members, members - target
+
+            # One query checks that the new members exist and may be assigned.
+            candidates = []
+            if added:
+                candidates = list(User.objects.filter(id__in=added).values_list(
+                    'id', 'username', 'is_staff', 'manager_id'))
+            if len(candidates) != len(added):
                 raise ValidationError("Some user IDs are invalid")
-
-            if user.is_superuser:
-                pass
-            elif user.is_staff:
-                if project.manager != user:
-                    raise PermissionDenied(
-                        "You can only assign users to your own projects")
-
-                manager_users = users.filter(is_staff=True)
-                if manager_users.exists():
+            if not user.is_superuser:
+                if any(is_staff for _, _, is_staff, _ in candidates):
                     raise ValidationError(
                         "Managers can only assign regular users to projects")
-
-                invalid_users = users.exclude(manager=user)
-                if invalid_users.exists():
-                    usernames = ", ".join([u.username for u in invalid_users])
+                invalid_users = sorted(
+                    username for _, username, _, manager_id in candidates
+                    if manager_id != user.id)
+                if invalid_users:
                     raise PermissionDenied(
-                        f"You cannot assign these users: {usernames}")
-            else:
-                raise PermissionDenied(
-                    "Only managers and admins can assign users to projects")
-
-            project.users.clear()
-            project.users.add(*users)
-
-            return Response({"message": "Users assigned successfully"})
+                        f"You cannot assign these users: {', '.join(invalid_users)}")
+
+            if added or removed:
+                # Bulk writes on the through model skip m2m_changed, do its work.
+                # A concurrent assignment may have added the same members.
+                with transaction.atomic():
+                    Membership.objects.bulk_create(
+                        (Membership(projet_id=project.id, user_id=user_id)
+                         for user_id in sorted(added)),
+                        ignore_conflicts=True)
+                    if removed:
+                        Membership.objects.filter(
+                            projet_id=project.id, user_id__in=removed).delete()
+                    Projet.objects.filter(pk=project.pk).update(updated_at=timezone.now())
+                invalidate_visibility()
+
+            return Response({
+                "message": "Users assigned successfully",
+                "added": sorted(added),
+                "removed": sorted(removed),
+            })
 
         except (ValidationError, PermissionDenied) as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        except Exception as e:
-            import traceback
+        except Exception:
+            logger.exception("Assigning users to project %s failed", project.id)
             return Response(
-                {"error": f"An error occurred while assigning users: {str(e)}\n{traceback.format_exc()}"},
+                {"error": "An error occurred while assigning users"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
@@ -186,6 +381,9 @@ class SaisieTempsViewSet(viewsets.ModelViewSet):
     queryset = SaisieTemps.objects.all()
     serializer_class = SaisieTempsSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SaisieTempsPagination
+    CHANGES_LIMIT = 500
+    CHANGES_MAX_LIMIT = 5000
 
     def get_permissions(self):
         return [permissions.IsAuthenticated()]
@@ -195,15 +393,52 @@ class SaisieTempsViewSet(viewsets.ModelViewSet):
         base_queryset = SaisieTemps.objects.select_related('user', 'projet')
 
         if user.is_superuser:
-            return base_queryset.all()
-
+            queryset = base_queryset.all()
         elif user.is_staff:
-            return base_queryset.filter(
-                models.Q(user=user) |
-                models.Q(user__manager=user)
-            )
+            queryset = base_queryset.filter(
+                user_id__in=get_visibility(self.request).visible_user_ids)
+        else:
+            queryset = base_queryset.filter(user=user)
 
-        return base_queryset.filter(user=user)
+        if self.action == 'list':
+            queryset = self.filter_list_queryset(queryset)
+        return queryset
+
+    def filter_list_queryset(self, queryset):
+        params = self.request.query_params
+
+        for param in ('user', 'projet'):
+            value = params.get(param)
+            if value:
+                if not value.isdigit():
+                    raise ValidationError({param: "Identifiant invalide"})
+                queryset = queryset.filter(**{f'{param}_id': int(value)})
+
+        for param, lookup in (('date_after', 'date__gte'), ('date_before', 'date__lte')):
+            value = params.get(param)
+            if value:
+                try:
+                    parsed = parse_date(value)
+                except ValueError:
+                    parsed = None
+                if parsed is None:
+                    raise ValidationError(
+                        {param: "Format de date invalide. Utilisez YYYY-MM-DD"})
+                queryset = queryset.filter(**{lookup: parsed})
+
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return conditional_response(request, queryset, lambda: self.list_rows(queryset))
+
+    def list_rows(self, queryset):
+        # Read-only fast path, see saisie_temps_rows
+        rows = queryset.values(*SaisieTempsSerializer.Meta.fields)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(saisie_temps_rows(page))
+        return Response(saisie_temps_rows(list(rows)))
 
     def create(self, request, *args, **kwargs):
         mutable_data = request.data.copy() if hasattr(
@@ -220,14 +455,9 @@ class SaisieTempsViewSet(viewsets.ModelViewSet):
 
             mutable_data['user'] = str(target_user_id)
 
-            if target_user_id != user.id:
-                try:
-                    target_user = User.objects.get(id=target_user_id)
-                    if target_user.manager_id != user.id:
-                        raise PermissionDenied(
-                            "You can only create entries for your managed users")
-                except User.DoesNotExist:
-                    raise ValidationError("Invalid user ID")
+            if not get_visibility(request).can_manage_user(target_user_id):
+                raise PermissionDenied(
+                    "You can only create entries for your managed users")
         else:
             try:
                 target_user_id = int(mutable_data.get('user', str(user.id)))
@@ -255,12 +485,11 @@ class SaisieTempsViewSet(viewsets.ModelViewSet):
         if user.is_superuser:
             pass
         elif user.is_staff:
-            if instance.user.id != user.id:
-                if instance.user.manager_id != user.id:
-                    raise PermissionDenied(
-                        "You can only update entries for your managed users")
+            if not get_visibility(request).can_manage_user(instance.user_id):
+                raise PermissionDenied(
+                    "You can only update entries for your managed users")
         else:
-            if instance.user.id != user.id:
+            if instance.user_id != user.id:
                 raise PermissionDenied(
                     "You can only update your own time entries")
 
@@ -273,51 +502,114 @@ class SaisieTempsViewSet(viewsets.ModelViewSet):
         if user.is_superuser:
             pass
         elif user.is_staff:
-            if instance.user.id != user.id:
-                if instance.user.manager_id != user.id:
-                    raise PermissionDenied(
-                        "You can only delete entries for your managed users")
+            if not get_visibility(request).can_manage_user(instance.user_id):
+                raise PermissionDenied(
+                    "You can only delete entries for your managed users")
         else:
-            if instance.user.id != user.id:
+            if instance.user_id != user.id:
                 raise PermissionDenied(
                     "You can only delete your own time entries")
 
         return super().destroy(request, *args, **kwargs)
 
+    def perform_destroy(self, instance):
+        # Locked here rather than on pre_delete, to answer 404 when gone
+        with transaction.atomic():
+            if lock_entry_days(instance) is None:
+                raise NotFound("Saisie introuvable")
+            instance.delete()
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        data = request.data
+        if isinstance(data, list):
+            data = {'entries': data}
+
+        serializer = SaisieTempsBulkSerializer(
+            data=data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+        return Response(result, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='changes')
+    def changes(self, request):
+        """
+        Entries created or updated and entries deleted since the `since`
+        revision, at most `limit` changes in revision order. Pass the
+        returned `revision` as the next `since`; `more` asks to call again.
+        Changes of transactions still in progress wait for the next call.
+        """
+        params = request.query_params
+        for param in ('since', 'limit'):
+            if not params.get(param, '0').isdigit():
+                raise ValidationError({param: "Entier positif attendu"})
+        since = int(params.get('since', 0))
+        limit = min(int(params.get('limit', self.CHANGES_LIMIT)), self.CHANGES_MAX_LIMIT)
+        if limit < 1:
+            raise ValidationError({'limit': "Entier positif attendu"})
+
+        # Every revision up to current_revision() is committed or rolled back,
+        # none pending, see api.revisions.
+        upto = current_revision()
+        window = {'revision__gt': since, 'revision__lte': upto}
+
+        entries = list(self.get_queryset().filter(**window).order_by('revision')[:limit + 1])
+        tombstones = SaisieTempsTombstone.objects.filter(**window)
+        user = request.user
+        if not user.is_superuser:
+            tombstones = tombstones.filter(user_id__in=get_visibility(request).visible_user_ids)
+        tombstones = list(tombstones.order_by('revision').values('entry_id', 'revision')[:limit + 1])
+
+        changes = sorted(
+            [(entry.revision, entry) for entry in entries]
+            + [(tombstone['revision'], tombstone) for tombstone in tombstones],
+            key=lambda change: change[0])
+        more = len(changes) > limit
+        changes = changes[:limit]
+        revision = changes[-1][0] if more else max(upto, since)
+
+        return Response({
+            'revision': revision,
+            'more': more,
+            'entries': self.get_serializer(
+                [change for _, change in changes if isinstance(change, SaisieTemps)],
+                many=True).data,
+            'deleted': [
+                {'id': change['entry_id'], 'revision': change['revision']}
+                for _, change in changes if isinstance(change, dict)
+            ],
+        })
+
+    @action(detail=False, methods=['post'], url_path='stream/ticket', url_name='stream-ticket')
+    def stream_ticket(self, request):
+        """
+        Single-use ticket opening the live updates stream: EventSource cannot
+        send the access token, which must stay out of URLs and access logs.
+        """
+        unavailable = _stream_unavailable(request._request)
+        if unavailable is not None:
+            return unavailable
+        expires = request.auth['exp'] if request.auth is not None else (
+            time.time() + settings.LIVE_UPDATES_MAX_AGE)
+        return Response({
+            'ticket': issue_stream_ticket(request.user, expires),
+            'expires_in': settings.LIVE_UPDATES_TICKET_AGE,
+        })
+
     @action(detail=False, methods=['get'], url_path=r'(?P<user_id>\d+)/monthly/(?P<month>\d{4}-\d{2})')
     def monthly(self, request, user_id=None, month=None):
         try:
             year, month = map(int, month.split('-'))
 
-            import calendar
-            from datetime import date, datetime
-            from django.utils import timezone
-            import logging
-
-            logger = logging.getLogger(__name__)
-
-            from datetime import date, timedelta
-
-            first_day = date(year, month, 1)
-
-            if month == 12:
-                next_month = date(year + 1, 1, 1)
-            else:
-                next_month = date(year, month + 1, 1)
-            last_day = next_month - timedelta(days=1)
-
-            start_date = first_day - timedelta(days=first_day.weekday())
-
-            end_date = last_day + timedelta(days=(6 - last_day.weekday()))
-
             entries = SaisieTemps.objects.filter(
-                user_id=user_id,
-                date__year=year,
-                date__month=month
-            ).select_related('projet')
+                month_range(year, month),
+                user_id=user_id
+            )
 
-            serializer = self.get_serializer(entries, many=True)
-            return Response(serializer.data)
+            return conditional_response(
+                request, entries,
+                lambda: Response(saisie_temps_rows(
+                    list(entries.values(*SaisieTempsSerializer.Meta.fields)))))
         except (ValueError, TypeError):
             return Response(
                 {"error": "Format de date invalide. Utilisez YYYY-MM"},
@@ -327,109 +619,31 @@ class SaisieTempsViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], url_path=r'(?P<user_id>\d+)/report/(?P<month>\d{4}-\d{2})')
     def report(self, request, user_id=None, month=None):
         try:
-            from reportlab.lib import colors
-            from reportlab.lib.pagesizes import letter
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from io import BytesIO
-            from django.http import HttpResponse
-            from collections import defaultdict
-            from django.contrib.auth import get_user_model
-
-            User = get_user_model()
             year, month = map(int, month.split('-'))
 
             target_user = User.objects.get(id=user_id)
-            queryset = SaisieTemps.objects.filter(
-                user_id=user_id,
-                date__year=year,
-                date__month=month
-            ).select_related('projet')
-
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer, pagesize=letter)
-            elements = []
-            styles = getSampleStyleSheet()
-
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=18,
-                spaceAfter=20,
-                textColor=colors.darkblue
-            )
+            rows = report_rows(user_id, year, month)
+            key = report_cache_key(user_id, target_user.username, year, month, rows)
 
-            table_header_style = TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#4CAF50")),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ])
-
-            table_body_style = TableStyle([
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('PADDING', (0, 0), (-1, -1), 6),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#f9f9f9")),
-            ])
-
-            def format_journee(value):
-                """ Convertit les heures en journées formatées """
-                if value == 1:
-                    return "1 journée"
-                elif value == 0.5:
-                    return "½ journée"
-                else:
-                    return f"{value:.1f} journées"
-
-            month_name = {
-                1: 'Janvier', 2: 'Février', 3: 'Mars', 4: 'Avril',
-                5: 'Mai', 6: 'Juin', 7: 'Juillet', 8: 'Août',
-                9: 'Septembre', 10: 'Octobre', 11: 'Novembre', 12: 'Décembre'
-            }[month]
-
-            title = Paragraph(
-                f"Rapport Mensuel - {target_user.username}<br/>"
-                f"{month_name} {year}",
-                title_style
-            )
-            elements.append(title)
-
-            project_entries = defaultdict(list)
-            for entry in queryset:
-                project_entries[entry.projet.nom].append(entry)
-
-            total_journees = sum(
-                entry.temps for entries in project_entries.values() for entry in entries)
-            summary_data = [['Total des journées:', f"{total_journees:.1f}"], [
-                'Nombre de projets:', str(len(project_entries))]]
-            summary_table = Table(summary_data, colWidths=[200, 150])
-            summary_table.setStyle(table_body_style)
-            elements.append(summary_table)
-            elements.append(Spacer(1, 20))
-
-            for project_name, entries in project_entries.items():
-                project_total = sum(entry.temps for entry in entries)
-                elements.append(Paragraph(
-                    f"{project_name} ({project_total:.1f})", styles['Heading2']))
-
-                data = [['Date', 'Journées']]
-                for entry in sorted(entries, key=lambda x: x.date):
-                    data.append([entry.date.strftime('%d/%m/%Y'),
-                                format_journee(entry.temps)])
-
-                table = Table(data, colWidths=[150, 100])
-                table.setStyle(table_header_style)
-                table.setStyle(table_body_style)
-                elements.append(table)
-                elements.append(Spacer(1, 20))
-
-            doc.build(elements)
-            pdf = buffer.getvalue()
-            buffer.close()
+            pdf = cache.get(key)
+            if pdf is None:
+                future = request_report(key, target_user.username, year, month, rows)
+                try:
+                    # A poll may reach another worker: only a shared cache
+                    # lets it find the PDF, so otherwise wait longer here.
+                    if not settings.SHARED_CACHE:
+                        pdf = future.result(timeout=settings.REPORT_WAIT)
+                    elif len(rows) > settings.REPORT_SYNC_MAX_ENTRIES:
+                        raise FutureTimeoutError
+                    else:
+                        pdf = future.result(timeout=settings.REPORT_SYNC_TIMEOUT)
+                except FutureTimeoutError:
+                    poll_url = request.build_absolute_uri()
+                    return Response(
+                        {"status": "pending", "poll": poll_url},
+                        status=status.HTTP_202_ACCEPTED,
+                        headers={'Location': poll_url, 'Retry-After': '2'}
+                    )
 
             response = HttpResponse(content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="report-{year}-{month:02d}-{user_id}.pdf"'
@@ -443,6 +657,103 @@ class SaisieTempsViewSet(viewsets.ModelViewSet):
             )
 
 
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        params = request.query_params
+        export_type = params.get('type', 'csv')
+        if export_type not in ('csv', 'xlsx'):
+            raise ValidationError({'type': "Type d'export invalide. Utilisez csv ou xlsx"})
+
+        try:
+            start_year, start_month = map(int, params['start'].split('-'))
+            end_year, end_month = map(int, params.get('end', params['start']).split('-'))
+            first_day, _ = month_bounds(start_year, start_month)
+            _, last_day = month_bounds(end_year, end_month)
+        except (KeyError, ValueError, TypeError):
+            return Response(
+                {"error": "Format de date invalide. Utilisez start=YYYY-MM et end=YYYY-MM"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = export_rows(self.get_queryset().filter(
+            date__gte=first_day, date__lt=last_day))
+        filename = f"saisies-{start_year}-{start_month:02d}-{end_year}-{end_month:02d}"
+
+        if export_type == 'xlsx':
+            response = FileResponse(
+                write_xlsx(rows),
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+            response['Content-Disposition'] = f'attachment; filename="{filename}.xlsx"'
+            return response
+
+        response = _streaming_response(
+            request, stream_csv(rows), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+        return response
+
+    @action(detail=False, methods=['get'], url_path=r'team-report/(?P<month>\d{4}-\d{2})')
+    def team_report(self, request, month=None):
+        user = request.user
+        if not user.is_staff:
+            raise PermissionDenied(
+                "Only managers and admins can export team reports")
+
+        try:
+            year, month = map(int, month.split('-'))
+            period = month_range(year, month)
+        except (ValueError, TypeError):
+            return Response(
+                {"error": "Format de date invalide. Utilisez YYYY-MM"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        usernames = dict(_team_members(request).order_by('username').values_list('id', 'username'))
+
+        rows = defaultdict(list)
+        for user_id, *row in SaisieTemps.objects.filter(
+            period, user_id__in=list(usernames)
+        ).order_by('user_id', 'id').values_list(
+            'user_id', 'id', 'projet__nom', 'date', 'temps'
+        ):
+            rows[user_id].append(tuple(row))
+
+        jobs, filenames = {}, {}
+        for user_id, username in usernames.items():
+            key = report_cache_key(user_id, username, year, month, rows[user_id])
+            jobs[key] = (username, year, month, rows[user_id])
+            filenames[key] = f"report-{year}-{month:02d}-{username}.pdf"
+
+        archive = stream_zip(
+            (filenames[key], pdf) for key, pdf in render_reports(jobs))
+        response = _streaming_response(request, archive, content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="team-report-{year}-{month:02d}.zip"'
+        return response
+
+    @action(detail=False, methods=['get'], url_path='analytics')
+    def analytics(self, request):
+        """
+        Utilization of the team (see _team_members) from month `start` to
+        month `end`, see api.analytics.
+        `cells=true` adds the user x project x day cube.
+        """
+        user = request.user
+        if not user.is_staff:
+            raise PermissionDenied(
+                "Only managers and admins can view team analytics")
+
+        params = request.query_params
+        try:
+            first_day, last_day = month_span(params['start'], params.get('end'))
+        except (KeyError, ValueError, TypeError):
+            return Response(
+                {"error": "Format de date invalide. Utilisez start=YYYY-MM et end=YYYY-MM"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(utilization(
+            _team_members(request), first_day, last_day, cells=params.get('cells') == 'true'))
+
+
 class CompteRenduViewSet(viewsets.ModelViewSet):
     queryset = CompteRendu.objects.all()
     serializer_class = CompteRenduSerializer
@@ -453,26 +764,124 @@ class CompteRenduViewSet(viewsets.ModelViewSet):
         if user.is_superuser:
             return CompteRendu.objects.all()
         elif user.is_staff:
-            return CompteRendu.objects.filter(user__manager=user)
+            return CompteRendu.objects.filter(
+                user_id__in=get_visibility(self.request).managed_user_ids)
         return CompteRendu.objects.filter(user=user)
 
     def perform_create(self, serializer):
         user = serializer.validated_data['user']
         mois = serializer.validated_data['mois']
-        total_temps = SaisieTemps.objects.filter(
-            user=user,
-            date__year=mois.year,
-            date__month=mois.month
-        ).aggregate(total=models.Sum('temps'))['total'] or 0
+        total_temps = get_monthly_total(user.id, mois)
 
         serializer.save(total_temps=total_temps)
 
     def perform_update(self, serializer):
         instance = serializer.instance
-        total_temps = SaisieTemps.objects.filter(
-            user=instance.user,
-            date__year=instance.mois.year,
-            date__month=instance.mois.month
-        ).aggregate(total=models.Sum('temps'))['total'] or 0
+        total_temps = get_monthly_total(instance.user_id, instance.mois)
 
         serializer.save(total_temps=total_temps)
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape endpoint, protected by METRICS_TOKEN when set."""
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(
+            request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _stream_unavailable(request):
+    """
+    501 response to stream requests served through WSGI, whose handlers
+    consume the whole stream before sending it.
+    """
+    if isinstance(request, ASGIRequest):
+        return None
+    return JsonResponse(
+        {'detail': "Le flux temps réel nécessite un serveur ASGI (SERVER_MODE=asgi)"},
+        status=status.HTTP_501_NOT_IMPLEMENTED)
+
+
+def _stream_subscriber(request):
+    """
+    Authenticates a stream request, by ticket or Authorization header, and
+    returns the user IDs whose entries it may follow (None for admins) and
+    for how many seconds.
+    """
+    ticket = request.GET.get('ticket')
+    if ticket:
+        user, expires = redeem_stream_ticket(ticket)
+    else:
+        authentication = CachedJWTAuthentication()
+        header = authentication.get_header(request)
+        raw_token = header and authentication.get_raw_token(header)
+        if not raw_token:
+            raise NotAuthenticated()
+        token = authentication.get_validated_token(raw_token)
+        user, expires = authentication.get_user(token), token['exp']
+
+    visible = None if user.is_superuser else Visibility(user).visible_user_ids
+    # Reconnecting refreshes both the token and the visibility.
+    lifetime = min(settings.LIVE_UPDATES_MAX_AGE, expires - time.time())
+    return visible, lifetime
+
+
+def _sse(event, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {event}', f'data: {json.dumps(data)}']
+    return '\n'.join(lines) + '\n\n'
+
+
+@require_GET
+async def saisie_temps_stream(request):
+    """
+    Server-Sent Events stream of the changes of the entries the user can
+    see. EventSource cannot send headers, so browsers authenticate with a
+    `ticket` parameter from the stream_ticket action; the access token is
+    never accepted in the URL.
+
+    A `ready` event gives the revision the stream starts after; each
+    `saved`/`deleted` event has its revision as id. After a reconnection or
+    a `resync` event, catch up through the changes feed. Needs an ASGI
+    server, see _stream_unavailable.
+    """
+    unavailable = _stream_unavailable(request)
+    if unavailable is not None:
+        return unavailable
+    try:
+        visible, lifetime = await sync_to_async(_stream_subscriber)(request)
+    except APIException as exc:
+        detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+        return JsonResponse(detail, status=status.HTTP_401_UNAUTHORIZED)
+
+    async def events():
+        accepts = (lambda user_id: True) if visible is None else visible.__contains__
+        broker = get_broker()
+        subscription = broker.subscribe(accepts)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + lifetime
+        try:
+            # Subscribed and listening first, so nothing committed after this
+            # revision is missed; otherwise the client reconnects later.
+            if not await broker.listening(settings.LIVE_UPDATES_HEARTBEAT):
+                return
+            revision = await sync_to_async(current_revision)()
+            yield _sse('ready', {'revision': revision})
+            while (remaining := deadline - loop.time()) > 0:
+                event = await subscription.get(min(settings.LIVE_UPDATES_HEARTBEAT, remaining))
+                if subscription.lost:
+                    yield _sse('resync', {})
+                    break
+                if event is not None:
+                    yield _sse(event['type'], event, event['revision'])
+                elif deadline > loop.time():
+                    yield ': ping\n\n'
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.utils.functional import cached_property
+
+from .models import User, Projet
+
+GENERATION_KEY = 'visibility:generation'
+
+
+class Visibility:
+    """
+    What an authenticated user may see and manage: the IDs of the users they
+    manage and of the projects they manage or belong to.
+
+    Each set is computed at most once per request. With
+    VISIBILITY_CACHE_TIMEOUT > 0 they are also kept in the cache for that many
+    seconds; any change to users or project membership invalidates them.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @property
+    def is_admin(self):
+        return self.user.is_superuser
+
+    @cached_property
+    def _cached(self):
+        timeout = settings.VISIBILITY_CACHE_TIMEOUT
+        if not timeout:
+            return {}
+        self._cache_key = f'visibility:{cache.get_or_set(GENERATION_KEY, 0, None)}:{self.user.id}'
+        return cache.get(self._cache_key) or {}
+
+    def _remember(self, name, value):
+        if settings.VISIBILITY_CACHE_TIMEOUT:
+            cached = dict(self._cached, **{name: sorted(value)})
+            self._cached = cached
+            cache.set(self._cache_key, cached, settings.VISIBILITY_CACHE_TIMEOUT)
+
+    @cached_property
+    def managed_user_ids(self):
+        if 'managed' in self._cached:
+            return frozenset(self._cached['managed'])
+        ids = frozenset()
+        if self.user.is_staff:
+            ids = frozenset(User.objects.filter(
+                manager_id=self.user.id).values_list('id', flat=True))
+        self._remember('managed', ids)
+        return ids
+
+    @cached_property
+    def project_ids(self):
+        if 'projects' in self._cached:
+            return frozenset(self._cached['projects'])
+        condition = models.Q(users=self.user.id)
+        if self.user.is_staff:
+            condition |= models.Q(manager=self.user.id)
+        ids = frozenset(Projet.objects.filter(
+            condition).values_list('id', flat=True).distinct())
+        self._remember('projects', ids)
+        return ids
+
+    @property
+    def visible_user_ids(self):
+        """The user and the users they manage (unbounded for admins)."""
+        return self.managed_user_ids | {self.user.id}
+
+    def can_manage_user(self, user_id):
+        if self.is_admin:
+            return True
+        return user_id == self.user.id or user_id in self.managed_user_ids
+
+    def can_use_project(self, projet_id):
+        return self.is_admin or projet_id in self.project_ids
+
+
+def get_visibility(request):
+    """Returns the Visibility of `request.user`, shared for the whole request."""
+    request = getattr(request, '_request', request)
+    visibility = getattr(request, '_visibility', None)
+    if visibility is None or visibility.user is not request.user:
+        visibility = Visibility(request.user)
+        request._visibility = visibility
+    return visibility
+
+
+def invalidate_visibility():
+    """Drops every cached visibility set, e.g. after a membership change."""
+    if settings.VISIBILITY_CACHE_TIMEOUT:
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.set(GENERATION_KEY, 1, None)
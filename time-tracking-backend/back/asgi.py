@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'back.settings')
 
 application = get_asgi_application()
+
+# Serves the static files in development, as runserver does.
+if settings.DEBUG:
+    application = ASGIStaticFilesHandler(application)
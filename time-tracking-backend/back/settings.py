@@ -28,6 +28,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -68,9 +70,123 @@ DATABASES = {
         'PASSWORD': os.getenv('DATABASE_PASSWORD', 'time'),
         'HOST': os.getenv('DATABASE_HOST', 'db'),
         'PORT': os.getenv('DATABASE_PORT', '5432'),
+        # Keep connections open between requests (seconds, 0 closes them after
+        # each request) and check they are still usable before reusing them
+        'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DATABASE_CONN_HEALTH_CHECKS', 'true').lower() == 'true',
     }
 }
 
+# Under ASGI (SERVER_MODE asgi or dev), Django's end-of-request cleanup does
+# not reach the connections of the threads running the views, so persistent
+# connections are disabled there and DATABASE_POOL, a psycopg connection pool
+# shared by each worker process, defaults to true instead. Django requires
+# CONN_MAX_AGE=0 with a pool.
+ASGI_MODE = os.getenv('SERVER_MODE', 'asgi') != 'wsgi'
+if ASGI_MODE:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+if (os.getenv('DATABASE_POOL') or str(ASGI_MODE)).lower() == 'true':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DATABASE_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DATABASE_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.getenv('DATABASE_POOL_TIMEOUT', '10')),
+        },
+    }
+
+# DATABASE_ENGINE=sqlite runs against a local file, e.g. for benchmark_api
+if os.getenv('DATABASE_ENGINE') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DATABASE_NAME', str(BASE_DIR / 'db.sqlite3')),
+    }
+
+# Cache configuration (use a shared backend such as Redis in production so
+# every worker sees the same rendered reports)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+# Whether every worker sees the same cache: not so with the per-process
+# local memory backend (nor the dummy one, which keeps nothing)
+SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Seconds during which a user's managed users and projects may be served
+# from the cache (0 computes them once per request)
+VISIBILITY_CACHE_TIMEOUT = int(os.getenv('VISIBILITY_CACHE_TIMEOUT', '0'))
+
+# PDF report generation. Months of more than REPORT_SYNC_MAX_ENTRIES
+# entries, or not rendered within REPORT_SYNC_TIMEOUT seconds, answer 202 and
+# are polled until cached. With a local cache, a poll reaching another worker
+# would not find the PDF, so requests wait up to REPORT_WAIT seconds (within
+# GUNICORN_TIMEOUT) for it instead, before answering 202 all the same.
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+REPORT_SYNC_MAX_ENTRIES = int(os.getenv('REPORT_SYNC_MAX_ENTRIES', '200'))
+REPORT_SYNC_TIMEOUT = float(os.getenv('REPORT_SYNC_TIMEOUT', '10'))
+REPORT_WAIT = float(os.getenv('REPORT_WAIT', '20'))
+REPORT_CACHE_TIMEOUT = int(os.getenv('REPORT_CACHE_TIMEOUT', str(60 * 60 * 24)))
+
+# Bulk user import: password hashing processes and size limits. The
+# import_users command hashes on USER_IMPORT_WORKERS processes; over HTTP,
+# each server process shares a pool of USER_IMPORT_HTTP_WORKERS and accepts
+# USER_IMPORT_HTTP_MAX_ROWS rows, hashed well within GUNICORN_TIMEOUT.
+USER_IMPORT_WORKERS = int(os.getenv('USER_IMPORT_WORKERS', str(os.cpu_count() or 1)))
+USER_IMPORT_MAX_ROWS = int(os.getenv('USER_IMPORT_MAX_ROWS', '10000'))
+USER_IMPORT_HTTP_WORKERS = int(os.getenv('USER_IMPORT_HTTP_WORKERS', '2'))
+USER_IMPORT_HTTP_MAX_ROWS = int(os.getenv('USER_IMPORT_HTTP_MAX_ROWS', '50'))
+USER_IMPORT_BATCH_SIZE = int(os.getenv('USER_IMPORT_BATCH_SIZE', '1000'))
+
+# Request profiling: SQL count, DB/serializer time and size of every request
+# in a Server-Timing header and an 'api.profiling' JSON log line (INFO for
+# requests slower than PROFILING_SLOW_MS, DEBUG otherwise). A sampled share
+# of requests runs under cProfile, kept in PROFILING_DIR when slow. Off
+# unless PROFILING_ENABLED=true.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_SLOW_MS = float(os.getenv('PROFILING_SLOW_MS', '500'))
+PROFILING_DIR = os.getenv('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+
+# Bearer token required to scrape /metrics (unset leaves it open)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Directory where each worker writes its metrics for /metrics to sum them,
+# every METRICS_FLUSH_INTERVAL seconds (unset: the serving process's only)
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+
+# Live updates stream (api/saisie-temps/stream/, serve with SERVER_MODE=asgi).
+# The broker class delivers the events, see api.events: PostgresBroker by
+# default on PostgreSQL, LocalBroker (single worker only) otherwise. Streams
+# close after LIVE_UPDATES_MAX_AGE seconds so clients reconnect with fresh
+# visibility, and send a heartbeat every LIVE_UPDATES_HEARTBEAT seconds.
+# Browsers open them with a ticket from api/saisie-temps/stream/ticket/,
+# valid for LIVE_UPDATES_TICKET_AGE seconds.
+LIVE_UPDATES_BROKER = os.getenv('LIVE_UPDATES_BROKER')
+LIVE_UPDATES_QUEUE_SIZE = int(os.getenv('LIVE_UPDATES_QUEUE_SIZE', '1000'))
+LIVE_UPDATES_MAX_AGE = float(os.getenv('LIVE_UPDATES_MAX_AGE', '300'))
+LIVE_UPDATES_HEARTBEAT = float(os.getenv('LIVE_UPDATES_HEARTBEAT', '15'))
+LIVE_UPDATES_TICKET_AGE = int(os.getenv('LIVE_UPDATES_TICKET_AGE', '30'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'profiling': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.profiling': {
+            'handlers': ['profiling'],
+            'level': os.getenv('PROFILING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Password validation (can be customized or removed for simpler cases)
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -102,11 +218,15 @@ AUTH_USER_MODEL = 'api.User'
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 # JWT Settings
@@ -115,6 +235,14 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
 
+# Seconds authenticated users are kept in the cache (0 reads them on every
+# request). Saving a user drops it from the cache, but with a local cache
+# only in the process that saved, so other workers may keep serving the old
+# permissions that long: hence the shorter default. JWT_CLAIMS_ONLY builds
+# them from the access token claims instead, without any query.
+JWT_USER_CACHE_TIMEOUT = int(os.getenv('JWT_USER_CACHE_TIMEOUT', '300' if SHARED_CACHE else '30'))
+JWT_CLAIMS_ONLY = os.getenv('JWT_CLAIMS_ONLY', 'false').lower() == 'true'
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  
@@ -0,0 +1,112 @@
+"""
+HTTP load test against a running server, to compare serving modes:
+
+    python benchmarks/loadtest.py --url http://localhost:8000 \
+        --username admin --password secret --concurrency 16 --duration 30
+
+Logs in through /api/auth/login/, then keeps `concurrency` clients busy on
+the given paths for `duration` seconds and prints the throughput and
+latency percentiles. Only the standard library is used so it can run from
+any machine.
+
+To compare serving modes, run it against the same PostgreSQL database with
+SERVER_MODE=wsgi and DATABASE_CONN_MAX_AGE=0, then 60, then DATABASE_POOL=true,
+and with SERVER_MODE=asgi (see gunicorn.conf.py and back/settings.py). No
+comparison is recorded here: measure on the target hardware before picking
+a mode for its throughput.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = ['/api/saisie-temps/?page_size=100', '/api/projets/', '/api/compte-rendus/']
+
+
+def login(base, username, password):
+    connection = connect(base)
+    connection.request(
+        'POST', '/api/auth/login/',
+        body=json.dumps({'username': username, 'password': password}),
+        headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    body = response.read()
+    if response.status != 200:
+        raise SystemExit(f"Échec de l'authentification ({response.status}): {body[:200]!r}")
+    return json.loads(body)['access']
+
+
+def connect(base):
+    cls = http.client.HTTPSConnection if base.scheme == 'https' else http.client.HTTPConnection
+    return cls(base.hostname, base.port, timeout=30)
+
+
+def client(base, token, paths, deadline, latencies, errors, lock):
+    # One keep-alive connection per client, as a browser would do.
+    connection = connect(base)
+    headers = {'Authorization': f'Bearer {token}'}
+    index = 0
+    local, failed = [], 0
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                failed += 1
+            local.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException):
+            failed += 1
+            connection.close()
+            connection = connect(base)
+    with lock:
+        latencies.extend(local)
+        errors[0] += failed
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--path', action='append', dest='paths',
+                        help="Chemin à interroger (répétable)")
+    args = parser.parse_args()
+
+    base = urlsplit(args.url)
+    token = login(base, args.username, args.password)
+    latencies, errors, lock = [], [0], threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=client, args=(
+            base, token, args.paths or DEFAULT_PATHS, deadline, latencies, errors, lock))
+        for _ in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if not latencies:
+        raise SystemExit("Aucune réponse reçue")
+    print(f"requêtes: {len(latencies)}  erreurs: {errors[0]}")
+    print(f"débit: {len(latencies) / args.duration:.1f} req/s")
+    print(f"latence p50: {percentile(latencies, 0.5) * 1000:.1f} ms  "
+          f"p95: {percentile(latencies, 0.95) * 1000:.1f} ms  "
+          f"p99: {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Gunicorn configuration, every setting can be overridden by environment.
+
+SERVER_MODE=asgi (default) serves back.asgi with uvicorn workers,
+SERVER_MODE=wsgi serves back.wsgi with threaded workers. The live updates
+stream is only available under asgi.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+mode = os.getenv('SERVER_MODE', 'asgi')
+if mode not in ('wsgi', 'asgi'):
+    raise RuntimeError(f"SERVER_MODE must be 'wsgi' or 'asgi', not {mode!r}")
+
+wsgi_app = f'back.{mode}:application'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+if mode == 'asgi':
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    # LocalBroker only reaches the live updates clients of its own process,
+    # see api.events; it is the default without PostgreSQL.
+    broker = os.getenv('LIVE_UPDATES_BROKER') or (
+        'api.events.LocalBroker' if os.getenv('DATABASE_ENGINE') == 'sqlite'
+        else 'api.events.PostgresBroker')
+    if broker == 'api.events.LocalBroker' and workers > 1:
+        raise RuntimeError("LIVE_UPDATES_BROKER=api.events.LocalBroker needs WEB_CONCURRENCY=1")
+else:
+    worker_class = 'gthread'
+    threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+# Workers share their /metrics values through this directory, see api.metrics.
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'api-metrics'))
+
+
+def on_starting(server):
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Recycle workers now and then so a slow leak cannot grow forever.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '500'))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
@@ -0,0 +1,13 @@
+#!/bin/sh
+# Applies migrations then starts the server selected by SERVER_MODE:
+# dev (uvicorn with autoreload), asgi or wsgi (gunicorn, see gunicorn.conf.py).
+set -e
+
+python manage.py makemigrations api --noinput
+python manage.py migrate api --noinput
+python manage.py migrate --noinput
+
+if [ "${SERVER_MODE:-asgi}" = "dev" ]; then
+    exec uvicorn back.asgi:application --host 0.0.0.0 --port 8000 --reload
+fi
+exec gunicorn -c gunicorn.conf.py
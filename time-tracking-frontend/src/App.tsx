@@ -1,6 +1,6 @@
 import { useState, useEffect } from "react";
 import { BrowserRouter, Routes, Route, Navigate } from "react-router-dom";
-import { User, Project } from "./types";
+import { User, ProjectSummary } from "./types";
 import { authApi, projectsApi } from "./services/api";
 import Navigation from "./components/Navigation";
 import Login from "./components/Login";
@@ -41,7 +41,7 @@ function ProtectedRoute({ children, user, requiredRole, adminOnly }: ProtectedRo
 
 export default function App() {
   const [user, setUser] = useState<User | null>(null);
-  const [, setProjects] = useState<Project[]>([]);
+  const [, setProjects] = useState<ProjectSummary[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
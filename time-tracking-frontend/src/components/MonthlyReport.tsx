@@ -1,5 +1,5 @@
 import { useState, useEffect, useCallback } from "react";
-import { TimeEntry, User, Project } from "../types";
+import { TimeEntry, User, ProjectSummary } from "../types";
 import { timeEntriesApi, projectsApi } from "../services/api";
 import "../styles/report.css";
 
@@ -19,7 +19,7 @@ interface MonthlyData {
 export default function MonthlyReport({ user, isManager, onUserSelect }: Props) {
   const [month, setMonth] = useState(new Date().toISOString().slice(0, 7));
   const [entries, setEntries] = useState<TimeEntry[]>([]);
-  const [projects, setProjects] = useState<Project[]>([]);
+  const [projects, setProjects] = useState<ProjectSummary[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [selectedUserId, setSelectedUserId] = useState<string>(user.id.toString());
@@ -116,6 +116,24 @@ export default function MonthlyReport({ user, isManager, onUserSelect }: Props)
     }
   };
 
+  const handleExportTeam = async () => {
+    try {
+      const response = await timeEntriesApi.exportTeamReport(month);
+      const blob = new Blob([response.data], { type: "application/zip" });
+      const url = window.URL.createObjectURL(blob);
+      const link = document.createElement("a");
+      link.href = url;
+      link.download = `rapports-equipe-${month}.zip`;
+      document.body.appendChild(link);
+      link.click();
+      document.body.removeChild(link);
+      window.URL.revokeObjectURL(url);
+    } catch (error) {
+      console.error(error);
+      setError("Échec de l'exportation des rapports de l'équipe.");
+    }
+  };
+
   if (loading) return <div className="loading">Chargement du rapport...</div>;
 
   return (
@@ -149,6 +167,11 @@ export default function MonthlyReport({ user, isManager, onUserSelect }: Props)
           <button onClick={handleExportPDF} className="export-button">
             Exporter PDF
           </button>
+          {isManager && (
+            <button onClick={handleExportTeam} className="export-button">
+              Exporter l'équipe
+            </button>
+          )}
         </div>
       </div>
 
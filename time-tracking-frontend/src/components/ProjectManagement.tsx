@@ -1,5 +1,5 @@
 import { useState, useEffect, useCallback } from "react";
-import { Project, User } from "../types";
+import { Project, UserSummary } from "../types";
 import { projectsApi, authApi } from "../services/api";
 import "../styles/form.css";
 import "../styles/table.css";
@@ -23,27 +23,24 @@ export default function ProjectManagement() {
   });
   const [userRole, setUserRole] = useState<string | null>(null);
   const [currentUser, setCurrentUser] = useState<{ id: number; username: string } | null>(null);
-  const [staffUsers, setStaffUsers] = useState<User[]>([]);
-  const [regularUsers, setRegularUsers] = useState<User[]>([]);
+  const [staffUsers, setStaffUsers] = useState<UserSummary[]>([]);
+  const [regularUsers, setRegularUsers] = useState<UserSummary[]>([]);
+  const [userSearch, setUserSearch] = useState("");
   const [selectedUsers, setSelectedUsers] = useState<{ [key: string]: number[] }>({});
   const [assignError, setAssignError] = useState<string | null>(null);
 
   const fetchRegularUsers = useCallback(async () => {
     try {
-      setLoading(prev => ({ ...prev, users: true }));
-      const response = await authApi.getAllUsers();
-      const allUsers = response.data;
-
-      const filteredUsers: User[] = allUsers.filter((user: User) => {
-        if (userRole === 'admin') {
-          return !user.is_superuser;
-        } else if (userRole === 'manager' && currentUser) {
-          return !user.is_superuser && user.manager === currentUser.id;
-        }
-        return false;
-      });
+      if (userRole !== 'admin' && !(userRole === 'manager' && currentUser)) {
+        setRegularUsers([]);
+        return;
+      }
+      // Admins assign users and managers, managers their own users
+      const response = await authApi.getUserPicker(userRole === 'admin'
+        ? { role: 'user,manager', search: userSearch.trim() || undefined }
+        : { role: 'user', manager: currentUser?.id, search: userSearch.trim() || undefined });
 
-      setRegularUsers(filteredUsers);
+      setRegularUsers(response.data.results);
     } catch (error: unknown) {
       const errorMessage = error instanceof Error ? error.message : "Erreur lors du chargement des utilisateurs.";
       console.error(errorMessage);
@@ -51,12 +48,12 @@ export default function ProjectManagement() {
     } finally {
       setLoading(prev => ({ ...prev, users: false }));
     }
-  }, [userRole, currentUser]);
+  }, [userRole, currentUser, userSearch]);
 
   const fetchProjects = async () => {
     try {
       setLoading(prev => ({ ...prev, projects: true }));
-      const response = await projectsApi.getAll();
+      const response = await projectsApi.getAllWithUsers();
     
       console.log('Projects response:', response.data);
 
@@ -97,20 +94,9 @@ export default function ProjectManagement() {
 
   const fetchStaffUsers = async () => {
     try {
-      const response = await authApi.getAllUsers();
-
-      const allUsers: User[] = response.data;
-
-      const filteredStaff = allUsers.filter(user => user.is_staff || user.is_superuser);
-
-      setStaffUsers(filteredStaff);
+      const response = await authApi.getUserPicker({ role: 'manager,admin', page_size: 1000 });
 
-      console.log('Current projects:', projects);
-      projects.forEach(project => {
-        console.log(`Project ${project.nom} manager ID:`, project.manager);
-        const manager = response.data.find(user => user.id === project.manager);
-        console.log(`Found manager:`, manager);
-      });
+      setStaffUsers(response.data.results);
     } catch (error: unknown) {
       const errorMessage = error instanceof Error ? error.message : "Erreur lors du chargement des managers.";
       console.error(errorMessage);
@@ -127,15 +113,16 @@ export default function ProjectManagement() {
   }, []);  
 
   useEffect(() => {
-    if (userRole) {
-      fetchRegularUsers();
-    }
-  }, [userRole, currentUser?.id, fetchRegularUsers]);
+    if (!userRole) return;
+    const timer = setTimeout(fetchRegularUsers, userSearch ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [userRole, currentUser?.id, fetchRegularUsers, userSearch]);
 
-  const handleUserAssignment = async (projectId: number, selectedUserIds: number[]) => {
+  const handleUserAssignment = async (projectId: number, changes: { add?: number[]; remove?: number[] }) => {
     try {
       setAssignError(null);
-      await projectsApi.assignUsers(projectId, selectedUserIds);
+      // Only the differences are sent, concurrent changes to other members are kept
+      const response = await projectsApi.updateMembers(projectId, changes);
 
       setSelectedUsers(prev => ({
         ...prev,
@@ -143,14 +130,14 @@ export default function ProjectManagement() {
         [`remove-${projectId}`]: []
       }));
 
-      const selectedUsers = regularUsers.filter(user => selectedUserIds.includes(user.id));
-
+      const removed = new Set(response.data.removed);
       setProjects(prevProjects =>
-        prevProjects.map(p =>
-          p.id === projectId
-            ? { ...p, users: selectedUsers }
-            : p
-        )
+        prevProjects.map(p => {
+          if (p.id !== projectId) return p;
+          const known = new Map([...(p.users || []), ...regularUsers].map(user => [user.id, user]));
+          const added = response.data.added.flatMap(id => known.get(id) ?? []);
+          return { ...p, users: [...(p.users || []).filter(user => !removed.has(user.id)), ...added] };
+        })
       );
 
     } catch (error: unknown) {
@@ -253,8 +240,7 @@ export default function ProjectManagement() {
                 required
               >
                 <option value="0" disabled>Sélectionnez un manager</option>
-                {staffUsers.filter(user => user.is_staff || user.is_superuser)
-                  .map((user) => (
+                {staffUsers.map((user) => (
                     <option key={user.id} value={user.id}>
                       {user.username}
                     </option>
@@ -309,6 +295,12 @@ export default function ProjectManagement() {
                         <div className="user-assignment-section">
                           <div className="available-users">
                             <h4>Utilisateurs disponibles</h4>
+                            <input
+                              type="search"
+                              value={userSearch}
+                              onChange={(e) => setUserSearch(e.target.value)}
+                              placeholder="Rechercher"
+                            />
                             <select
                               multiple
                               size={5}
@@ -332,14 +324,9 @@ export default function ProjectManagement() {
                               }
                             </select>
                             <button
-                              onClick={() => {
-                                const existingUserIds = project.users?.map(u => u.id) || [];
-                                const newUserIds = [
-                                  ...existingUserIds,
-                                  ...(selectedUsers[project.id.toString()] || [])
-                                ];
-                                handleUserAssignment(project.id, newUserIds);
-                              }}
+                              onClick={() => handleUserAssignment(project.id, {
+                                add: selectedUsers[project.id.toString()] || []
+                              })}
                               className="assign-button"
                               disabled={!selectedUsers[project.id.toString()]?.length}
                             >
@@ -369,13 +356,9 @@ export default function ProjectManagement() {
                               ))}
                             </select>
                             <button
-                              onClick={() => {
-                                const selectedToRemove = new Set(selectedUsers[`remove-${project.id}`] || []);
-                                const newAssignedUserIds = (project.users || [])
-                                  .filter(user => !selectedToRemove.has(user.id))
-                                  .map(user => user.id);
-                                handleUserAssignment(project.id, newAssignedUserIds);
-                              }}
+                              onClick={() => handleUserAssignment(project.id, {
+                                remove: selectedUsers[`remove-${project.id}`] || []
+                              })}
                               className="remove-button"
                               disabled={!selectedUsers[`remove-${project.id}`]?.length}
                             >
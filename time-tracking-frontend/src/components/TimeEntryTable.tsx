@@ -1,8 +1,11 @@
-import { useState, useEffect } from "react";
-import { TimeEntry, Project, User } from "../types";
+import { useState, useEffect, useRef } from "react";
+import { TimeEntry, TimeEntryCell, TimeEntryEvent, ProjectSummary, User, UserSummary } from "../types";
 import { projectsApi, timeEntriesApi, authApi } from "../services/api";
 import "./../styles/table.css";
 
+// Edits are saved together, this many milliseconds after the last one
+const SAVE_DELAY = 800;
+
 interface Props {
   userId?: number;  
 }
@@ -16,34 +19,49 @@ interface TimeEntryMap {
   };
 }
 
+interface PendingCell {
+  cell: TimeEntryCell;
+  // Saved value, restored when the save fails
+  previous: number;
+}
+
 export default function TimeEntryTable({ userId: propUserId }: Props) {
-  const [projects, setProjects] = useState<Project[]>([]);
+  const [projects, setProjects] = useState<ProjectSummary[]>([]);
   const [timeEntries, setTimeEntries] = useState<TimeEntryMap>({});
   const [isLoading, setIsLoading] = useState(true);
-  const [users, setUsers] = useState<User[]>([]);
+  const [users, setUsers] = useState<UserSummary[]>([]);
+  const [userSearch, setUserSearch] = useState("");
   const [selectedUserId, setSelectedUserId] = useState<number | undefined>(propUserId);
   const [currentUser, setCurrentUser] = useState<User | null>(null);
+  const pendingCells = useRef<Map<string, PendingCell>>(new Map());
+  const saveTimer = useRef<ReturnType<typeof setTimeout>>();
 
   useEffect(() => {
-    const fetchUsers = async () => {
+    const fetchCurrentUser = async () => {
       try {
         const currentUserRes = await authApi.getCurrentUser();
         setCurrentUser(currentUserRes.data);
-        
-        if (currentUserRes.data.is_staff || currentUserRes.data.is_superuser) {
-          const usersRes = await authApi.getAllUsers();
-          const filteredUsers = currentUserRes.data.is_superuser 
-            ? usersRes.data 
-            : usersRes.data.filter((u: User) => u.manager === currentUserRes.data.id || u.id === currentUserRes.data.id);
-          setUsers(filteredUsers);
-        }
       } catch (err) {
         console.error("Error fetching users:", err);
       }
     };
-    fetchUsers();
+    fetchCurrentUser();
   }, []);
 
+  useEffect(() => {
+    if (!currentUser?.is_staff && !currentUser?.is_superuser) return;
+    // The server only returns the visible users: the team of a manager, everyone for an admin
+    const timer = setTimeout(async () => {
+      try {
+        const usersRes = await authApi.getUserPicker({ search: userSearch.trim() || undefined });
+        setUsers(usersRes.data.results);
+      } catch (err) {
+        console.error("Error fetching users:", err);
+      }
+    }, userSearch ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [currentUser, userSearch]);
+
   useEffect(() => {
     if (propUserId) {
       setSelectedUserId(propUserId);
@@ -101,11 +119,14 @@ export default function TimeEntryTable({ userId: propUserId }: Props) {
     }
 
     try {
-      const allEntriesRes = await timeEntriesApi.getAll();
+      const allEntriesRes = await timeEntriesApi.getAll({
+        user: selectedUserId,
+        date_after: currentWeek[0].toISOString().split("T")[0],
+        date_before: currentWeek[currentWeek.length - 1].toISOString().split("T")[0],
+      });
       const entriesMap: TimeEntryMap = {};
       
       allEntriesRes.data
-        .filter((entry: TimeEntry) => entry.user === selectedUserId)
         .forEach((entry: TimeEntry) => {
           const key = `${entry.projet}-${entry.date}`;
           entriesMap[key] = { temps: entry.temps, entryId: entry.id };
@@ -151,7 +172,94 @@ export default function TimeEntryTable({ userId: propUserId }: Props) {
     fetchData();
   }, [currentWeek, selectedUserId]);
 
-  const handleWeekChange = (direction: "prev" | "next") => {
+  useEffect(() => {
+    if (!currentWeek || currentWeek.length < 7 || !selectedUserId) {
+      return;
+    }
+    const first = currentWeek[0].toISOString().split("T")[0];
+    const last = currentWeek[currentWeek.length - 1].toISOString().split("T")[0];
+
+    const applyEvent = (event: TimeEntryEvent) => {
+      if (event.user !== selectedUserId) {
+        return;
+      }
+      setTimeEntries((prev) => {
+        const next = { ...prev };
+        for (const key of Object.keys(next)) {
+          if (next[key].entryId === event.id) {
+            delete next[key];
+          }
+        }
+        const entry = event.entry;
+        if (entry && entry.date >= first && entry.date <= last) {
+          next[`${entry.projet}-${entry.date}`] = { temps: entry.temps, entryId: entry.id };
+        }
+        return next;
+      });
+    };
+
+    return timeEntriesApi.subscribeToChanges(applyEvent, fetchTimeEntries);
+  }, [currentWeek, selectedUserId]);
+
+  const savePendingCells = async () => {
+    clearTimeout(saveTimer.current);
+    const pending = pendingCells.current;
+    if (pending.size === 0) return;
+    pendingCells.current = new Map();
+
+    setTimeEntries(prev => {
+      const next = { ...prev };
+      pending.forEach((_, key) => {
+        next[key] = { ...next[key], saving: true, error: undefined };
+      });
+      return next;
+    });
+
+    try {
+      const response = await timeEntriesApi.bulkUpsert([...pending.values()].map(({ cell }) => cell));
+      const ids = new Map(
+        [...response.data.created, ...response.data.updated]
+          .map(entry => [`${entry.projet}-${entry.date}`, entry.id])
+      );
+      setTimeEntries(prev => {
+        const next = { ...prev };
+        pending.forEach(({ cell }, key) => {
+          // Cells edited again while saving keep their value for the next save
+          if (cell.temps === 0 && !pendingCells.current.has(key)) {
+            delete next[key];
+          } else {
+            next[key] = { ...next[key], entryId: ids.get(key), saving: false };
+          }
+        });
+        return next;
+      });
+    } catch (error: unknown) {
+      let errorMessage = "Échec de l'enregistrement";
+      if (error instanceof Error) {
+        if (error.message.includes("status code 400")) {
+          errorMessage = "Le temps travaillé ne peut pas dépasser 1 sur une seule journée";
+        } else {
+          errorMessage = error.message;
+        }
+      }
+      setTimeEntries(prev => {
+        const next = { ...prev };
+        pending.forEach(({ previous }, key) => {
+          next[key] = pendingCells.current.has(key)
+            ? { ...next[key], saving: false }
+            : { ...next[key], temps: previous, saving: false, error: errorMessage };
+        });
+        return next;
+      });
+    }
+  };
+
+  useEffect(() => () => {
+    savePendingCells();
+  }, []);
+
+  const handleWeekChange = async (direction: "prev" | "next") => {
+    await savePendingCells();
     setSelectedDate((prev) => {
       const newDate = new Date(prev);
       newDate.setDate(prev.getDate() - prev.getDay() + (direction === "next" ? 8 : -6)); 
@@ -181,7 +289,7 @@ export default function TimeEntryTable({ userId: propUserId }: Props) {
       }, 0);
     };
 
-    const handleHoursChange = async (projectId: number, date: Date, newValue: string) => {
+    const handleHoursChange = (projectId: number, date: Date, newValue: string) => {
       if (!/^[0-9]*[,.]?[0-9]*$/.test(newValue) && newValue !== "") return;
       
       const dateStr = date.toISOString().split("T")[0];
@@ -236,78 +344,20 @@ export default function TimeEntryTable({ userId: propUserId }: Props) {
         return;
       }
 
-      try {
-        if (hours === 0 && existingEntry?.entryId) {
-          setTimeEntries(prev => ({
-            ...prev,
-            [key]: { 
-              ...prev[key], 
-              saving: true, 
-              error: undefined 
-            }
-          }));
-          await timeEntriesApi.delete(existingEntry.entryId);
-          setTimeEntries(prev => {
-            const updatedEntries = { ...prev };
-            delete updatedEntries[key];
-            return updatedEntries;
-          });
-        } else if (existingEntry?.entryId) {
-          setTimeEntries(prev => ({
-            ...prev,
-            [key]: { 
-              ...prev[key], 
-              saving: true, 
-              error: undefined 
-            }
-          }));
-          await timeEntriesApi.update(existingEntry.entryId, { temps: hours });
-          setTimeEntries(prev => ({
-            ...prev,
-            [key]: { temps: hours, entryId: existingEntry.entryId, saving: false }
-          }));
-        } else if (hours > 0) {
-          setTimeEntries(prev => ({
-            ...prev,
-            [key]: { 
-              ...prev[key], 
-              saving: true, 
-              error: undefined 
-            }
-          }));
-          const response = await timeEntriesApi.create({ 
-            date: dateStr, 
-            projet: projectId, 
-            temps: hours, 
-            description: "",
-            user: selectedUserId 
-          });
-          setTimeEntries(prev => ({
-            ...prev,
-            [key]: { temps: hours, entryId: response.data.id, saving: false }
-          }));
-        }
-      } catch (error: unknown) {
-        let errorMessage = "Échec de l'enregistrement";
-        if (error instanceof Error) {
-          if (error.message.includes("status code 400")) {
-            errorMessage = "Le temps travaillé ne peut pas dépasser 1 sur une seule journée";
-          } else {
-            errorMessage = error.message;
-          }
-        }
-        setTimeEntries(prev => ({
-          ...prev,
-          [key]: { 
-            ...prev[key], 
-            temps: existingEntry?.temps || 0,
-            saving: false, 
-            error: errorMessage 
-          }
-        }));
-        const restoredValue = existingEntry?.temps ? formatHours(existingEntry.temps) : "";
-        setEditingValue(restoredValue);
+      const pending = pendingCells.current.get(key);
+      if (hours === 0 && !existingEntry?.entryId && !pending) {
+        return;
       }
+      pendingCells.current.set(key, {
+        cell: { user: selectedUserId, projet: projectId, date: dateStr, temps: hours },
+        previous: pending ? pending.previous : existingEntry?.temps || 0,
+      });
+      setTimeEntries(prev => ({
+        ...prev,
+        [key]: { ...prev[key], temps: hours, error: undefined }
+      }));
+      clearTimeout(saveTimer.current);
+      saveTimer.current = setTimeout(savePendingCells, SAVE_DELAY);
   };
 
   if (isLoading) {
@@ -316,13 +366,26 @@ export default function TimeEntryTable({ userId: propUserId }: Props) {
 
   return (
     <div className="timesheet-container">
-      {currentUser?.is_staff && users.length > 0 && (
+      {currentUser?.is_staff && (users.length > 0 || userSearch) && (
         <div className="user-selector" style={{ display: 'flex', alignItems: 'center', gap: '10px' }}>
           <label>Utilisateur:</label>
+          <input
+            type="search"
+            value={userSearch}
+            onChange={(e) => setUserSearch(e.target.value)}
+            placeholder="Rechercher"
+          />
           <select 
             value={selectedUserId} 
-            onChange={(e) => setSelectedUserId(Number(e.target.value))}
+            onChange={async (e) => {
+              const userId = Number(e.target.value);
+              await savePendingCells();
+              setSelectedUserId(userId);
+            }}
           >
+            {selectedUserId === currentUser.id && !users.some(user => user.id === currentUser.id) && (
+              <option value={currentUser.id}>{currentUser.username}</option>
+            )}
             {users.map(user => (
               <option key={user.id} value={user.id}>
                 {user.username}
@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import { User, ApiError } from '../types';
+import { User, UserSummary, ApiError } from '../types';
 import { authApi } from '../services/api';
 import '../styles/form.css';
 import '../styles/table.css';
@@ -22,7 +22,10 @@ interface Props {
 export default function UserManagement({ currentUser }: Props) {
   const [showModal, setShowModal] = useState(false);
   const [users, setUsers] = useState<User[]>([]);
-  const [potentialManagers, setPotentialManagers] = useState<User[]>([]);
+  const [potentialManagers, setPotentialManagers] = useState<UserSummary[]>([]);
+  const [search, setSearch] = useState('');
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [importReport, setImportReport] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [editingUser, setEditingUser] = useState<User | null>(null);
@@ -33,21 +36,23 @@ export default function UserManagement({ currentUser }: Props) {
   });
 
   useEffect(() => {
-    fetchUsers();
+    const timer = setTimeout(() => fetchUsers(), search ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [currentUser.id, search]);
+
+  useEffect(() => {
+    authApi.getUserPicker({ role: 'manager,admin', page_size: 1000 })
+      .then(response => setPotentialManagers(response.data.results))
+      .catch(error => console.error(error));
   }, [currentUser.id]);
 
-  const fetchUsers = async () => {
+  // The server only returns the visible users, a page at a time
+  const fetchUsers = async (cursor?: string) => {
     try {
-      setLoading(true);
-      const response = await authApi.getAllUsers();
-      const allUsers = response.data;
-      
-      const filteredUsers = currentUser.role === 'manager' 
-        ? allUsers.filter(user => user.manager === currentUser.id || user.id === currentUser.id)
-        : allUsers;
-      
-      setUsers(filteredUsers);
-      setPotentialManagers(allUsers.filter(user => user.role === 'manager' || user.role === 'admin'));
+      const response = await authApi.getUsers({ search: search.trim() || undefined }, cursor);
+      const page = response.data.results;
+      setUsers(previous => cursor ? [...previous, ...page] : page);
+      setNextCursor(response.data.next ? new URL(response.data.next).searchParams.get('cursor') : null);
     } catch (error) {
       console.error(error);
       setError('Failed to load users');
@@ -111,6 +116,32 @@ export default function UserManagement({ currentUser }: Props) {
     }
   };
 
+  const handleImport = async (e: React.ChangeEvent<HTMLInputElement>) => {
+    const file = e.target.files?.[0];
+    e.target.value = '';
+    if (!file) return;
+    try {
+      setError(null);
+      const response = await authApi.importUsers(file);
+      if ('error' in response.data) {
+        setImportReport(response.data.error);
+        return;
+      }
+      const { created, errors } = response.data;
+      setImportReport([
+        `${created.length} utilisateur(s) créé(s), ${errors.length} ligne(s) en erreur`,
+        ...errors.map(({ row, username, errors }) =>
+          `Ligne ${row} (${username || '?'}) : ${Object.entries(errors)
+            .map(([field, messages]) => `${field} : ${messages.join(' ')}`)
+            .join('; ')}`)
+      ].join('\n'));
+      if (created.length > 0) await fetchUsers();
+    } catch (error) {
+      console.error(error);
+      setImportReport("Échec de l'import");
+    }
+  };
+
   const handleEdit = (user: User) => {
     setEditingUser(user);
     setFormData({
@@ -190,8 +221,16 @@ export default function UserManagement({ currentUser }: Props) {
         <button className="add-user-button" onClick={handleOpenModal}>
           <span>+</span>
         </button>
+        <label className="import-users-button">
+          Importer (CSV/JSON)
+          <input type="file" accept=".csv,.json" onChange={handleImport} hidden />
+        </label>
       </div>
 
+      {importReport && (
+        <pre className="import-report" onClick={() => setImportReport(null)}>{importReport}</pre>
+      )}
+
       {showModal && (
         <div className="modal-overlay">
           <div className="modal-content">
@@ -292,6 +331,12 @@ export default function UserManagement({ currentUser }: Props) {
       )}
 
       <div className="user-list-section">
+        <input
+          type="search"
+          value={search}
+          onChange={(e) => setSearch(e.target.value)}
+          placeholder="Rechercher par nom, identifiant ou email"
+        />
         <div className="table-container">
           <table>
             <thead>
@@ -336,9 +381,15 @@ export default function UserManagement({ currentUser }: Props) {
 
           {users.length === 0 && (
             <div className="no-entries">
-              Aucun utilisateur créé
+              {search ? 'Aucun utilisateur trouvé' : 'Aucun utilisateur créé'}
             </div>
           )}
+
+          {nextCursor && (
+            <button type="button" onClick={() => fetchUsers(nextCursor)}>
+              Charger plus
+            </button>
+          )}
         </div>
       </div>
     </div>
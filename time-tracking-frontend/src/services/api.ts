@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { TimeEntry, Project, User, AuthResponse, RefreshResponse } from '../types';
+import { TimeEntry, TimeEntryFilters, TimeEntryCell, BulkUpsertResponse, TimeEntryEvent, StreamTicket, MembershipResponse, Project, ProjectSummary, User, UserSummary, UserQuery, CursorPage, UserImportResponse, AuthResponse, RefreshResponse } from '../types';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
 
@@ -60,8 +60,14 @@ const timeEntriesApi = {
     });
     return response;
   },
-  getAll: async () => {
-    const response = await axiosInstance.get<TimeEntry[]>('/saisie-temps/');
+  exportTeamReport: async (month: string) => {
+    const response = await axiosInstance.get<Blob>(`/saisie-temps/team-report/${month}/`, {
+      responseType: 'blob'
+    });
+    return response;
+  },
+  getAll: async (filters?: TimeEntryFilters) => {
+    const response = await axiosInstance.get<TimeEntry[]>('/saisie-temps/', { params: filters });
     return response;
   },
   create: async (entry: Omit<TimeEntry, 'id' | 'created_at' | 'updated_at'>) => {
@@ -76,6 +82,56 @@ const timeEntriesApi = {
     const response = await axiosInstance.delete(`/saisie-temps/${id}/`);
     return response;
   },
+  bulkUpsert: async (entries: TimeEntryCell[]) => {
+    const response = await axiosInstance.post<BulkUpsertResponse>('/saisie-temps/bulk/', { entries });
+    return response;
+  },
+  subscribeToChanges: (onEvent: (event: TimeEntryEvent) => void, onResync: () => void) => {
+    // EventSource cannot send headers: each connection opens with a
+    // single-use ticket, requested with the current token (refreshed by the
+    // interceptor when expired).
+    let source: EventSource | undefined;
+    let retry: ReturnType<typeof setTimeout> | undefined;
+    let connected = false;
+    let closed = false;
+    const reconnect = () => {
+      source?.close();
+      if (!closed) retry = setTimeout(connect, 3000);
+    };
+    const connect = async () => {
+      let ticket: string;
+      try {
+        ticket = (await axiosInstance.post<StreamTicket>('/saisie-temps/stream/ticket/')).data.ticket;
+      } catch (error) {
+        // 501: the server cannot stream (WSGI), stay without live updates
+        if (!axios.isAxiosError(error) || error.response?.status !== 501) reconnect();
+        return;
+      }
+      if (closed) return;
+      source = new EventSource(`${API_URL}/saisie-temps/stream/?ticket=${encodeURIComponent(ticket)}`);
+      const handle = (message: MessageEvent) => onEvent(JSON.parse(message.data));
+      source.addEventListener('saved', handle);
+      source.addEventListener('deleted', handle);
+      source.addEventListener('ready', () => {
+        // Changes made while disconnected were missed
+        if (connected) onResync();
+        connected = true;
+      });
+      source.addEventListener('resync', () => {
+        source?.close();
+        connect();
+      });
+      // The server ends streams after a few minutes; tickets are single-use,
+      // so every reconnection asks for a new one.
+      source.onerror = reconnect;
+    };
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      source?.close();
+    };
+  },
   getMonthlyReport: async (userId: number, month: string) => {
     const response = await axiosInstance.get<TimeEntry[]>(`/saisie-temps/${userId}/monthly/${month}/`);
     return response;
@@ -84,11 +140,17 @@ const timeEntriesApi = {
 
 const projectsApi = {
   getAll: async () => {
-    const response = await axiosInstance.get<Project[]>('/projets/');
+    const response = await axiosInstance.get<ProjectSummary[]>('/projets/');
+    return response;
+  },
+  getAllWithUsers: async () => {
+    const response = await axiosInstance.get<Project[]>('/projets/', {
+      params: { expand: 'users' }
+    });
     return response;
   },
   getProjectsForUsers: async (userId: number) => {
-    const response = await axiosInstance.get<Project[]>(`/projets/?user=${userId}`);
+    const response = await axiosInstance.get<ProjectSummary[]>(`/projets/?user=${userId}`);
     return response;
   },
   create: async (project: Omit<Project, 'id' | 'created_at' | 'updated_at'>) => {
@@ -103,10 +165,8 @@ const projectsApi = {
     const response = await axiosInstance.delete(`/projets/${id}/`);
     return response;
   },
-  assignUsers: async (projectId: number, userIds: number[]) => {
-    const response = await axiosInstance.post<{ message: string }>(`/projets/${projectId}/assign-users/`, {
-      user_ids: userIds
-    });
+  updateMembers: async (projectId: number, changes: { add?: number[]; remove?: number[] }) => {
+    const response = await axiosInstance.post<MembershipResponse>(`/projets/${projectId}/assign-users/`, changes);
     return response;
   }
 };
@@ -142,6 +202,19 @@ const authApi = {
     const response = await axiosInstance.get<User[]>('/users/');
     return response;
   },
+  getUsers: async (params: UserQuery = {}, cursor?: string) => {
+    const response = await axiosInstance.get<CursorPage<User>>('/users/', {
+      params: { page_size: 50, ...params, cursor }
+    });
+    return response;
+  },
+  getUserPicker: async (params: UserQuery = {}) => {
+    // One page of compact rows: pickers narrow it down with `search`
+    const response = await axiosInstance.get<CursorPage<UserSummary>>('/users/', {
+      params: { page_size: 100, ...params, view: 'picker' }
+    });
+    return response;
+  },
   createUser: async (userData: Omit<User, 'id' | 'created_at' | 'updated_at'>) => {
     const response = await axiosInstance.post<User>('/users/', userData);
     return response;
@@ -154,6 +227,17 @@ const authApi = {
     const response = await axiosInstance.delete(`/users/${id}/`);
     return response;
   },
+  importUsers: async (file: File, dryRun = false) => {
+    const data = new FormData();
+    data.append('file', file);
+    const response = await axiosInstance.post<UserImportResponse | { error: string }>('/users/import/', data, {
+      params: dryRun ? { dry_run: 'true' } : undefined,
+      headers: { 'Content-Type': 'multipart/form-data' },
+      // Valid rows are created even when others fail
+      validateStatus: (status) => status < 500,
+    });
+    return response;
+  },
   updateUserRole: async (id: number, role: User['role']) => {
     const response = await axiosInstance.patch<User>(`/users/${id}/`, { role });
     return response;
@@ -5,20 +5,72 @@ export interface TimeEntry {
   temps: number;
   user?: number;
   description?: string;
+  revision?: number;
   created_at?: string;
   updated_at?: string;
 }
 
+export interface TimeEntryFilters {
+  user?: number;
+  projet?: number;
+  date_after?: string;
+  date_before?: string;
+}
+
+export interface TimeEntryCell {
+  user?: number;
+  projet: number;
+  date: string;
+  temps: number;
+  description?: string;
+}
+
+export interface BulkUpsertResponse {
+  created: TimeEntry[];
+  updated: TimeEntry[];
+  deleted: number[];
+}
+
+export interface MembershipResponse {
+  message: string;
+  added: number[];
+  removed: number[];
+}
+
+export interface TimeEntryEvent {
+  type: 'saved' | 'deleted';
+  id: number;
+  user: number;
+  revision: number;
+  entry: TimeEntry | null;
+}
+
+export interface StreamTicket {
+  ticket: string;
+  expires_in: number;
+}
+
 export interface Project {
   id: number;
   nom: string;
   description?: string;
   manager: number;
-  users?: User[];
+  users?: UserSummary[];
+  user_count?: number;
   created_at?: string;
   updated_at?: string;
 }
 
+// Project list entry without `expand=users`: member IDs only
+export interface ProjectSummary {
+  id: number;
+  nom: string;
+  description?: string;
+  manager: number;
+  users: number[];
+  user_count: number;
+}
+
 export interface User {
   id: number;
   username: string;
@@ -31,6 +83,32 @@ export interface User {
   updated_at?: string;
 }
 
+export interface UserSummary {
+  id: number;
+  username: string;
+  first_name: string;
+  last_name: string;
+  role: User['role'];
+  manager?: number | null;
+}
+
+export interface UserQuery {
+  search?: string;
+  role?: string;
+  manager?: number;
+  page_size?: number;
+}
+
+export interface CursorPage<T> {
+  next: string | null;
+  results: T[];
+}
+
+export interface UserImportResponse {
+  created: { id: number; username: string }[];
+  errors: { row: number; username: string; errors: { [field: string]: string[] } }[];
+}
+
 export interface FormError {
   field: string;
   message: string;